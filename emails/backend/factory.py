@@ -1,3 +1,5 @@
+import threading
+
 
 def simple_dict2str(d):
     # Simple dict serializer
@@ -14,19 +16,22 @@ class ObjectFactory:
     def __init__(self, cls):
         self.cls = cls
         self.pool = {}
+        self.lock = threading.Lock()
 
     def __getitem__(self, k):
         if not isinstance(k, dict):
             raise ValueError("item must be dict, not %s" % type(k))
         cache_key = _serializer(k)
-        obj = self.pool.get(cache_key, None)
-        if obj is None:
-            obj = self.cls(**k)
-            self.pool[cache_key] = obj
+        with self.lock:
+            obj = self.pool.get(cache_key, None)
+            if obj is None:
+                obj = self.cls(**k)
+                self.pool[cache_key] = obj
         return obj
 
     def invalidate(self, k):
         cache_key = _serializer(k)
-        if cache_key in self.pool:
-            del self.pool[cache_key]
+        with self.lock:
+            if cache_key in self.pool:
+                del self.pool[cache_key]
         return self[k]
\ No newline at end of file
@@ -3,6 +3,8 @@ __all__ = ['InMemoryBackend', ]
 
 import logging
 
+from ..response import SendResult
+
 
 class InMemoryBackend(object):
 
@@ -26,13 +28,30 @@ class InMemoryBackend(object):
 
         for addr in to_addrs:
             data = dict(from_addr=from_addr,
-                        message=msg.as_string(),
+                        message=msg.decode() if isinstance(msg, bytes) else msg.as_string(),
                         source_message=msg,
                         **kwargs)
             self.messages.setdefault(addr.lower(), []).append(data)
 
         return True
 
+    def send_messages(self, messages, **kwargs):
+        results = []
+        for item in messages:
+            if isinstance(item, Exception):
+                results.append(SendResult.from_error(item))
+                continue
+            if isinstance(item, dict):
+                params = dict(item)
+            else:
+                params = dict(from_addr=item.mail_from[1],
+                              to_addrs=item.get_recipients_emails(),
+                              msg=item)
+            params.update(kwargs)
+            sent = self.sendmail(**params)
+            results.append(sent and SendResult(success=True, status_code=250, status_text=None, error=None))
+        return results
+
     def __enter__(self):
         return self
 
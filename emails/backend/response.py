@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, NamedTuple
 
 
 class Response:
@@ -58,3 +58,28 @@ class SMTPResponse(Response):
         return "<emails.backend.SMTPResponse status_code=%s status_text=%s>" % (self.status_code.__repr__(),
                                                                                 self.status_text.__repr__())
 
+
+
+class SendResult(NamedTuple):
+
+    """
+    Compact outcome of one message sent by send_messages()
+    """
+
+    success: bool
+    status_code: int | None
+    status_text: bytes | None
+    error: Exception | None
+
+    @classmethod
+    def from_response(cls, response: Response | None) -> SendResult | None:
+        if response is None:
+            return None
+        return cls(success=response.success,
+                   status_code=getattr(response, 'status_code', None),
+                   status_text=getattr(response, 'status_text', None),
+                   error=response.error)
+
+    @classmethod
+    def from_error(cls, error: Exception) -> SendResult:
+        return cls(success=False, status_code=None, status_text=None, error=error)
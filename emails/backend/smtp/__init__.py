@@ -1,7 +1,9 @@
 
 from .backend import SMTPBackend
+from .pool import SMTPPoolBackend, SMTPPoolFactory
 
 try:
     from .aio_backend import AsyncSMTPBackend
+    from .aio_pool import AsyncSMTPPool
 except ImportError:
     pass
\ No newline at end of file
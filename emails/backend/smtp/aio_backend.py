@@ -2,13 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Any
+from typing import Any, cast
 
 import aiosmtplib
 
 from ..response import SMTPResponse
 from .aio_client import AsyncSMTPClientWithResponse
-from ...utils import DNS_NAME
+from ...utils import DNS_NAME, MessageChunks
 from .exceptions import SMTPConnectNetworkError
 
 
@@ -28,7 +28,8 @@ class AsyncSMTPBackend:
     response_cls = SMTPResponse
 
     def __init__(self, ssl: bool = False, fail_silently: bool = True,
-                 mail_options: list[str] | None = None, **kwargs: Any) -> None:
+                 mail_options: list[str] | None = None, stream: bool = False,
+                 **kwargs: Any) -> None:
 
         self.ssl = ssl
         self.tls = kwargs.get('tls')
@@ -47,6 +48,7 @@ class AsyncSMTPBackend:
         self.port: int = kwargs['port']
         self.fail_silently = fail_silently
         self.mail_options = mail_options or []
+        self.stream = stream
 
         self._client: AsyncSMTPClientWithResponse | None = None
         self._lock = asyncio.Lock()
@@ -83,33 +85,38 @@ class AsyncSMTPBackend:
     def make_response(self, exception: Exception | None = None) -> SMTPResponse:
         return self.response_cls(backend=self, exception=exception)
 
-    async def _send(self, **kwargs: Any) -> SMTPResponse | None:
-        response = None
-        try:
-            client = await self._get_client_unlocked()
-        except aiosmtplib.SMTPConnectError as exc:
+    def _message_data(self, msg: Any) -> bytes | MessageChunks:
+        # With stream=True, or with attachments read from disk, the client
+        # writes the message chunk by chunk instead of getting it as one
+        # bytes object
+        if isinstance(msg, bytes):
+            return msg
+        if hasattr(msg, 'iter_bytes') and (self.stream or getattr(msg, 'has_file_attachments', False) is True):
+            return MessageChunks(msg)
+        return cast(bytes, msg.as_bytes())
+
+    def _connect_error_response(self, exc: Exception) -> SMTPResponse:
+        if isinstance(exc, aiosmtplib.SMTPConnectError):
             cause = exc.__cause__
             if isinstance(cause, IOError):
-                response = self.make_response(
+                return self.make_response(
                     exception=SMTPConnectNetworkError.from_ioerror(cause))
-            else:
-                response = self.make_response(exception=exc)
-            if not self.fail_silently:
-                raise
-        except aiosmtplib.SMTPException as exc:
-            response = self.make_response(exception=exc)
-            if not self.fail_silently:
-                raise
-        except IOError as exc:
-            response = self.make_response(
-                exception=SMTPConnectNetworkError.from_ioerror(exc))
+            return self.make_response(exception=exc)
+        if isinstance(exc, aiosmtplib.SMTPException):
+            return self.make_response(exception=exc)
+        return self.make_response(
+            exception=SMTPConnectNetworkError.from_ioerror(exc))
+
+    async def _send(self, **kwargs: Any) -> SMTPResponse | None:
+        try:
+            client = await self._get_client_unlocked()
+        except (aiosmtplib.SMTPException, IOError) as exc:
+            response = self._connect_error_response(exc)
             if not self.fail_silently:
                 raise
-
-        if response:
             return response
-        else:
-            return await client.sendmail(**kwargs)
+
+        return await client.sendmail(**kwargs)
 
     async def _send_with_retry(self, **kwargs: Any) -> SMTPResponse | None:
         async with self._lock:
@@ -133,7 +140,7 @@ class AsyncSMTPBackend:
         response = await self._send_with_retry(
             from_addr=from_addr,
             to_addrs=to_addrs,
-            msg=msg.as_bytes(),
+            msg=self._message_data(msg),
             mail_options=mail_options or self.mail_options,
             rcpt_options=rcpt_options,
         )
@@ -3,11 +3,15 @@ from __future__ import annotations
 __all__ = ["AsyncSMTPClientWithResponse"]
 
 import logging
-from typing import TYPE_CHECKING
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, cast
 
 import aiosmtplib
 
+from aiosmtplib.email import quote_address
+
 from ..response import SMTPResponse
+from .client import dot_stuffed, encode_message, iter_slices
 from ...utils import sanitize_email
 
 if TYPE_CHECKING:
@@ -19,6 +23,8 @@ logger = logging.getLogger(__name__)
 class AsyncSMTPClientWithResponse:
     """Async SMTP client built on aiosmtplib that returns SMTPResponse objects."""
 
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+
     def __init__(self, parent: AsyncSMTPBackend, **kwargs):
         self.parent = parent
         self.make_response = parent.make_response
@@ -33,6 +39,11 @@ class AsyncSMTPClientWithResponse:
             )
         self.user = kwargs.pop("user", None)
         self.password = kwargs.pop("password", None)
+        self.pipelining = kwargs.pop("pipelining", True)
+        self.chunking = kwargs.pop("chunking", True)
+        self.chunk_size = kwargs.pop("chunk_size", self.DEFAULT_CHUNK_SIZE)
+        if self.chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
 
         # aiosmtplib uses use_tls for implicit TLS (SMTPS) and
         # start_tls for STARTTLS after connect
@@ -85,11 +96,156 @@ class AsyncSMTPClientWithResponse:
         except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
             pass
 
+    # SMTPProtocol internals used for pipelined commands and BDAT, as of
+    # the aiosmtplib versions in setup.py, see test_aiosmtplib_internals
+    RAW_PROTOCOL_ATTRS = ("_command_lock", "_read_response_from_buffer", "_response_pending", "_drain_helper")
+
+    def _has_raw_protocol(self) -> bool:
+        # aiosmtplib has no API for pipelined commands or BDAT, so they
+        # are written through SMTPProtocol internals. Fall back to plain
+        # commands if this aiosmtplib version lacks them.
+        protocol = self._smtp.protocol
+        return all(hasattr(protocol, name) for name in self.RAW_PROTOCOL_ATTRS)
+
+    def _use_pipelining(self) -> bool:
+        return bool(
+            self.pipelining
+            and self._esmtp
+            and self._smtp.supports_extension("pipelining")
+            and self._has_raw_protocol()
+        )
+
+    def _use_chunking(self) -> bool:
+        return bool(
+            self.chunking
+            and self._esmtp
+            and self._smtp.supports_extension("chunking")
+            and self._has_raw_protocol()
+        )
+
+    def _get_protocol(self):
+        protocol = self._smtp.protocol
+        if protocol is None or protocol._command_lock is None:
+            raise aiosmtplib.SMTPServerDisconnected("Server not connected")
+        return protocol
+
+    async def _pipeline_envelope(
+        self,
+        from_addr: str,
+        esmtp_opts: list[str],
+        to_addrs: list[str],
+        rcpt_options: list[str],
+    ) -> list[aiosmtplib.SMTPResponse]:
+        """
+        Sends MAIL FROM and all RCPT TO commands in one write (RFC 2920)
+        and returns their replies in the same order.
+        """
+        encoding = "ascii"
+        if any(x.lower() == "smtputf8" for x in esmtp_opts):
+            if not self._smtp.supports_extension("smtputf8"):
+                raise aiosmtplib.SMTPNotSupported("SMTPUTF8 not supported by server")
+            encoding = "utf-8"
+
+        commands = [
+            b" ".join(
+                [b"MAIL", b"FROM:" + quote_address(from_addr).encode(encoding)]
+                + [o.encode("ascii") for o in esmtp_opts]
+            )
+        ]
+        for a in to_addrs:
+            commands.append(
+                b" ".join(
+                    [b"RCPT", b"TO:" + quote_address(a).encode(encoding)]
+                    + [o.encode("ascii") for o in rcpt_options]
+                )
+            )
+        for cmd in commands:
+            if b"\r" in cmd or b"\n" in cmd:
+                raise ValueError(
+                    "command and arguments contain prohibited newline characters: %r" % cmd
+                )
+
+        protocol = self._get_protocol()
+        replies = []
+        async with protocol._command_lock:
+            try:
+                protocol._response_pending = True
+                protocol.write(b"".join([cmd + b"\r\n" for cmd in commands]))
+                for _ in commands:
+                    # Several replies may arrive in one read, the protocol
+                    # only hands out the first one and buffers the rest.
+                    protocol._response_pending = True
+                    resp = protocol._read_response_from_buffer()
+                    if resp is None:
+                        resp = await protocol.read_response(timeout=self._smtp.timeout)
+                    replies.append(resp)
+            except BaseException:
+                # unread replies would be paired with later commands
+                self._smtp.close()
+                raise
+        return replies
+
+    async def bdat(self, msg: bytes | str | Iterable[bytes]) -> aiosmtplib.SMTPResponse:
+        """
+        Sends the message with BDAT commands (RFC 3030) in chunk_size pieces.
+        Unlike data(), the message is sent as is, without dot-stuffing.
+        Returns the reply to the last chunk or the first error reply.
+        """
+        chunks = iter_slices(encode_message(msg), self.chunk_size)
+
+        protocol = self._get_protocol()
+        async with protocol._command_lock:
+            try:
+                chunk = next(chunks, b"")
+                while True:
+                    next_chunk = next(chunks, None)
+                    last = next_chunk is None
+                    protocol._response_pending = True
+                    protocol.write(
+                        b"BDAT %d%s\r\n" % (len(chunk), b" LAST" if last else b"")
+                    )
+                    protocol.write(chunk)
+                    resp = await protocol.read_response(timeout=self._smtp.timeout)
+                    if next_chunk is None or resp.code != 250:
+                        return cast(aiosmtplib.SMTPResponse, resp)
+                    chunk = next_chunk
+            except BaseException:
+                self._smtp.close()
+                raise
+
+    async def data_stream(self, chunks: Iterable[bytes]) -> aiosmtplib.SMTPResponse:
+        """
+        Like aiosmtplib data(), but sends the message given as an iterable
+        of bytes chunks, quoting each chunk as it goes.
+        """
+        if not self._has_raw_protocol():
+            return await self._smtp.data(b"".join(chunks))
+
+        protocol = self._get_protocol()
+        async with protocol._command_lock:
+            try:
+                protocol._response_pending = True
+                protocol.write(b"DATA\r\n")
+                resp = await protocol.read_response(timeout=self._smtp.timeout)
+                if resp.code != 354:
+                    raise aiosmtplib.SMTPDataError(resp.code, resp.message)
+                for q in dot_stuffed(chunks):
+                    protocol.write(q)
+                    await protocol._drain_helper()
+                protocol._response_pending = True
+                return cast(aiosmtplib.SMTPResponse,
+                            await protocol.read_response(timeout=self._smtp.timeout))
+            except aiosmtplib.SMTPDataError:
+                raise
+            except BaseException:
+                self._smtp.close()
+                raise
+
     async def sendmail(
         self,
         from_addr: str,
         to_addrs: list[str] | str,
-        msg: bytes,
+        msg: bytes | Iterable[bytes],
         mail_options: list[str] | None = None,
         rcpt_options: list[str] | None = None,
     ) -> SMTPResponse | None:
@@ -101,7 +257,7 @@ class AsyncSMTPClientWithResponse:
         mail_options = mail_options or []
         esmtp_opts = []
         if self._esmtp:
-            if self._smtp.supports_extension("size"):
+            if self._smtp.supports_extension("size") and isinstance(msg, (bytes, str)):
                 esmtp_opts.append("size=%d" % len(msg))
             for option in mail_options:
                 esmtp_opts.append(option)
@@ -113,17 +269,30 @@ class AsyncSMTPClientWithResponse:
         response.from_addr = from_addr
         response.esmtp_opts = esmtp_opts[:]
 
-        try:
-            resp = await self._smtp.mail(from_addr, options=esmtp_opts)
-        except aiosmtplib.SMTPSenderRefused as exc:
-            response.set_status(
-                "mail",
-                exc.code,
-                exc.message.encode() if isinstance(exc.message, str) else exc.message,
+        if not isinstance(to_addrs, (list, tuple)):
+            to_addrs = [to_addrs]
+
+        to_addrs = [sanitize_email(e) for e in to_addrs]
+
+        rcpt_replies = None
+        if self._use_pipelining():
+            replies = await self._pipeline_envelope(
+                from_addr, esmtp_opts, to_addrs, rcpt_options
             )
-            response.set_exception(exc)
-            await self._rset()
-            return response
+            resp = replies[0]
+            rcpt_replies = replies[1:]
+        else:
+            try:
+                resp = await self._smtp.mail(from_addr, options=esmtp_opts)
+            except aiosmtplib.SMTPSenderRefused as exc:
+                response.set_status(
+                    "mail",
+                    exc.code,
+                    exc.message.encode() if isinstance(exc.message, str) else exc.message,
+                )
+                response.set_exception(exc)
+                await self._rset()
+                return response
 
         response.set_status(
             "mail",
@@ -138,18 +307,16 @@ class AsyncSMTPClientWithResponse:
             )
             return response
 
-        if not isinstance(to_addrs, (list, tuple)):
-            to_addrs = [to_addrs]
-
-        to_addrs = [sanitize_email(e) for e in to_addrs]
-
         response.to_addrs = to_addrs
         response.rcpt_options = rcpt_options[:]
         response.refused_recipients = {}
 
-        for a in to_addrs:
+        for n, a in enumerate(to_addrs):
             try:
-                resp = await self._smtp.rcpt(a, options=rcpt_options)
+                if rcpt_replies is None:
+                    resp = await self._smtp.rcpt(a, options=rcpt_options)
+                else:
+                    resp = rcpt_replies[n]
                 code = resp.code
                 resp_msg = (
                     resp.message.encode()
@@ -179,13 +346,20 @@ class AsyncSMTPClientWithResponse:
             response.set_exception(aiosmtplib.SMTPRecipientsRefused(refused_list))
             return response
 
+        command = "data"
         try:
-            resp = await self._smtp.data(msg)
+            if self._use_chunking():
+                command = "bdat"
+                resp = await self.bdat(msg)
+            elif isinstance(msg, (bytes, str)):
+                resp = await self._smtp.data(msg)
+            else:
+                resp = await self.data_stream(msg)
         except aiosmtplib.SMTPDataError as exc:
             resp_msg = (
                 exc.message.encode() if isinstance(exc.message, str) else exc.message
             )
-            response.set_status("data", exc.code, resp_msg)
+            response.set_status(command, exc.code, resp_msg)
             response.set_exception(exc)
             await self._rset()
             return response
@@ -193,7 +367,7 @@ class AsyncSMTPClientWithResponse:
         resp_msg = (
             resp.message.encode() if isinstance(resp.message, str) else resp.message
         )
-        response.set_status("data", resp.code, resp_msg)
+        response.set_status(command, resp.code, resp_msg)
         if resp.code != 250:
             await self._rset()
             response.set_exception(aiosmtplib.SMTPDataError(resp.code, resp.message))
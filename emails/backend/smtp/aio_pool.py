@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import aiosmtplib
+
+from ..response import SMTPResponse
+from .aio_backend import AsyncSMTPBackend
+from .aio_client import AsyncSMTPClientWithResponse
+
+
+__all__ = ['AsyncSMTPPool']
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSMTPPool(AsyncSMTPBackend):
+
+    """
+    AsyncSMTPPool sends over up to max_connections aiosmtplib connections
+    at once, so concurrent send_async() calls don't wait for each other.
+
+    Waiting callers get connections in the order they asked for them.
+    close() lets queued sends finish and then closes every connection.
+    """
+
+    DEFAULT_MAX_CONNECTIONS = 8
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 **kwargs: Any) -> None:
+
+        super(AsyncSMTPPool, self).__init__(**kwargs)
+
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+
+        self.max_connections = max_connections
+
+        self._idle: deque[AsyncSMTPClientWithResponse] = deque()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._size = 0  # idle + checked out + connecting
+        self._in_use = 0
+        self._closing = False
+        self._drained = asyncio.Event()
+        self._reopened = asyncio.Event()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    async def _open(self) -> AsyncSMTPClientWithResponse:
+        client = AsyncSMTPClientWithResponse(
+            parent=self, ssl=self.ssl, **self.smtp_cls_kwargs
+        )
+        await client.initialize()
+        return client
+
+    async def _quit(self, client: AsyncSMTPClientWithResponse) -> None:
+        try:
+            await client.quit()
+        except Exception:
+            logger.debug('Error closing pooled smtp connection', exc_info=True)
+
+    def _wake(self) -> None:
+        # Hand idle connections and free slots to waiters, first come first served.
+        # A waiter that gets None opens a new connection in its slot.
+        while self._waiters:
+            if self._idle:
+                item: AsyncSMTPClientWithResponse | None = self._idle.pop()
+            elif self._size < self.max_connections:
+                item = None
+                self._size += 1
+            else:
+                return
+            waiter = self._waiters.popleft()
+            if waiter.done():  # cancelled
+                if item is None:
+                    self._size -= 1
+                else:
+                    self._idle.append(item)
+                continue
+            self._in_use += 1
+            waiter.set_result(item)
+
+    def _release(self, client: AsyncSMTPClientWithResponse | None) -> None:
+        self._in_use -= 1
+        if client is None:
+            self._size -= 1
+        else:
+            self._idle.append(client)
+        self._wake()
+        if not (self._in_use or self._waiters):
+            self._drained.set()
+
+    async def checkout(self) -> AsyncSMTPClientWithResponse:
+        """
+        Takes an idle connection, opens a new one if the pool is not full
+        or waits for a connection to be returned.
+        """
+        client, _ = await self._checkout()
+        return client
+
+    async def _checkout(self) -> tuple[AsyncSMTPClientWithResponse, bool]:
+        # Returns a connection and whether it was just opened
+        while self._closing:
+            await self._reopened.wait()
+
+        client: AsyncSMTPClientWithResponse | None
+        if not self._waiters and (self._idle or self._size < self.max_connections):
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop(), False
+            self._size += 1
+            client = None
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                client = await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(waiter.result())
+                else:
+                    try:
+                        self._waiters.remove(waiter)
+                    except ValueError:
+                        pass
+                    if not (self._in_use or self._waiters):
+                        self._drained.set()
+                raise
+
+        if client is not None:
+            return client, False
+
+        try:
+            return await self._open(), True
+        except BaseException:
+            self._release(None)
+            raise
+
+    async def _reopen(self, client: AsyncSMTPClientWithResponse) -> AsyncSMTPClientWithResponse:
+        # Replaces a checked out connection with a new one in the same slot
+        await self._quit(client)
+        try:
+            return await self._open()
+        except BaseException:
+            self._release(None)
+            raise
+
+    async def checkin(self, client: AsyncSMTPClientWithResponse) -> None:
+        """
+        Returns a connection to the pool.
+        """
+        self._release(client)
+
+    async def discard(self, client: AsyncSMTPClientWithResponse) -> None:
+        """
+        Closes a checked out connection and frees its slot in the pool.
+        """
+        self._release(None)
+        await self._quit(client)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncSMTPClientWithResponse]:
+        client = await self.checkout()
+        try:
+            yield client
+        except BaseException:
+            await self.discard(client)
+            raise
+        else:
+            await self.checkin(client)
+
+    async def get_client(self) -> AsyncSMTPClientWithResponse:
+        """
+        Checks out a connection, same as checkout().
+        Return it to the pool with checkin() or discard().
+        """
+        return await self.checkout()
+
+    async def close(self) -> None:
+        """
+        Waits for sends in progress and already queued, then closes all
+        connections. Sends started after close() wait until it is done.
+        """
+        self._closing = True
+        self._reopened.clear()
+        try:
+            while self._in_use or self._waiters:
+                self._drained.clear()
+                await self._drained.wait()
+            clients = list(self._idle)
+            self._idle.clear()
+            self._size -= len(clients)
+        finally:
+            self._closing = False
+            self._reopened.set()
+
+        errors = await asyncio.gather(*[client.quit() for client in clients],
+                                      return_exceptions=True)
+        for exc in errors:
+            if isinstance(exc, Exception) and not self.fail_silently:
+                raise exc
+
+    async def _send(self, reconnect: bool = False, **kwargs: Any) -> SMTPResponse | None:
+        response: SMTPResponse | None
+        try:
+            client, opened = await self._checkout()
+            if reconnect and not opened:
+                # Idle connections may have been dropped by the server as well
+                client = await self._reopen(client)
+        except (aiosmtplib.SMTPException, IOError) as exc:
+            response = self._connect_error_response(exc)
+            if not self.fail_silently:
+                raise
+            return response
+
+        try:
+            response = await client.sendmail(**kwargs)
+        except BaseException:
+            await self.discard(client)
+            raise
+        await self.checkin(client)
+        return response
+
+    async def _send_with_retry(self, **kwargs: Any) -> SMTPResponse | None:
+        try:
+            return await self._send(**kwargs)
+        except aiosmtplib.SMTPServerDisconnected:
+            # the broken connection is already discarded, retry on a new one
+            logger.debug('SMTPServerDisconnected, retry once')
+            return await self._send(reconnect=True, **kwargs)
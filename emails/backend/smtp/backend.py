@@ -2,14 +2,14 @@ from __future__ import annotations
 
 import logging
 import smtplib
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from functools import wraps
 from types import TracebackType
-from typing import Any
+from typing import Any, cast
 
-from ..response import SMTPResponse
+from ..response import SMTPResponse, SendResult
 from .client import SMTPClientWithResponse, SMTPClientWithResponse_SSL
-from ...utils import DNS_NAME
+from ...utils import DNS_NAME, MessageChunks
 from .exceptions import SMTPConnectNetworkError
 
 
@@ -31,7 +31,8 @@ class SMTPBackend:
     response_cls = SMTPResponse
 
     def __init__(self, ssl: bool = False, fail_silently: bool = True,
-                 mail_options: list[str] | None = None, **kwargs: Any) -> None:
+                 mail_options: list[str] | None = None, stream: bool = False,
+                 **kwargs: Any) -> None:
 
         self.smtp_cls = self.connection_ssl_cls if ssl else self.connection_cls
 
@@ -52,6 +53,7 @@ class SMTPBackend:
         self.port: int = kwargs['port']  # always set as int two lines above
         self.fail_silently = fail_silently
         self.mail_options = mail_options or []
+        self.stream = stream
 
         self._client: SMTPClientWithResponse | None = None
 
@@ -79,6 +81,16 @@ class SMTPBackend:
     def make_response(self, exception: Exception | None = None) -> SMTPResponse:
         return self.response_cls(backend=self, exception=exception)
 
+    def _message_data(self, msg: Any) -> bytes | MessageChunks:
+        # With stream=True, or with attachments read from disk, the client
+        # writes the message chunk by chunk instead of getting it as one
+        # bytes object
+        if isinstance(msg, bytes):
+            return msg
+        if hasattr(msg, 'iter_bytes') and (self.stream or getattr(msg, 'has_file_attachments', False) is True):
+            return MessageChunks(msg)
+        return cast(bytes, msg.as_bytes())
+
     def retry_on_disconnect(self, func: Callable[..., SMTPResponse | None]) -> Callable[..., SMTPResponse | None]:
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> SMTPResponse | None:
@@ -124,7 +136,7 @@ class SMTPBackend:
 
         response = send(from_addr=from_addr,
                         to_addrs=to_addrs,
-                        msg=msg.as_bytes(),
+                        msg=self._message_data(msg),
                         mail_options=mail_options or self.mail_options,
                         rcpt_options=rcpt_options)
 
@@ -133,6 +145,35 @@ class SMTPBackend:
 
         return response
 
+    def send_messages(self, messages: Iterable[Any],
+                      mail_options: list[str] | None = None,
+                      rcpt_options: list[str] | None = None) -> list[SendResult | None]:
+        """
+        Sends messages one after another over the open connection.
+
+        Each item is a Message (sent from its mail_from to all its recipients)
+        or a dict of sendmail() arguments. Items are consumed lazily, so
+        messages may be produced by a generator. An exception item is not
+        sent, it is recorded as the failure of that item.
+
+        Returns SendResult per item, None for items without recipients.
+        """
+        results: list[SendResult | None] = []
+        for item in messages:
+            if isinstance(item, Exception):
+                results.append(SendResult.from_error(item))
+                continue
+            if isinstance(item, dict):
+                params = dict(item)
+            else:
+                params = dict(from_addr=item.mail_from[1],
+                              to_addrs=item.get_recipients_emails(),
+                              msg=item)
+            params.setdefault('mail_options', mail_options)
+            params.setdefault('rcpt_options', rcpt_options)
+            results.append(SendResult.from_response(self.sendmail(**params)))
+        return results
+
     def __enter__(self) -> SMTPBackend:
         return self
 
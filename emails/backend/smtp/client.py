@@ -3,16 +3,64 @@ from __future__ import annotations
 __all__ = ['SMTPClientWithResponse', 'SMTPClientWithResponse_SSL']
 
 import smtplib
-from smtplib import _have_ssl, SMTP  # noqa: private API
+from smtplib import _have_ssl, SMTP, CRLF, bCRLF, quoteaddr  # noqa: private API
 import logging
+from collections.abc import Iterable, Iterator
 from ..response import SMTPResponse
 from ...utils import sanitize_email
 
 logger = logging.getLogger(__name__)
 
 
+def iter_slices(msg: bytes | memoryview | Iterable[bytes], size: int) -> Iterator[memoryview]:
+    """
+    Yields the message, given as bytes or an iterable of bytes chunks,
+    in pieces of at most size bytes.
+    """
+    items: Iterable[bytes | memoryview]
+    if isinstance(msg, (bytes, bytearray, memoryview)):
+        items = (msg, )
+    else:
+        items = msg
+    for item in items:
+        view = memoryview(item)
+        for start in range(0, len(view), size):
+            yield view[start:start + size]
+
+
+def encode_message(msg: bytes | str | Iterable[bytes]) -> bytes | Iterable[bytes]:
+    """
+    Returns a str message as ascii bytes with CRLF line endings, like
+    smtplib does in data(); bytes and iterables are returned unchanged.
+    """
+    if isinstance(msg, str):
+        return smtplib._fix_eols(msg).encode('ascii')
+    return msg
+
+
+def dot_stuffed(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Yields message chunks quoted for DATA like smtplib does for the whole
+    message (leading dots doubled), followed by the end of data marker.
+    """
+    line_start = True
+    tail = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        q = chunk.replace(b'\n.', b'\n..')
+        if line_start and q[:1] == b'.':
+            q = b'.' + q
+        yield q
+        line_start = chunk[-1:] == b'\n'
+        tail = (tail + chunk[-2:])[-2:]
+    yield (tail != bCRLF and bCRLF or b'') + b'.' + bCRLF
+
+
 class SMTPClientWithResponse(SMTP):
 
+    DEFAULT_CHUNK_SIZE = 1024 * 1024
+
     def __init__(self, parent, **kwargs):
 
         self._initialized = False
@@ -24,6 +72,11 @@ class SMTPClientWithResponse(SMTP):
         self.debug = kwargs.pop('debug', 0)
         self.user = kwargs.pop('user', None)
         self.password = kwargs.pop('password', None)
+        self.pipelining = kwargs.pop('pipelining', True)
+        self.chunking = kwargs.pop('chunking', True)
+        self.chunk_size = kwargs.pop('chunk_size', self.DEFAULT_CHUNK_SIZE)
+        if self.chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
 
         SMTP.__init__(self, **kwargs)
 
@@ -57,8 +110,70 @@ class SMTPClientWithResponse(SMTP):
         except smtplib.SMTPServerDisconnected:
             pass
 
+    def _use_pipelining(self) -> bool:
+        return bool(self.pipelining and self.does_esmtp and self.has_extn('pipelining'))
+
+    def _pipeline_envelope(self, from_addr: str, esmtp_opts: list[str],
+                          to_addrs: list[str], rcpt_options: list[str]) -> list[tuple[int, bytes]]:
+        """
+        Sends MAIL FROM and all RCPT TO commands in one write (RFC 2920)
+        and returns their replies in the same order.
+        """
+        mail_optionlist = ''
+        if esmtp_opts:
+            if any(x.lower() == 'smtputf8' for x in esmtp_opts):
+                if self.has_extn('smtputf8'):
+                    self.command_encoding = 'utf-8'
+                else:
+                    raise smtplib.SMTPNotSupportedError('SMTPUTF8 not supported by server')
+            mail_optionlist = ' ' + ' '.join(esmtp_opts)
+        rcpt_optionlist = rcpt_options and ' ' + ' '.join(rcpt_options) or ''
+
+        commands = ['mail FROM:%s%s' % (quoteaddr(from_addr), mail_optionlist)]
+        commands.extend(['rcpt TO:%s%s' % (quoteaddr(a), rcpt_optionlist) for a in to_addrs])
+        for cmd in commands:
+            if '\r' in cmd or '\n' in cmd:
+                raise ValueError('command and arguments contain prohibited newline characters: %r' % cmd)
+
+        self.send(''.join([cmd + CRLF for cmd in commands]))
+        return [self.getreply() for _ in commands]
+
+    def _use_chunking(self) -> bool:
+        return bool(self.chunking and self.does_esmtp and self.has_extn('chunking'))
+
+    def bdat(self, msg: bytes | str | Iterable[bytes]) -> tuple[int, bytes]:
+        """
+        Sends the message with BDAT commands (RFC 3030) in chunk_size pieces.
+        Unlike data(), the message is sent as is, without dot-stuffing.
+        Returns the reply to the last chunk or the first error reply.
+        """
+        chunks = iter_slices(encode_message(msg), self.chunk_size)
+        chunk = next(chunks, b'')
+        while True:
+            next_chunk = next(chunks, None)
+            last = next_chunk is None
+            self.send('BDAT %d%s%s' % (len(chunk), last and ' LAST' or '', CRLF))
+            self.send(chunk)
+            (code, resp) = self.getreply()
+            if last or code != 250:
+                return (code, resp)
+            chunk = next_chunk
+
+    def data_stream(self, chunks: Iterable[bytes]) -> tuple[int, bytes]:
+        """
+        Like data(), but sends the message given as an iterable of bytes
+        chunks, quoting each chunk as it goes.
+        """
+        self.putcmd('data')
+        (code, repl) = self.getreply()
+        if code != 354:
+            raise smtplib.SMTPDataError(code, repl)
+        for q in dot_stuffed(chunks):
+            self.send(q)
+        return self.getreply()
+
     def sendmail(self, from_addr: str, to_addrs: list[str] | str,
-                 msg: bytes, mail_options: list[str] | None = None,
+                 msg: bytes | Iterable[bytes], mail_options: list[str] | None = None,
                  rcpt_options: list[str] | None = None) -> SMTPResponse | None:
 
         if not to_addrs:
@@ -68,7 +183,7 @@ class SMTPClientWithResponse(SMTP):
         mail_options = mail_options or []
         esmtp_opts = []
         if self.does_esmtp:
-            if self.has_extn('size'):
+            if self.has_extn('size') and isinstance(msg, (bytes, str)):
                 esmtp_opts.append("size=%d" % len(msg))
             for option in mail_options:
                 esmtp_opts.append(option)
@@ -80,7 +195,19 @@ class SMTPClientWithResponse(SMTP):
         response.from_addr = from_addr
         response.esmtp_opts = esmtp_opts[:]
 
-        (code, resp) = self.mail(from_addr, esmtp_opts)
+        if not isinstance(to_addrs, (list, tuple)):
+            to_addrs = [to_addrs]
+
+        to_addrs = [sanitize_email(e) for e in to_addrs]
+
+        if self._use_pipelining():
+            replies = self._pipeline_envelope(from_addr, esmtp_opts, to_addrs, rcpt_options)
+            (code, resp) = replies[0]
+            rcpt_replies = replies[1:]
+        else:
+            (code, resp) = self.mail(from_addr, esmtp_opts)
+            rcpt_replies = None
+
         response.set_status('mail', code, resp)
 
         if code != 250:
@@ -89,17 +216,15 @@ class SMTPClientWithResponse(SMTP):
             response.set_exception(exc)
             return response
 
-        if not isinstance(to_addrs, (list, tuple)):
-            to_addrs = [to_addrs]
-
-        to_addrs = [sanitize_email(e) for e in to_addrs]
-
         response.to_addrs = to_addrs
         response.rcpt_options = rcpt_options[:]
         response.refused_recipients = {}
 
-        for a in to_addrs:
-            (code, resp) = self.rcpt(a, rcpt_options)
+        for n, a in enumerate(to_addrs):
+            if rcpt_replies is None:
+                (code, resp) = self.rcpt(a, rcpt_options)
+            else:
+                (code, resp) = rcpt_replies[n]
             response.set_status('rcpt', code, resp, recipient=a)
             if (code != 250) and (code != 251):
                 response.refused_recipients[a] = (code, resp)
@@ -111,8 +236,15 @@ class SMTPClientWithResponse(SMTP):
             response.set_exception(exc)
             return response
 
-        (code, resp) = self.data(msg)
-        response.set_status('data', code, resp)
+        if self._use_chunking():
+            (code, resp) = self.bdat(msg)
+            response.set_status('bdat', code, resp)
+        elif isinstance(msg, (bytes, str)):
+            (code, resp) = self.data(msg)
+            response.set_status('data', code, resp)
+        else:
+            (code, resp) = self.data_stream(msg)
+            response.set_status('data', code, resp)
         if code != 250:
             self._rset()
             exc = smtplib.SMTPDataError(code, resp)
@@ -1,4 +1,4 @@
-import socket
+import smtplib
 
 
 class SMTPConnectNetworkError(IOError):
@@ -11,3 +11,7 @@ class SMTPConnectNetworkError(IOError):
         o.filename = exc.filename
         o.strerror = exc.strerror or str(exc)
         return o
+
+
+class SMTPPoolTimeout(smtplib.SMTPException):
+    """No pooled connection became free in time."""
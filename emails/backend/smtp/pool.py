@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import logging
+import smtplib
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any
+
+from ..factory import ObjectFactory
+from ..response import SMTPResponse
+from .backend import SMTPBackend
+from .client import SMTPClientWithResponse
+from .exceptions import SMTPConnectNetworkError, SMTPPoolTimeout
+
+
+__all__ = ['SMTPPoolBackend', 'SMTPPoolFactory']
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+
+    __slots__ = ('client', 'generation', 'messages', 'last_used')
+
+    def __init__(self, client: SMTPClientWithResponse, generation: int) -> None:
+        self.client = client
+        self.generation = generation
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPoolBackend(SMTPBackend):
+
+    """
+    SMTPPoolBackend keeps a bounded pool of smtp connections to one server
+    and is safe to share between threads.
+
+    Each sendmail() call checks out a connection, sends one transaction
+    and returns the connection to the pool. Idle connections are checked
+    with NOOP before reuse.
+    """
+
+    DEFAULT_MAX_CONNECTIONS = 8
+
+    def __init__(self,
+                 min_connections: int = 0,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 idle_timeout: float | None = 60,
+                 max_messages_per_connection: int | None = None,
+                 check_interval: float = 1.0,
+                 checkout_timeout: float | None = None,
+                 **kwargs: Any) -> None:
+
+        super(SMTPPoolBackend, self).__init__(**kwargs)
+
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+        if min_connections > max_connections:
+            raise ValueError("min_connections can't be greater than max_connections")
+
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.check_interval = check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._idle: deque[_PooledConnection] = deque()
+        self._size = 0  # idle + checked out + connecting
+        self._generation = 0
+        self._warmed_up = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _open(self) -> _PooledConnection:
+        return _PooledConnection(self.smtp_cls(parent=self, **self.smtp_cls_kwargs),
+                                 generation=self._generation)
+
+    def _quit(self, conn: _PooledConnection) -> None:
+        try:
+            conn.client.quit()
+        except Exception:
+            logger.debug('Error closing pooled smtp connection', exc_info=True)
+
+    def _is_expired(self, conn: _PooledConnection, now: float) -> bool:
+        if conn.generation != self._generation:
+            return True
+        if self.idle_timeout is not None and now - conn.last_used > self.idle_timeout:
+            return True
+        return False
+
+    def _is_alive(self, conn: _PooledConnection, now: float) -> bool:
+        if now - conn.last_used < self.check_interval:
+            return True
+        try:
+            code, _ = conn.client.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        return code == 250
+
+    def warm_up(self) -> None:
+        """
+        Opens connections until the pool holds at least min_connections.
+        """
+        self._warmed_up = True
+        while True:
+            with self._cond:
+                if self._size >= self.min_connections:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def checkout(self) -> _PooledConnection:
+        """
+        Takes a live connection from the pool, opens a new one if the pool
+        is not full or waits for a connection to be returned.
+        """
+        if not self._warmed_up and self.min_connections:
+            try:
+                self.warm_up()
+            except (smtplib.SMTPException, OSError):
+                logger.debug('Pool warm up failed', exc_info=True)
+
+        deadline = None
+        if self.checkout_timeout is not None:
+            deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = None
+            exhausted = False
+            stale: list[_PooledConnection] = []
+
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()  # most recently used first
+                        if self._is_expired(candidate, now):
+                            self._size -= 1
+                            stale.append(candidate)
+                        else:
+                            conn = candidate
+                            break
+                    if conn is not None:
+                        break
+                    if self._size < self.max_connections:
+                        self._size += 1
+                        break
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline - now
+                        if timeout <= 0:
+                            exhausted = True
+                            break
+                    self._cond.wait(timeout)
+
+            for c in stale:
+                self._quit(c)
+
+            if exhausted:
+                raise SMTPPoolTimeout("No free smtp connection in %s seconds" % self.checkout_timeout)
+
+            if conn is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_alive(conn, time.monotonic()):
+                return conn
+
+            logger.debug('Pooled smtp connection is dead, discard it')
+            self.discard(conn)
+
+    def checkin(self, conn: _PooledConnection) -> None:
+        """
+        Returns a connection to the pool.
+        """
+        conn.messages += 1
+        conn.last_used = time.monotonic()
+        limit = self.max_messages_per_connection
+        if (limit and conn.messages >= limit) or conn.generation != self._generation:
+            self.discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def discard(self, conn: _PooledConnection) -> None:
+        """
+        Closes a checked out connection and frees its slot in the pool.
+        """
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._quit(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[SMTPClientWithResponse]:
+        """
+        Context manager with a checked out client:
+
+            with backend.connection() as client:
+                client.noop()
+        """
+        conn = self.checkout()
+        try:
+            yield conn.client
+        except BaseException:
+            self.discard(conn)
+            raise
+        else:
+            self.checkin(conn)
+
+    def close(self) -> None:
+
+        """
+        Closes idle connections. Connections in use are closed when returned.
+        """
+
+        with self._cond:
+            self._generation += 1
+            self._warmed_up = False
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._quit(conn)
+
+        super(SMTPPoolBackend, self).close()
+
+    def retry_on_disconnect(self, func: Callable[..., SMTPResponse | None]) -> Callable[..., SMTPResponse | None]:
+        # _send already dropped the broken connection, the retry takes another one
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> SMTPResponse | None:
+            try:
+                return func(*args, **kwargs)
+            except smtplib.SMTPServerDisconnected:
+                logger.debug('SMTPServerDisconnected, retry once')
+                return func(*args, **kwargs)
+        return wrapper
+
+    def _send(self, **kwargs: Any) -> SMTPResponse | None:
+
+        try:
+            conn = self.checkout()
+        except smtplib.SMTPException as exc:
+            if not self.fail_silently:
+                raise
+            return self.make_response(exception=exc)
+        except IOError as exc:
+            if not self.fail_silently:
+                raise
+            return self.make_response(exception=SMTPConnectNetworkError.from_ioerror(exc))
+
+        try:
+            response = conn.client.sendmail(**kwargs)
+        except BaseException:
+            self.discard(conn)
+            raise
+        self.checkin(conn)
+        return response
+
+
+class SMTPPoolFactory(ObjectFactory):
+
+    """
+    Process-wide factory of pooled backends, one per settings dict.
+
+    Set as Message.smtp_pool_factory to share smtp connections between
+    messages and threads:
+
+        Message.smtp_pool_factory = SMTPPoolFactory
+    """
+
+    backend_cls = SMTPPoolBackend
+
+    _pools: dict[type, dict[str, Any]] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, cls: type | None = None) -> None:
+        if cls is None or not issubclass(cls, SMTPPoolBackend):
+            cls = self.backend_cls
+        super(SMTPPoolFactory, self).__init__(cls=cls)
+        self.lock = self._pools_lock
+        with self.lock:
+            self.pool = self._pools.setdefault(cls, {})
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._pools_lock:
+            backends = [b for pool in cls._pools.values() for b in pool.values()]
+        for backend in backends:
+            backend.close()
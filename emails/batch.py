@@ -0,0 +1,225 @@
+# Rendering and signing many messages in a process pool
+from __future__ import annotations
+
+import os
+import pickle
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, TYPE_CHECKING
+
+from .message import RFC5321_LINESEP
+from .signers import DKIMBodyHash, DKIMMultiSigner, DKIMSigner
+from .utils import split_message_bytes
+
+if TYPE_CHECKING:
+    from .message import Message
+
+
+__all__ = ['render_parallel', 'sign_many']
+
+
+# Per-process state set up by _init_worker
+_worker_message: Any = None
+_worker_compiled: Any = None
+
+
+def _init_worker(message_data: bytes, compiled: bool) -> None:
+    global _worker_message, _worker_compiled
+    _worker_message = pickle.loads(message_data)
+    _worker_compiled = compiled and _worker_message.compile() or None
+
+
+def _split_item(item: Any, default_render: dict[str, Any]) -> tuple[Any, dict[str, Any]]:
+    if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], dict):
+        return item
+    return item, default_render
+
+
+def _render_message(message: Message, item: Any, compiled: Any = None,
+                    default_render: dict[str, Any] | None = None,
+                    **send_params: Any) -> dict[str, Any] | ValueError:
+    """
+    Renders message for one item of render_parallel() and returns
+    sendmail() arguments with msg as bytes, or the ValueError for an
+    item without a valid address.
+    """
+    to, render = _split_item(item, default_render or {})
+    try:
+        if not to:
+            # Don't fall back to the previous item's mail_to
+            raise ValueError('No to-addr')
+        params = message._prepare_send_params(to=to, render=render, **send_params)
+    except ValueError as exc:
+        return exc
+    params['msg'] = compiled.as_bytes() if compiled is not None else message.as_bytes()
+    return params
+
+
+def _render_batch(items: list[Any], default_render: dict[str, Any],
+                  send_params: dict[str, Any]) -> list[dict[str, Any] | ValueError]:
+    return [_render_message(_worker_message, item, compiled=_worker_compiled,
+                            default_render=default_render, **send_params)
+            for item in items]
+
+
+def render_parallel(message: Message,
+                    contexts: Iterable[Any],
+                    workers: int | None = None,
+                    batch_size: int = 32,
+                    compiled: bool = False,
+                    mp_context: Any = None,
+                    **send_params: Any) -> Iterator[dict[str, Any] | ValueError]:
+    """
+    Renders and serializes message for many recipients in worker processes.
+
+    Template rendering, message building and DKIM signing are CPU-bound,
+    so threads don't speed them up, processes do.
+
+    Items of `contexts` are the same as for Message.send_many(): an address
+    or a pair (address, render_context). `send_params` are passed on as for
+    Message.send() (set_mail_to, mail_from, smtp_mail_options...).
+
+    Yields dicts of sendmail() arguments (from_addr, to_addrs, msg as bytes,
+    mail_options, rcpt_options) in the order of `contexts`, which may be
+    consumed by SMTPBackend.send_messages(). An item without a valid
+    address yields its ValueError instead, send_messages() records it as
+    that item's failure. `contexts` are read lazily, at most two batches
+    per worker are in flight.
+
+    The message is pickled once and sent to every worker, it must not
+    hold unpicklable objects (e.g. a lambda as date).
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+
+    workers = workers or os.cpu_count() or 1
+    default_render = dict(message.render_data or {})
+    message_data = pickle.dumps(message)
+    return _iter_rendered(message_data, iter(contexts), workers, batch_size, compiled,
+                          mp_context, default_render, send_params)
+
+
+def _iter_rendered(message_data: bytes, items: Iterator[Any], workers: int, batch_size: int,
+                   compiled: bool, mp_context: Any, default_render: dict[str, Any],
+                   send_params: dict[str, Any]) -> Iterator[dict[str, Any] | ValueError]:
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                             initializer=_init_worker,
+                             initargs=(message_data, compiled)) as executor:
+
+        pending: deque[Future] = deque()
+
+        def submit() -> bool:
+            batch = list(islice(items, batch_size))
+            if batch:
+                pending.append(executor.submit(_render_batch, batch, default_render, send_params))
+            return bool(batch)
+
+        try:
+            while len(pending) < workers * 2 and submit():
+                pass
+            while pending:
+                results = pending.popleft().result()
+                submit()
+                yield from results
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+# Per-process signers, by their pickled data
+_worker_signers: dict[bytes, DKIMSigner] = {}
+
+
+def _sign_header(signer_data: bytes, header: bytes, body_hash: DKIMBodyHash) -> bytes | None:
+    # The key of a signer is parsed once per worker process
+    signer = _worker_signers.get(signer_data)
+    if signer is None:
+        signer = _worker_signers[signer_data] = pickle.loads(signer_data)
+    return signer.get_sign_bytes_for_body(header, body_hash)
+
+
+def _sign_with(signer: DKIMSigner, header: bytes, body_hash: DKIMBodyHash) -> bytes | None:
+    return signer.get_sign_bytes_for_body(header, body_hash)
+
+
+def _prepare_signed(message: Message) -> tuple[bytes, list[bytes], list[tuple[DKIMSigner, DKIMBodyHash]]]:
+    # Builds the message and hashes its body for each of its signers
+    signer = message._signer
+    signers: list[DKIMSigner] = list(getattr(signer, 'signers', [signer])) if signer else []
+    body_hashes = DKIMMultiSigner(signers).body_hashes()
+    distinct = list(dict((id(h), h) for h in body_hashes).values())
+
+    header, body = split_message_bytes(message.build_message(), linesep=RFC5321_LINESEP)
+    chunks = []
+    for chunk in body:
+        for h in distinct:
+            h.update(chunk)
+        chunks.append(chunk)
+    return header, chunks, list(zip(signers, body_hashes))
+
+
+def sign_many(messages: Iterable[Message],
+              workers: int | None = None,
+              executor: Executor | None = None,
+              mp_context: Any = None,
+              batch_size: int = 32) -> Iterator[bytes]:
+    """
+    Yields messages as signed bytes, same as (m.as_bytes() for m in messages).
+
+    Messages are built and their bodies hashed in this process. Only the
+    header blocks and body hashes go to worker processes, where the
+    signatures are computed, so message bodies are not copied between
+    processes.
+
+    Messages are read and signed batch_size at a time, the next batch is
+    built while the previous one is signed, so at most two batches are
+    held in memory.
+
+    dkimpy computes RSA signatures in Python code and holds the GIL,
+    so a process pool of `workers` processes is used by default.
+    An existing pool may be passed as `executor`, e.g. a ThreadPoolExecutor
+    when signing with Ed25519 keys only.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+    return _iter_signed(iter(messages), workers or os.cpu_count() or 1, executor, mp_context, batch_size)
+
+
+def _iter_signed(messages: Iterator[Message], workers: int, executor: Executor | None,
+                 mp_context: Any, batch_size: int) -> Iterator[bytes]:
+
+    pool: ProcessPoolExecutor | None = None
+    # Pickled signers, with the signers so their ids are not reused
+    pickled: dict[int, tuple[DKIMSigner, bytes]] = {}
+
+    def submit(signer: DKIMSigner, header: bytes, body_hash: DKIMBodyHash) -> Future:
+        nonlocal pool
+        if executor is not None:
+            return executor.submit(_sign_with, signer, header, body_hash)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context)
+        if id(signer) not in pickled:
+            pickled[id(signer)] = (signer, pickle.dumps(signer))
+        return pool.submit(_sign_header, pickled[id(signer)][1], header, body_hash)
+
+    def prepare() -> list[tuple[bytes, list[bytes], list[Future]]] | None:
+        batch = [_prepare_signed(m) for m in islice(messages, batch_size)]
+        if not batch:
+            return None
+        return [(header, chunks, [submit(signer, header, body_hash) for (signer, body_hash) in signed])
+                for (header, chunks, signed) in batch]
+
+    pending = prepare()
+    try:
+        while pending is not None:
+            current, pending = pending, prepare()
+            for (header, chunks, futures) in current:
+                # The last signer's header goes first, as with DKIMMultiSigner
+                sigs = [s for s in (f.result() for f in futures) if s]
+                yield b''.join(reversed(sigs)) + header + b''.join(chunks)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
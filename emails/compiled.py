@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import copy
+import itertools
+from collections.abc import Callable, Iterator
+from email.generator import BytesGenerator
+from typing import Any, cast, TYPE_CHECKING
+
+from .message import RFC5321_LINESEP
+from .utils import (SafeMIMEMultipart, FileMIMEPart, split_message_bytes,
+                    _iter_part_bytes, _iter_leaf_payloads, _set_stream_boundary, STREAM_CHUNK_SIZE)
+
+if TYPE_CHECKING:
+    from .message import Message, _AddressList
+
+_HTML = 'html'
+_TEXT = 'text'
+
+
+class CompiledMessage:
+
+    """
+    Message serialized once for sending to many recipients.
+
+    The MIME tree is built and flattened once, with the root headers and
+    the html and text parts left out. Each as_bytes() call renders only
+    these pieces and joins them with the prepared bytes of the containers
+    and attachments.
+
+    Attachments, boundaries and the before_build/after_build hooks are
+    fixed at compile time, call Message.compile() again after changing them.
+    Attachments read from disk (FileAttachment) are not prepared, they are
+    encoded as the chunks of every message are consumed.
+
+    Calls don't change the compiled message, so it may be used from
+    several threads at once.
+    """
+
+    def __init__(self, message: Message, message_cls: type | None = None) -> None:
+        self.message = message
+        self.message_cls = message_cls or SafeMIMEMultipart
+        self.compile()
+
+    def compile(self) -> None:
+        root = self.message.build_message(message_cls=self.message_cls)
+        self._policy = root.policy.clone(linesep=RFC5321_LINESEP)
+        self._root = root
+        self._slots = self._find_slots(root)
+        self._segments, self._file_parts = self._serialize(root, self._slots)
+        self._boundaries = [('--' + _set_stream_boundary(part)).encode('ascii')
+                            for part in root.walk() if part.is_multipart()]
+
+    @staticmethod
+    def _find_slots(root: Any) -> dict[str, Any]:
+        slots: dict[str, Any] = {}
+        for part in root.walk():
+            if part.is_multipart() or part.get('Content-Disposition') is not None:
+                continue
+            slot = {'text/html': _HTML, 'text/plain': _TEXT}.get(part.get_content_type())
+            if slot and slot not in slots:
+                slots[slot] = part
+        return slots
+
+    def _serialize(self, root: Any, slots: dict[str, Any]) -> tuple[list[Any], list[FileMIMEPart]]:
+        # Returns the prepared segments and the parts of files read from disk
+        placeholders: dict[int, Any] = dict((id(part), slot) for (slot, part) in slots.items())
+        # Files read from disk are not kept, they are encoded on every call
+        file_parts = [part for part in root.walk() if isinstance(part, FileMIMEPart)]
+        placeholders.update((id(part), part) for part in file_parts)
+        segments: list[Any] = []
+        buf = bytearray()
+        for piece in _iter_part_bytes(root, self._policy, 1024 * 1024,
+                                      placeholders=placeholders, headers=False):
+            if isinstance(piece, bytes):
+                buf += piece
+            else:
+                if buf:
+                    segments.append(bytes(buf))
+                    buf.clear()
+                segments.append(piece)
+        if buf:
+            segments.append(bytes(buf))
+        return segments, file_parts
+
+    def _with_new_boundaries(self, rendered: list[bytes]) -> tuple[Any, list[Any]]:
+        # A rendered body contains one of the boundaries, pick new ones on
+        # a copy of the tree, the compiled message is shared between calls
+        root = copy.deepcopy(self._root)
+        for part in root.walk():
+            if not part.is_multipart():
+                continue
+            while True:
+                boundary = cast(str, getattr(BytesGenerator, '_make_boundary')())
+                marker = ('--' + boundary).encode('ascii')
+                if not any(boundary in text for text in _iter_leaf_payloads(part)) and \
+                        not any(marker in data for data in rendered):
+                    part.set_boundary(boundary)
+                    break
+        segments, _ = self._serialize(root, self._find_slots(root))
+        return root, segments
+
+    def _personalize(self, mail_to: _AddressList = None,
+                     render: dict[str, Any] | None = None) -> Message:
+        message = copy.copy(self.message)
+        if mail_to is not None:
+            message.set_mail_to(mail_to)
+        if render is not None:
+            message.render_data = render
+        return message
+
+    def _part_bytes(self, part: Any) -> bytes:
+        return b''.join(_iter_part_bytes(part, self._policy, 1024 * 1024))
+
+    def _iter_body(self, segments: list[Any], rendered: dict[str, bytes]) -> Iterator[bytes]:
+        for s in segments:
+            if isinstance(s, bytes):
+                yield s
+            elif isinstance(s, str):
+                yield rendered[s]
+            else:
+                yield from _iter_part_bytes(s, self._policy, STREAM_CHUNK_SIZE)
+
+    def _render(self, message: Message) -> tuple[bytes, Callable[[], Iterator[bytes]]]:
+        # Returns the header block and a function returning the body chunks
+        parts = {_HTML: message._build_html_part(), _TEXT: message._build_text_part()}
+        if set(k for (k, v) in parts.items() if v is not None) != set(self._slots):
+            # The rendered message has a different structure, build it as a whole
+            msg = message.build_message(message_cls=self.message_cls)
+            header, _ = split_message_bytes(msg, linesep=RFC5321_LINESEP)
+            return header, lambda: split_message_bytes(msg, linesep=RFC5321_LINESEP, chunk_size=1024 * 1024)[1]
+
+        rendered = dict((k, self._part_bytes(v)) for (k, v) in parts.items() if v is not None)
+        tree, segments = self._root, self._segments
+        if any(b in data for data in rendered.values() for b in self._boundaries):
+            tree, segments = self._with_new_boundaries(list(rendered.values()))
+
+        root = message._build_root_message(self.message_cls, boundary=tree.get_boundary())
+        header = b''.join([self._policy.fold_binary(h, v) for (h, v) in root.raw_items()])
+
+        return header + RFC5321_LINESEP.encode('ascii'), lambda: self._iter_body(segments, rendered)
+
+    def iter_bytes(self, mail_to: _AddressList = None,
+                   render: dict[str, Any] | None = None) -> Iterator[bytes]:
+        """
+        Returns the message for given recipients and render context as
+        an iterator of bytes chunks. Prepared chunks are yielded as is.
+        """
+        message = self._personalize(mail_to=mail_to, render=render)
+        header, body = self._render(message)
+        if message._signer:
+            return message.iter_signed_chunks(header, body, streamed=bool(self._file_parts))
+        return itertools.chain([header], body())
+
+    def as_bytes(self, mail_to: _AddressList = None,
+                 render: dict[str, Any] | None = None) -> bytes:
+        """
+        Returns the message as bytes for given recipients and render context.
+        Without arguments, uses the current mail_to and render data of the message.
+        """
+        return b''.join(self.iter_bytes(mail_to=mail_to, render=render))
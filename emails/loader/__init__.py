@@ -1,3 +1,5 @@
+import asyncio
+import codecs
 import os.path
 from email.utils import formataddr
 
@@ -22,12 +24,12 @@ class InvalidHtmlFile(LoadError):
 
 def from_html(html, text=None, base_url=None, message_params=None, local_loader=None,
               template_cls=None, message_cls=None, source_filename=None, requests_params=None,
-              **kwargs):
+              fetcher=None, **kwargs):
 
     """
     Loads message from html string with images from local_loader.
 
-    :param html: html string
+    :param html: html string or parsed lxml tree
     :param base_url: base_url for html
     :param text: text string or None
     :param template_cls: if set, html and text are set with this template class
@@ -36,10 +38,43 @@ def from_html(html, text=None, base_url=None, message_params=None, local_loader=
     :param message_params: parameters for Message constructor
     :param source_filename: source html file name (used for exception description on html parsing error)
     :param requests_params: parameters for external url handling
+    :param fetcher: emails.utils.HTTPFetcher for external urls, default is the shared one
     :param kwargs: arguments for transformer.load_and_transform
     :return:
     """
 
+    message = _create_message(html, text=text, base_url=base_url, message_params=message_params,
+                              local_loader=local_loader, template_cls=template_cls,
+                              message_cls=message_cls, source_filename=source_filename,
+                              requests_params=requests_params, fetcher=fetcher)
+    message.transformer.load_and_transform(**kwargs)
+    message.transformer.save()
+    message._loader = local_loader
+    return message
+
+
+async def from_html_async(html, text=None, base_url=None, message_params=None, local_loader=None,
+                          template_cls=None, message_cls=None, source_filename=None, requests_params=None,
+                          fetcher=None, **kwargs):
+    """
+    Same as from_html(), stylesheets and images are loaded concurrently
+    without blocking the running loop.
+
+    :param kwargs: arguments for transformer.load_and_transform_async
+    """
+    message = _create_message(html, text=text, base_url=base_url, message_params=message_params,
+                              local_loader=local_loader, template_cls=template_cls,
+                              message_cls=message_cls, source_filename=source_filename,
+                              requests_params=requests_params, fetcher=fetcher)
+    await message.transform_async(**kwargs)
+    message._loader = local_loader
+    return message
+
+
+def _create_message(html, text=None, base_url=None, message_params=None, local_loader=None,
+                    template_cls=None, message_cls=None, source_filename=None, requests_params=None,
+                    fetcher=None):
+
     if template_cls is None:
         template_cls = lambda x: x
 
@@ -48,44 +83,123 @@ def from_html(html, text=None, base_url=None, message_params=None, local_loader=
     _param_html = message_params.pop('html', None)
     _param_text = message_params.pop('text', None)
 
+    # html may be parsed already, message html is set from the tree then
+    tree = None
+    if hasattr(html, 'getroottree'):
+        tree, html = html, None
+
     message = (message_cls or Message)(html=template_cls(html or _param_html or ''),
                                        text=template_cls(text or _param_text),
                                        **message_params)
     message.create_transformer(requests_params=requests_params,
+                               fetcher=fetcher,
                                base_url=base_url,
-                               local_loader=local_loader)
+                               local_loader=local_loader,
+                               tree=tree)
     if message.transformer.tree is None:
         raise InvalidHtmlFile("Error parsing '%s'" % source_filename)
-    message.transformer.load_and_transform(**kwargs)
-    message.transformer.save()
-    message._loader = local_loader
     return message
 
 
 from_string = from_html
 
 
-def from_url(url, requests_params=None, **kwargs):
+def _extract_base_url(url):
+    # /a/b.html -> /a
+    p = list(urlparse.urlparse(url))[:5]
+    p[2] = os.path.split(p[2])[0]
+    return urlparse.urlunsplit(p)
+
+
+# Bytes of the page read before its charset is guessed
+CHARSET_SNIFF_SIZE = 4096
+
 
-    def _extract_base_url(url):
-        # /a/b.html -> /a
-        p = list(urlparse.urlparse(url))[:5]
-        p[2] = os.path.split(p[2])[0]
-        return urlparse.urlunsplit(p)
+def _is_ascii(charset):
+    try:
+        return codecs.lookup(charset).name == 'ascii'
+    except LookupError:
+        return False
 
-    # Load html page
-    r = fetch_url(url, requests_args=requests_params)
-    html = r.content
-    html = html.decode(guess_charset(r.headers, html) or 'utf-8')
-    html = html.replace('\r\n', '\n')  # Remove \r
 
-    return from_html(html,
+def _parse_page(r, chunk_size=64 * 1024):
+    """
+    Parses the page while it is read from response r, the charset is
+    guessed from headers and the first bytes (utf-8 if they don't tell
+    more than ascii). Returns lxml tree, html
+    text if the parser can't parse incrementally, or None if the page
+    has no elements.
+    """
+    from lxml import etree
+    from ..transformer import MessageTransformer, get_parser  # avoid cyclic import
+
+    chunks = r.iter_content(chunk_size)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= CHARSET_SNIFF_SIZE:
+            break
+    charset = guess_charset(r.headers, head)
+    if charset is None or _is_ascii(charset):
+        # An ascii head doesn't mean an ascii page, utf-8 reads both
+        charset = 'utf-8'
+
+    backend = get_parser(MessageTransformer.default_parser_method)
+    try:
+        parser = backend.feed_parser(encoding=charset)
+    except LookupError:
+        # Charset unknown to the parser, let it guess
+        parser = backend.feed_parser()
+    if parser is None:
+        html = (head + b''.join(chunks)).decode(charset)
+        return html.replace('\r\n', '\n')  # Remove \r
+
+    if head:
+        parser.feed(head)
+    for chunk in chunks:
+        parser.feed(chunk)
+    try:
+        return parser.close()
+    except etree.XMLSyntaxError:
+        # Empty page
+        return None
+
+
+def _load_page(url, requests_params=None, fetcher=None):
+    r = fetch_url(url, requests_args=dict(requests_params or {}, stream=True), fetcher=fetcher)
+    with r:
+        return _parse_page(r)
+
+
+def from_url(url, requests_params=None, fetcher=None, **kwargs):
+
+    # Load html page, it is parsed as it is read
+    page = _load_page(url, requests_params=requests_params, fetcher=fetcher)
+
+    return from_html(page,
                      base_url=_extract_base_url(url),
                      source_filename=url,
                      requests_params=requests_params,
+                     fetcher=fetcher,
                      **kwargs)
 
 
+async def from_url_async(url, requests_params=None, fetcher=None, **kwargs):
+    """
+    Same as from_url(), for asyncio code. The page is loaded in the
+    default executor of the running loop, then its stylesheets and
+    images are loaded concurrently, see from_html_async().
+    """
+    page = await asyncio.to_thread(_load_page, url, requests_params=requests_params, fetcher=fetcher)
+
+    return await from_html_async(page,
+                                 base_url=_extract_base_url(url),
+                                 source_filename=url,
+                                 requests_params=requests_params,
+                                 fetcher=fetcher,
+                                 **kwargs)
+
+
 load_url = from_url
 
 
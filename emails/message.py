@@ -1,26 +1,33 @@
 from __future__ import annotations
 
-from collections.abc import Callable
+import copy
+import itertools
+from collections.abc import Callable, Iterable, Iterator
 from datetime import datetime
 from email.utils import getaddresses
-from typing import Any, IO
+from typing import Any, IO, TYPE_CHECKING
 
 from .utils import (formataddr,
                     SafeMIMEText, SafeMIMEMultipart, sanitize_address,
                     parse_name_and_email, load_email_charsets,
                     encode_header as encode_header_,
                     renderable, format_date_header, parse_name_and_email_list,
-                    cached_property, MessageID)
+                    cached_property, MessageID,
+                    iter_message_bytes, split_message_bytes, STREAM_CHUNK_SIZE,
+                    _has_file_parts)
 from .exc import BadHeaderError
 from .backend import ObjectFactory, SMTPBackend
-from .store import MemoryFileStore, BaseFile
-from .signers import DKIMSigner
+from .store import MemoryFileStore, BaseFile, FileAttachment
+from .signers import DKIMSigner, DKIMMultiSigner
 
 
 load_email_charsets()  # sic!
 
 RFC5321_LINESEP = '\r\n'
 
+if TYPE_CHECKING:
+    from .compiled import CompiledMessage
+
 
 # Type alias for email addresses accepted by the public API
 _Address = str | tuple[str | None, str] | None
@@ -202,10 +209,26 @@ class BaseMessage:
             self._attachments = self.filestore_cls(self.attachment_cls)
         return self._attachments
 
+    @property
+    def has_file_attachments(self) -> bool:
+        # Attachments read from disk, SMTP backends send such messages
+        # with iter_bytes()
+        return any(isinstance(f, FileAttachment) for f in self._attachments or [])
+
     def attach(self, **kwargs: Any) -> None:
+        """
+        Adds an attachment, given as data or as path of a file that is
+        read only when the message is serialized (see FileAttachment).
+        """
         if 'content_disposition' not in kwargs:
             kwargs['content_disposition'] = 'attachment'
-        self.attachments.add(kwargs)
+        if 'path' in kwargs:
+            self.attachments.add(FileAttachment(**kwargs))
+        else:
+            self.attachments.add(kwargs)
+
+    def __getstate__(self) -> dict[str, Any]:
+        return self.__dict__.copy()
 
 
 class MessageBuildMixin:
@@ -368,10 +391,39 @@ class MessageBuildMixin:
         """
         Returns message as bytes.
         """
-        r = self.build_message(message_cls=message_cls).as_bytes(linesep=RFC5321_LINESEP)
+        msg = self.build_message(message_cls=message_cls)
         if self._signer:
-            r = self.sign_bytes(r)
-        return r
+            return b''.join(self.sign_chunks(*split_message_bytes(msg, linesep=RFC5321_LINESEP)))
+        return msg.as_bytes(linesep=RFC5321_LINESEP)
+
+    def compile(self, message_cls: type | None = None) -> CompiledMessage:
+        """
+        Returns the message prepared for sending to many recipients,
+        see emails.compiled.CompiledMessage.
+        """
+        from .compiled import CompiledMessage
+        return CompiledMessage(self, message_cls=message_cls)
+
+    def iter_bytes(self, chunk_size: int = STREAM_CHUNK_SIZE,
+                   message_cls: type | None = None) -> Iterator[bytes]:
+        """
+        Returns an iterator over the message bytes, same as as_bytes()
+        but produced chunk by chunk.
+
+        The message is built at once, attachments are serialized only
+        as the iterator is consumed. DKIM header goes before the body,
+        so a signed message is serialized (and its body hashed) before
+        the first chunk is returned. A message with attachments read
+        from disk (FileAttachment) is serialized once more instead of
+        being kept in memory.
+        """
+        msg = self.build_message(message_cls=message_cls)
+        if self._signer:
+            header, _ = split_message_bytes(msg, linesep=RFC5321_LINESEP, chunk_size=chunk_size)
+            return self.iter_signed_chunks(
+                header, lambda: split_message_bytes(msg, linesep=RFC5321_LINESEP, chunk_size=chunk_size)[1],
+                streamed=_has_file_parts(msg))
+        return iter_message_bytes(msg, linesep=RFC5321_LINESEP, chunk_size=chunk_size)
 
 
 class MessageSendMixin:
@@ -383,6 +435,12 @@ class MessageSendMixin:
     def smtp_pool(self) -> ObjectFactory:
         return self.smtp_pool_factory(cls=self.smtp_cls)
 
+    def __getstate__(self) -> dict[str, Any]:
+        # open connections stay in this process
+        state = super().__getstate__()
+        state.pop('smtp_pool', None)
+        return state
+
     def _prepare_send_params(self,
                              to: _AddressList = None,
                              set_mail_to: bool = True,
@@ -451,6 +509,70 @@ class MessageSendMixin:
 
         return smtp.sendmail(**params)
 
+    def send_many(self,
+                  recipients: Iterable[Any],
+                  set_mail_to: bool = True,
+                  mail_from: _Address = None,
+                  set_mail_from: bool = False,
+                  smtp_mail_options: list[str] | None = None,
+                  smtp_rcpt_options: list[str] | None = None,
+                  smtp: dict[str, Any] | SMTPBackend | None = None,
+                  compiled: bool = False) -> list[Any]:
+        """
+        Sends this message to many recipients over one smtp session.
+
+        Each item of `recipients` is an address (anything `to` accepts)
+        or a pair (address, render_context); items without a context are
+        rendered with the current render data. Items are consumed lazily
+        and the message is rendered right before it is sent; the backend
+        gets a shallow copy of the message for each item.
+
+        With compiled=True the message is compiled once (see compile())
+        and only the headers and bodies are built for each item.
+
+        Returns list of SendResult, one per item. An item without a valid
+        address gets a failed SendResult with the ValueError, other items
+        are still sent.
+        """
+
+        if smtp is None:
+            smtp = {'host': 'localhost', 'port': 25, 'timeout': 5}
+
+        if isinstance(smtp, dict):
+            smtp = self.smtp_pool[smtp]
+
+        if not hasattr(smtp, 'send_messages'):
+            raise ValueError(
+                "smtp must be a dict or an object with method 'send_messages'. got %s" % type(smtp))
+
+        default_render = dict(self.render_data or {})
+        compiled_message = compiled and self.compile() or None
+
+        def _params() -> Iterator[dict[str, Any]]:
+            for item in recipients:
+                render = default_render
+                if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], dict):
+                    item, render = item
+                try:
+                    if not item:
+                        # Don't fall back to the previous item's mail_to
+                        raise ValueError('No to-addr')
+                    params = self._prepare_send_params(
+                        to=item, set_mail_to=set_mail_to, mail_from=mail_from,
+                        set_mail_from=set_mail_from, render=render,
+                        smtp_mail_options=smtp_mail_options, smtp_rcpt_options=smtp_rcpt_options)
+                except ValueError as exc:
+                    yield exc
+                    continue
+                if compiled_message is not None:
+                    params['msg'] = compiled_message.as_bytes()
+                else:
+                    # Snapshot this item's state: self is changed for the next item
+                    params['msg'] = copy.copy(self)
+                yield params
+
+        return smtp.send_messages(_params())
+
     async def send_async(self,
                          to: _AddressList = None,
                          set_mail_to: bool = True,
@@ -508,6 +630,12 @@ class MessageTransformerMixin:
     def destroy_transformer(self) -> None:
         self._transformer = None
 
+    def __getstate__(self) -> dict[str, Any]:
+        # transformer holds a parsed html tree, it is created again on demand
+        state = super().__getstate__()
+        state.pop('_transformer', None)
+        return state
+
     @property
     def transformer(self) -> Any:
         if self._transformer is None:
@@ -518,6 +646,14 @@ class MessageTransformerMixin:
         self.transformer.load_and_transform(**kwargs)
         self.transformer.save()
 
+    async def transform_async(self, **kwargs: Any) -> None:
+        """
+        Same as transform(), loads stylesheets and images concurrently
+        without blocking the running loop.
+        """
+        await self.transformer.load_and_transform_async(**kwargs)
+        self.transformer.save()
+
     def set_html(self, **kw: Any) -> None:
         # When html set, remove old transformer
         self.destroy_transformer()
@@ -527,14 +663,34 @@ class MessageTransformerMixin:
 class MessageSignMixin:
 
     signer_cls = DKIMSigner
-    _signer: DKIMSigner | None = None
+    _signer: DKIMSigner | DKIMMultiSigner | None = None
+
+    def _make_signer(self, **kwargs: Any) -> DKIMSigner:
+        # Messages signed with the same parameters share one signer
+        shared = getattr(self.signer_cls, 'shared', None)
+        return shared(**kwargs) if shared else self.signer_cls(**kwargs)
 
     def sign(self, **kwargs: Any) -> Message:
-        self._signer = self.signer_cls(**kwargs)
+        self._signer = self._make_signer(**kwargs)
         return self
 
     dkim = sign
 
+    def add_sign(self, **kwargs: Any) -> Message:
+        """
+        Adds one more signature to the message,
+        e.g. Ed25519 next to RSA (RFC 8463)
+        """
+        signer = self._make_signer(**kwargs)
+        if self._signer is None:
+            self._signer = signer
+        else:
+            signers = getattr(self._signer, 'signers', [self._signer])
+            self._signer = DKIMMultiSigner(signers + [signer])
+        return self
+
+    add_dkim = add_sign
+
     def sign_message(self, msg: SafeMIMEMultipart) -> SafeMIMEMultipart:
         """
         Add sign header to email.Message
@@ -553,6 +709,24 @@ class MessageSignMixin:
         """
         return self._signer.sign_message_bytes(message_bytes)
 
+    def sign_chunks(self, header: bytes, body: Iterable[bytes]) -> list[bytes]:
+        """
+        Add sign header to message given as header block and body chunks
+        """
+        return self._signer.sign_chunks(header, body)
+
+    def iter_signed_chunks(self, header: bytes, body: Callable[[], Iterable[bytes]],
+                           streamed: bool = False) -> Iterator[bytes]:
+        """
+        Returns message chunks with sign header prepended, body() returns
+        the body chunks. With streamed=True the body is serialized twice,
+        first only to hash it, so it is never held in memory as a whole.
+        """
+        if streamed:
+            sign = self._signer.get_sign_bytes_for_chunks(header, body())
+            return itertools.chain([(sign or b'') + header], body())
+        return iter(self.sign_chunks(header, body()))
+
 
 class Message(MessageSendMixin, MessageTransformerMixin, MessageSignMixin, MessageBuildMixin, BaseMessage):
     """
@@ -1,18 +1,240 @@
 # This module uses dkimpy for DKIM signature
 from __future__ import annotations
 
+import base64
+import binascii
+import hashlib
+import importlib.metadata
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
 from email.mime.multipart import MIMEMultipart
-from typing import IO
+from types import SimpleNamespace
+from typing import IO, Any
 
 import dkim
 from dkim import DKIMException, UnparsableKeyError
 
+from .utils import split_message_bytes
+
+
+_EOL_RE = re.compile(b'\r?\n')
+_TRAILING_WSP_RE = re.compile(b'[\t ]+\r\n')
+_WSP_RE = re.compile(b'[\t ]+')
+
+
+class DKIMBodyHash:
+
+    """
+    Canonicalizes and hashes a message body fed chunk by chunk.
+
+    Gives the same result as dkimpy for the whole body: line endings are
+    normalized to CRLF, empty lines at the end are dropped and, for the
+    relaxed algorithm, whitespace is compressed (RFC 6376, section 3.4).
+
+    With keep_body, the chunks are also kept in `chunks`, for signing
+    with dkim.DKIM.sign() when _DKIM.sign_hashed() can't be used.
+    """
+
+    def __init__(self, hasher: Any, relaxed: bool = False, keep_body: bool = False) -> None:
+        self.relaxed = relaxed
+        self.chunks: list[bytes] | None = [] if keep_body else None
+        self.length = 0
+        self._hash = hasher()
+        self.name: str = self._hash.name
+        self._tail = b''
+        self._empty_lines = 0
+        self._digest: bytes | None = None
+
+    @property
+    def key(self) -> tuple[str, bool]:
+        # Body hashes with equal keys are equal for the same body
+        return self.name, self.relaxed
+
+    def __getstate__(self) -> dict[str, Any]:
+        # hashlib objects can't be pickled, a body hash is pickled when done
+        self.digest()
+        state = self.__dict__.copy()
+        state['_hash'] = None
+        return state
+
+    def update(self, data: bytes) -> None:
+        if self._digest is not None:
+            raise ValueError("body hash is already computed")
+        if self.chunks is not None:
+            self.chunks.append(bytes(data))
+        if self._tail:
+            data = self._tail + data
+        end = data.rfind(b'\n') + 1
+        self._tail = bytes(data[end:])
+        if end:
+            self._write_lines(_EOL_RE.sub(b'\r\n', data[:end]))
+
+    def _write(self, data: bytes) -> None:
+        self._hash.update(data)
+        self.length += len(data)
+
+    def _write_lines(self, lines: bytes) -> None:
+        if self.relaxed:
+            lines = _WSP_RE.sub(b' ', _TRAILING_WSP_RE.sub(b'\r\n', lines))
+        # Empty lines may turn out to be the last ones, hold them back
+        end = len(lines)
+        while lines.endswith(b'\r\n', 0, end):
+            end -= 2
+        if end:
+            self._write(b'\r\n' * self._empty_lines + lines[:end])
+            self._empty_lines = 0
+        self._empty_lines += (len(lines) - end) // 2
+
+    def digest(self) -> bytes:
+        if self._digest is None:
+            tail = _WSP_RE.sub(b' ', self._tail) if self.relaxed else self._tail
+            if tail:
+                self._write(b'\r\n' * self._empty_lines + tail + b'\r\n')
+            elif self.length or not self.relaxed:
+                # simple canonicalization turns an empty body into a single CRLF
+                self._write(b'\r\n')
+            self._digest = self._hash.digest()
+        return self._digest
+
+
+# dkimpy versions _DKIM.sign_hashed() was copied from
+SIGN_HASHED_VERSIONS = ((1, 1), (1, 2))
+
+
+def _can_sign_hashed() -> bool:
+    # _DKIM.sign_hashed() uses dkimpy internals, other versions of dkimpy
+    # sign with the public dkim.DKIM.sign()
+    try:
+        version = tuple(int(v) for v in importlib.metadata.version('dkimpy').split('.')[:2])
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return False
+    return (SIGN_HASHED_VERSIONS[0] <= version < SIGN_HASHED_VERSIONS[1]
+            and all(hasattr(dkim.DKIM, name) for name in ('gen_header', 'default_sign_headers'))
+            and hasattr(dkim, 'HASH_ALGORITHMS') and hasattr(dkim, 'CanonicalizationPolicy'))
+
+
+_SIGN_HASHED = _can_sign_hashed()
+
+
+class _DKIM(dkim.DKIM):
+
+    # dkim.DKIM.sign() of dkimpy 1.1 that takes a parsed private key and
+    # a body hash computed by DKIMBodyHash instead of the PEM key and
+    # self.body. test_dkim_sign_hashed checks it against dkimpy.
+
+    def sign_hashed(self, body_hash: DKIMBodyHash, pk: Any, selector: bytes, domain: bytes,
+                    identity: bytes | None = None,
+                    canonicalize: tuple[bytes, bytes] = (b'relaxed', b'simple'),
+                    include_headers: list[bytes | str] | None = None,
+                    length: bool = False) -> bytes:
+
+        if identity is not None and not identity.endswith(domain):
+            raise dkim.ParameterError("identity must end with domain")
+
+        canon_policy = dkim.CanonicalizationPolicy.from_c_value(b'/'.join(canonicalize))
+
+        if include_headers is None:
+            include_headers = self.default_sign_headers()
+        headers: tuple[bytes, ...] = tuple([(x.encode() if isinstance(x, str) else x).lower()
+                                            for x in include_headers])
+        self.include_headers = headers
+
+        if b'from' not in headers:
+            raise dkim.ParameterError("The From header field MUST be signed")
+
+        for x in set(headers).intersection(self.should_not_sign):
+            raise dkim.ParameterError("The %s header field SHOULD NOT be signed" % x.decode())
+
+        self.hasher = dkim.HASH_ALGORITHMS[self.signature_algorithm]
+        bodyhash = base64.b64encode(body_hash.digest())  # completes body_hash.length
+
+        sigfields = [x for x in [
+            (b'v', b"1"),
+            (b'a', self.signature_algorithm),
+            (b'c', canon_policy.to_c_value()),
+            (b'd', domain),
+            (b'i', identity or b"@" + domain),
+            length and not self.tlsrpt and (b'l', str(body_hash.length).encode('ascii')),
+            (b'q', b"dns/txt"),
+            (b's', selector),
+            (b't', str(int(time.time())).encode('ascii')),
+            (b'h', b" : ".join(headers)),
+            (b'bh', bodyhash),
+            # b= goes on its own line, see dkim.DKIM.sign()
+            (b'b', b'0' * 60),
+        ] if x]
+
+        res: bytes = self.gen_header(sigfields, headers, canon_policy, b"DKIM-Signature", pk)
+
+        self.domain = domain
+        self.selector = selector
+        self.signature_fields = dict(sigfields)
+        return b'DKIM-Signature: ' + res
+
+
+class _Ed25519SigningKey:
+
+    # cryptography's Ed25519 key with the interface of nacl.signing.SigningKey
+    # that dkimpy uses, for when PyNaCl is not installed
+
+    def __init__(self, seed: bytes) -> None:
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        self.seed = seed
+        self._key = Ed25519PrivateKey.from_private_bytes(seed)
+
+    def sign(self, data: bytes) -> Any:
+        return SimpleNamespace(signature=self._key.sign(data))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Ed25519SigningKey) and other.seed == self.seed
+
+
+def _parse_private_key(privkey: bytes, signature_algorithm: bytes) -> Any:
+    if signature_algorithm == b'ed25519-sha256':
+        # Ed25519 keys are base64-encoded 32-byte seeds, as for dkimpy
+        try:
+            seed = base64.b64decode(privkey.strip(), validate=True)
+        except binascii.Error as exc:
+            raise dkim.KeyFormatError('invalid ed25519 private key or format: %s' % exc)
+        if len(seed) != 32:
+            raise dkim.KeyFormatError('invalid ed25519 private key or format')
+        try:
+            import nacl.signing
+            return nacl.signing.SigningKey(seed)
+        except ImportError:
+            pass
+        try:
+            return _Ed25519SigningKey(seed)
+        except ImportError:
+            raise dkim.NaClNotFoundError('pynacl or cryptography module required for ed25519 signing')
+    try:
+        return dkim.crypto.parse_pem_private_key(privkey)
+    except UnparsableKeyError as exc:
+        raise DKIMException(exc)
+
 
 class DKIMSigner:
 
+    """
+    Signs messages with DKIM.
+
+    The private key is parsed once, in the constructor. A signer holds no
+    per-message state, so one instance may sign any number of messages,
+    from any thread. DKIMSigner.shared() returns such an instance from
+    a per-process registry.
+    """
+
+    # Per-process registry of signers, see shared()
+    SHARED_MAX_SIZE = 64
+    _shared: OrderedDict[Hashable, DKIMSigner] = OrderedDict()
+    _shared_lock = threading.Lock()
+
     def __init__(self, selector: str, domain: str, key: str | bytes | IO[bytes] | None = None,
-                 ignore_sign_errors: bool = False, **kwargs: object) -> None:
+                 ignore_sign_errors: bool = False, **kwargs: Any) -> None:
 
         self.ignore_sign_errors = ignore_sign_errors
         self._sign_params = kwargs
@@ -28,21 +250,93 @@ class DKIMSigner:
         # Normalize to bytes
         privkey_bytes = privkey if isinstance(privkey, bytes) else str(privkey).encode()
 
-        # Validate key upfront; dkim.sign() re-parses PEM on each call
-        # but the cost is negligible vs the RSA operation (~0ms vs ~2.5ms).
-        try:
-            dkim.crypto.parse_pem_private_key(privkey_bytes)
-        except UnparsableKeyError as exc:
-            raise DKIMException(exc)
+        if isinstance(kwargs.get('signature_algorithm'), str):
+            self._sign_params['signature_algorithm'] = kwargs['signature_algorithm'].encode()
 
         self._sign_params.update({'privkey': privkey_bytes,
                                   'domain': domain.encode(),
                                   'selector': selector.encode()})
 
-    def get_sign_string(self, message: bytes) -> bytes | None:
+        # Parse the key once, dkim.sign() would parse it on every call
+        self._pk = _parse_private_key(privkey_bytes, self.signature_algorithm)
+
+    @classmethod
+    def shared(cls, **kwargs: Any) -> DKIMSigner:
+        """
+        Returns a signer for given parameters from the per-process registry,
+        the signer is created on first use.
+        Parameters with unhashable values (e.g. a logger with a dict) get a new signer.
+        """
+        for name in ('key', 'privkey'):
+            if hasattr(kwargs.get(name), 'read'):
+                kwargs[name] = kwargs[name].read()
         try:
-            result: bytes = dkim.sign(message=message, **self._sign_params)
-            return result
+            registry_key: Hashable = (cls, tuple(sorted(
+                (k, tuple(v) if isinstance(v, list) else v) for (k, v) in kwargs.items())))
+            hash(registry_key)
+        except TypeError:
+            return cls(**kwargs)
+
+        with cls._shared_lock:
+            signer = cls._shared.get(registry_key)
+            if signer is not None:
+                cls._shared.move_to_end(registry_key)
+                return signer
+
+        signer = cls(**kwargs)
+        with cls._shared_lock:
+            cls._shared[registry_key] = signer
+            while len(cls._shared) > cls.SHARED_MAX_SIZE:
+                cls._shared.popitem(last=False)
+        return signer
+
+    @classmethod
+    def clear_shared(cls) -> None:
+        with cls._shared_lock:
+            cls._shared.clear()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Parsed keys may not be picklable, the key is parsed again on load
+        state = self.__dict__.copy()
+        state.pop('_pk', None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._pk = _parse_private_key(self._sign_params['privkey'], self.signature_algorithm)
+
+    @property
+    def signature_algorithm(self) -> bytes:
+        algorithm: bytes = self._sign_params.get('signature_algorithm') or b'rsa-sha256'
+        return algorithm
+
+    def body_hash(self) -> DKIMBodyHash:
+        """
+        Returns an empty DKIMBodyHash for the canonicalization and
+        algorithm of this signer
+        """
+        canonicalize = self._sign_params.get('canonicalize') or (b'relaxed', b'simple')
+        hasher = getattr(dkim, 'HASH_ALGORITHMS', {}).get(self.signature_algorithm, hashlib.sha256)
+        return DKIMBodyHash(hasher=hasher, relaxed=canonicalize[-1] == b'relaxed',
+                            keep_body=not _SIGN_HASHED)
+
+    def _sign(self, message: bytes, body_hash: DKIMBodyHash | None = None) -> bytes | None:
+        params = dict(self._sign_params)
+        params.pop('privkey')
+        init_params = dict((k, params.pop(k)) for k in ('logger', 'linesep', 'tlsrpt', 'signature_algorithm')
+                           if k in params)
+        try:
+            if not _SIGN_HASHED:
+                if body_hash is not None:
+                    message += b''.join(body_hash.chunks or [])
+                res: bytes = dkim.DKIM(message, **init_params).sign(privkey=self._sign_params['privkey'],
+                                                                    **params)
+                return res
+            d = _DKIM(message, **init_params)
+            if body_hash is None:
+                body_hash = self.body_hash()
+                body_hash.update(d.body)
+            return d.sign_hashed(body_hash, self._pk, **params)
         except DKIMException:
             if self.ignore_sign_errors:
                 logging.exception('Error signing message')
@@ -50,11 +344,49 @@ class DKIMSigner:
                 raise
         return None
 
+    def get_sign_bytes_for_body(self, header: bytes, body_hash: DKIMBodyHash) -> bytes | None:
+        """
+        Returns DKIM header for the message header block and the hash of its body.
+        The message is not parsed, only the header block is.
+        """
+        return self._sign(header, body_hash)
+
+    def get_sign_bytes_for_chunks(self, header: bytes, body: Iterable[bytes]) -> bytes | None:
+        """
+        Returns DKIM header for the message given as header block and
+        body chunks. Chunks are hashed as they are read and not kept.
+        """
+        body_hash = self.body_hash()
+        for chunk in body:
+            body_hash.update(chunk)
+        return self.get_sign_bytes_for_body(header, body_hash)
+
+    def sign_chunks(self, header: bytes, body: Iterable[bytes]) -> list[bytes]:
+        """
+        Returns message chunks with DKIM header prepended.
+        The body hash is computed while body chunks are read.
+        """
+        body_hash = self.body_hash()
+        chunks = [header]
+        for chunk in body:
+            body_hash.update(chunk)
+            chunks.append(chunk)
+        s = self.get_sign_bytes_for_body(header, body_hash)
+        if s:
+            chunks[0] = s + header
+        return chunks
+
+    def get_sign_string(self, message: bytes) -> bytes | None:
+        return self._sign(message)
+
     def get_sign_bytes(self, message: bytes) -> bytes | None:
         return self.get_sign_string(message)
 
     def get_sign_header(self, message: bytes) -> tuple[str, str] | None:
-        s = self.get_sign_string(message)
+        return self._split_sign_header(self.get_sign_string(message))
+
+    @staticmethod
+    def _split_sign_header(s: bytes | None) -> tuple[str, str] | None:
         if s:
             (header, value) = s.decode().split(': ', 1)
             if value.endswith("\r\n"):
@@ -66,7 +398,11 @@ class DKIMSigner:
         """
         Add DKIM header to email.message
         """
-        dkim_header = self.get_sign_header(msg.as_string().encode())
+        header, body = split_message_bytes(msg, linesep='\r\n')
+        body_hash = self.body_hash()
+        for chunk in body:
+            body_hash.update(chunk)
+        dkim_header = self._split_sign_header(self.get_sign_bytes_for_body(header, body_hash))
         if dkim_header:
             msg._headers.insert(0, dkim_header)  # type: ignore[attr-defined]
         return msg
@@ -88,3 +424,80 @@ class DKIMSigner:
         if s:
             return s + message_bytes
         return message_bytes
+
+
+class DKIMMultiSigner:
+
+    """
+    Signs messages with several signers, e.g. with RSA and Ed25519 keys
+    (RFC 8463). The body is hashed once for each canonicalization and hash
+    algorithm in use. The last signer's header goes first.
+    """
+
+    def __init__(self, signers: Iterable[DKIMSigner]) -> None:
+        self.signers = list(signers)
+
+    def body_hashes(self) -> list[DKIMBodyHash]:
+        """
+        Returns body hashes for the signers, signers with the same
+        body canonicalization and algorithm share one.
+        """
+        hashes: dict[tuple[str, bool], DKIMBodyHash] = {}
+        result = []
+        for signer in self.signers:
+            h = signer.body_hash()
+            result.append(hashes.setdefault(h.key, h))
+        return result
+
+    def _join(self, headers: Iterable[bytes | None]) -> bytes:
+        return b''.join(reversed([h for h in headers if h]))
+
+    def get_sign_bytes_for_chunks(self, header: bytes, body: Iterable[bytes]) -> bytes:
+        body_hashes = self.body_hashes()
+        distinct = list(dict((id(h), h) for h in body_hashes).values())
+        for chunk in body:
+            for h in distinct:
+                h.update(chunk)
+        return self._join(signer.get_sign_bytes_for_body(header, h)
+                          for (signer, h) in zip(self.signers, body_hashes))
+
+    def sign_chunks(self, header: bytes, body: Iterable[bytes]) -> list[bytes]:
+        body_hashes = self.body_hashes()
+        distinct = list(dict((id(h), h) for h in body_hashes).values())
+        chunks = [header]
+        for chunk in body:
+            for h in distinct:
+                h.update(chunk)
+            chunks.append(chunk)
+        chunks[0] = self._join(signer.get_sign_bytes_for_body(header, h)
+                               for (signer, h) in zip(self.signers, body_hashes)) + header
+        return chunks
+
+    def sign_message(self, msg: MIMEMultipart) -> MIMEMultipart:
+        """
+        Add DKIM headers to email.message
+        """
+        header, body = split_message_bytes(msg, linesep='\r\n')
+        body_hashes = self.body_hashes()
+        distinct = list(dict((id(h), h) for h in body_hashes).values())
+        for chunk in body:
+            for h in distinct:
+                h.update(chunk)
+        for (signer, h) in zip(self.signers, body_hashes):
+            dkim_header = signer._split_sign_header(signer.get_sign_bytes_for_body(header, h))
+            if dkim_header:
+                msg._headers.insert(0, dkim_header)  # type: ignore[attr-defined]
+        return msg
+
+    def sign_message_string(self, message_string: str) -> str:
+        """
+        Insert DKIM headers to message string
+        """
+        message = message_string.encode()
+        return self._join(signer.get_sign_string(message) for signer in self.signers).decode() + message_string
+
+    def sign_message_bytes(self, message_bytes: bytes) -> bytes:
+        """
+        Insert DKIM headers to message bytes
+        """
+        return self._join(signer.get_sign_bytes(message_bytes) for signer in self.signers) + message_bytes
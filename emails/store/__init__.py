@@ -1,2 +1,4 @@
 from .store import MemoryFileStore
-from .file import BaseFile, LazyHTTPFile
+from .file import BaseFile, FileAttachment, LazyHTTPFile
+from .cache import MimePartCache, DiskURLCache, default_part_cache
+from .parallel import prefetch, prefetch_async
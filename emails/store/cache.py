@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Hashable, Iterator
+from contextlib import closing, contextmanager
+from email.mime.base import MIMEBase
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+
+class MimePartCache:
+
+    """
+    Process-wide LRU cache of base64-encoded attachment parts.
+
+    Parts are keyed by content hash, mime type, disposition, filename and
+    extra headers, so the same file attached to many messages is encoded
+    once. max_size limits the total size of cached encoded payloads.
+    """
+
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._parts: OrderedDict[Hashable, tuple[MIMEBase, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(payload: bytes, mime_type: str, content_disposition: str | None,
+                 filename: str | None, content_id: str | None = None,
+                 headers: dict[str, str] | None = None) -> Hashable:
+        return (hashlib.sha256(payload).hexdigest(), len(payload), mime_type,
+                content_disposition, filename, content_id,
+                tuple(sorted((headers or {}).items())))
+
+    @staticmethod
+    def _copy(part: MIMEBase) -> MIMEBase:
+        # The encoded payload is an immutable str and is shared,
+        # only the header list is copied
+        p = copy.copy(part)
+        p._headers = list(part._headers)  # type: ignore[attr-defined]
+        return p
+
+    def get(self, key: Hashable) -> MIMEBase | None:
+        with self._lock:
+            item = self._parts.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._parts.move_to_end(key)
+            self.hits += 1
+        return self._copy(item[0])
+
+    def set(self, key: Hashable, part: MIMEBase) -> None:
+        payload = part.get_payload()
+        size = len(payload) if isinstance(payload, str) else 0
+        if size > self.max_size:
+            return
+        part = self._copy(part)
+        with self._lock:
+            old = self._parts.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._parts[key] = (part, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._parts.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._parts.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._parts
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Cached parts stay in this process, a copy starts empty
+        return {'max_size': self.max_size}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+
+default_part_cache = MimePartCache()
+
+
+# Headers that don't describe the stored (decoded) body
+_UNCACHED_HEADERS = frozenset(['connection', 'keep-alive', 'transfer-encoding',
+                               'content-encoding', 'content-length', 'set-cookie'])
+
+
+class DiskURLCache:
+
+    """
+    Persistent cache of fetched urls, shared between threads and processes.
+
+    Response bodies are stored as files named by their sha256 digest, so
+    the same content loaded from different urls is stored once. An sqlite
+    index in the same directory keeps headers and the last access time
+    for every url.
+
+    Entries are fresh for ttl seconds or, without ttl, as long as
+    Cache-Control max-age or Expires allow. Stale entries with an ETag or
+    Last-Modified header are revalidated with a conditional request.
+    max_size limits the total size of stored bodies, least recently used
+    urls are evicted first.
+    """
+
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    INDEX_NAME = 'index.sqlite'
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE, ttl: float | None = None) -> None:
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, 'objects'), exist_ok=True)
+        with self._index() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS urls ('
+                       'url TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, '
+                       'headers TEXT NOT NULL, fetched REAL NOT NULL, expires REAL NOT NULL, '
+                       'accessed REAL NOT NULL)')
+
+    @contextmanager
+    def _index(self) -> Iterator[sqlite3.Connection]:
+        # A connection per operation, so the cache may be used after fork
+        with closing(sqlite3.connect(os.path.join(self.path, self.INDEX_NAME), timeout=30)) as db:
+            with db:
+                yield db
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    def _read(self, digest: str) -> bytes | None:
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another process
+            return None
+
+    def _write(self, digest: str, data: bytes) -> None:
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def fresh_until(self, headers: dict[str, str], now: float) -> float | None:
+        """
+        Returns the time the response with headers is fresh until,
+        None if it must not be stored.
+        """
+        directives = dict((d.strip().lower().partition('=')[::2])
+                          for d in headers.get('cache-control', '').split(','))
+        if 'no-store' in directives:
+            return None
+        if 'no-cache' in directives:
+            return now
+        if directives.get('max-age', '').isdigit():
+            return now + int(directives['max-age'])
+        if headers.get('expires'):
+            try:
+                return parsedate_to_datetime(headers['expires']).timestamp()
+            except (TypeError, ValueError):
+                return now
+        return now
+
+    def _lookup(self, url: str) -> tuple[str, dict[str, str], float] | None:
+        # Returns digest, headers and the time the entry is fresh until
+        with self._index() as db:
+            row = db.execute('SELECT digest, headers, fetched, expires FROM urls WHERE url = ?',
+                             (url, )).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2] + self.ttl if self.ttl is not None else row[3]
+
+    def _touch(self, url: str, headers: dict[str, str] | None = None, expires: float | None = None) -> None:
+        with self._index() as db:
+            if headers is None:
+                db.execute('UPDATE urls SET accessed = ? WHERE url = ?', (time.time(), url))
+            else:
+                now = time.time()
+                db.execute('UPDATE urls SET accessed = ?, fetched = ?, headers = ?, expires = ? WHERE url = ?',
+                           (now, now, json.dumps(headers), expires, url))
+
+    def _store(self, url: str, response: Any) -> None:
+        headers = dict((k.lower(), v) for (k, v) in response.headers.items()
+                       if k.lower() not in _UNCACHED_HEADERS)
+        now = time.time()
+        expires = self.fresh_until(headers, now)
+        data = response.content
+        if expires is None or len(data) > self.max_size:
+            return
+        digest = hashlib.sha256(data).hexdigest()
+        self._write(digest, data)
+        with self._index() as db:
+            db.execute('INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (url, digest, len(data), json.dumps(headers), now, expires, now))
+            orphans = self._evict(db)
+        for digest in orphans:
+            try:
+                os.unlink(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, db: sqlite3.Connection) -> list[str]:
+        # Removes least recently used urls while stored bodies are over max_size,
+        # returns digests no longer referenced
+        rows = db.execute('SELECT url, digest, size FROM urls ORDER BY accessed').fetchall()
+        refs = Counter(digest for (_, digest, _) in rows)
+        total = sum(dict((digest, size) for (_, digest, size) in rows).values())
+        orphans = []
+        for (url, digest, size) in rows:
+            if total <= self.max_size:
+                break
+            db.execute('DELETE FROM urls WHERE url = ?', (url, ))
+            refs[digest] -= 1
+            if not refs[digest]:
+                total -= size
+                orphans.append(digest)
+        return orphans
+
+    @staticmethod
+    def _response(url: str, headers: dict[str, str], data: bytes) -> Any:
+        import requests
+        r: Any = requests.models.Response()
+        r.status_code = 200
+        r.reason = 'OK'
+        r.url = url
+        r.headers = requests.structures.CaseInsensitiveDict(headers)
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r._content = data
+        r._content_consumed = True
+        r.from_cache = True
+        return r
+
+    def load(self, url: str, get: Callable[[dict[str, str]], Any]) -> Any:
+        """
+        Returns the response for url from the cache or loaded with get(headers),
+        headers are the conditional headers for revalidation.
+        Responses with status 200 are stored.
+        """
+        entry = self._lookup(url)
+        if entry is not None:
+            digest, headers, expires = entry
+            data = self._read(digest)
+            if data is not None and expires > time.time():
+                with self._lock:
+                    self.hits += 1
+                self._touch(url)
+                return self._response(url, headers, data)
+
+            validators = {}
+            if 'etag' in headers:
+                validators['If-None-Match'] = headers['etag']
+            if 'last-modified' in headers:
+                validators['If-Modified-Since'] = headers['last-modified']
+            if data is not None and validators:
+                response = get(validators)
+                if response.status_code == 304:
+                    with self._lock:
+                        self.revalidations += 1
+                    headers.update((k.lower(), v) for (k, v) in response.headers.items()
+                                   if k.lower() not in _UNCACHED_HEADERS)
+                    self._touch(url, headers, self.fresh_until(headers, time.time()) or 0)
+                    return self._response(url, headers, data)
+                with self._lock:
+                    self.misses += 1
+                if response.status_code == 200:
+                    self._store(url, response)
+                return response
+
+        with self._lock:
+            self.misses += 1
+        response = get({})
+        if response.status_code == 200:
+            self._store(url, response)
+        return response
+
+    def clear(self) -> None:
+        with self._index() as db:
+            digests = [row[0] for row in db.execute('SELECT DISTINCT digest FROM urls')]
+            db.execute('DELETE FROM urls')
+        for digest in digests:
+            try:
+                os.unlink(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        with self._index() as db:
+            return int(db.execute('SELECT COUNT(*) FROM urls').fetchone()[0])
+
+    def __contains__(self, url: str) -> bool:
+        return self._lookup(url) is not None
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+import threading
 import uuid
 from mimetypes import guess_type
 import puremagic
 from email.mime.base import MIMEBase
 from email.encoders import encode_base64
 from os.path import basename
-from typing import Any, IO
+from typing import Any, IO, TYPE_CHECKING
 
 import urllib.parse as urlparse
 
-from ..utils import fetch_url, encode_header
+from ..utils import fetch_url, encode_header, FileMIMEPart
+
+if TYPE_CHECKING:
+    from ..utils import HTTPFetcher
+    from .cache import MimePartCache
 
 
 MIMETYPE_UNKNOWN = 'application/unknown'
@@ -30,6 +35,10 @@ class BaseFile:
     """
 
     _data: bytes | str | IO[bytes] | None
+    _cached_part: MIMEBase | None
+
+    # Shared cache of encoded parts, see emails.store.cache.MimePartCache
+    part_cache: MimePartCache | None = None
 
     def __init__(self, **kwargs: Any) -> None:
         """
@@ -48,6 +57,17 @@ class BaseFile:
         self.subtype: str | None = kwargs.get('subtype')
         self.local_loader = kwargs.get('local_loader')
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        _data = state.get('_data')
+        if _data is not None and not isinstance(_data, (str, bytes)):
+            # file objects can't be pickled, keep what they contain
+            # and leave the file where it was
+            pos = _data.tell()
+            state['_data'] = _data.read()
+            _data.seek(pos)
+        return state
+
     def as_dict(self, fields: tuple[str, ...] | None = None) -> dict[str, Any]:
         fields = fields or ('uri', 'absolute_url', 'filename', 'data',
                             'mime_type', 'content_disposition', 'subtype')
@@ -104,17 +124,7 @@ class BaseFile:
             if filename:
                 r = self._mime_type = guess_type(filename)[0]
         if not r:
-            _data = self._data
-            if isinstance(_data, bytes):
-                header = _data
-            elif isinstance(_data, str):
-                header = _data.encode()
-            elif _data is not None:
-                pos = _data.tell()
-                header = _data.read(128)
-                _data.seek(pos)
-            else:
-                header = None
+            header = self._read_header()
             if header:
                 try:
                     r = puremagic.from_string(header, mime=True)
@@ -127,6 +137,20 @@ class BaseFile:
 
     mime_type = property(get_mime_type)
 
+    def _read_header(self) -> bytes | None:
+        # Data to sniff the mime type from
+        _data = self._data
+        if isinstance(_data, bytes):
+            return _data
+        elif isinstance(_data, str):
+            return _data.encode()
+        elif _data is not None:
+            pos = _data.tell()
+            header = _data.read(128)
+            _data.seek(pos)
+            return header
+        return None
+
     def get_content_disposition(self) -> str | None:
         return getattr(self, '_content_disposition', None)
 
@@ -159,8 +183,6 @@ class BaseFile:
             return None
         p = getattr(self, '_cached_part', None)
         if p is None:
-            filename_header = encode_header(self.filename)
-            p = MIMEBase(*self.mime_type.split('/', 1), name=filename_header)
             data = self.data
             if isinstance(data, str):
                 payload = data.encode()
@@ -168,33 +190,121 @@ class BaseFile:
                 payload = bytes(data)
             else:
                 payload = b''
-            p.set_payload(payload)
-            encode_base64(p)
-            if 'content-disposition' not in self._headers:
-                p.add_header('Content-Disposition', self.content_disposition, filename=filename_header)
-            if content_disposition == 'inline' and 'content-id' not in self._headers:
-                p.add_header('Content-ID', '<%s>' % self.content_id)
-            for (k, v) in self._headers.items():
-                p.add_header(k, v)
+            cache = self.part_cache
+            if cache is not None:
+                key = cache.make_key(payload, self.mime_type, content_disposition, self.filename,
+                                     content_disposition == 'inline' and self.content_id or None,
+                                     dict(self._headers))
+                p = cache.get(key)
+            if p is None:
+                p = self._build_mime(payload)
+                if cache is not None:
+                    cache.set(key, p)
             self._cached_part = p
         return p
 
+    def _build_mime(self, payload: bytes) -> MIMEBase:
+        filename_header = encode_header(self.filename)
+        p = MIMEBase(*self.mime_type.split('/', 1), name=filename_header)
+        p.set_payload(payload)
+        encode_base64(p)
+        self._add_headers(p, filename_header)
+        return p
+
+    def _add_headers(self, p: MIMEBase, filename_header: str | None) -> None:
+        if 'content-disposition' not in self._headers:
+            p.add_header('Content-Disposition', self.content_disposition, filename=filename_header)
+        if self.content_disposition == 'inline' and 'content-id' not in self._headers:
+            p.add_header('Content-ID', '<%s>' % self.content_id)
+        for (k, v) in self._headers.items():
+            p.add_header(k, v)
+
     def reset_mime(self) -> None:
-        self._mime = None
+        self._cached_part = None
 
     def fetch(self) -> None:
         pass
 
 
+class FileAttachment(BaseFile):
+
+    """
+    Attachment read from a file on disk when the message is serialized.
+
+    The file is not loaded into memory: Message.iter_bytes() and streaming
+    SMTP sends base64-encode it chunk by chunk from a memory map.
+    Its parts are not stored in the part cache.
+    """
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        kwargs.setdefault('uri', path)
+        kwargs.setdefault('filename', basename(path))
+        BaseFile.__init__(self, **kwargs)
+        self.path = path
+
+    def as_dict(self, fields: tuple[str, ...] | None = None) -> dict[str, Any]:
+        return BaseFile.as_dict(self, fields or ('path', 'uri', 'absolute_url', 'filename',
+                                                 'mime_type', 'content_disposition', 'subtype'))
+
+    def get_data(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    data = property(get_data, BaseFile.set_data)
+
+    def _read_header(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read(128)
+
+    @property
+    def mime(self) -> MIMEBase | None:
+        if self.content_disposition is None:
+            return None
+        p = getattr(self, '_cached_part', None)
+        if p is None:
+            p = self._cached_part = self._build_mime()
+        return p
+
+    def _build_mime(self, payload: bytes | None = None) -> MIMEBase:
+        maintype, subtype = self.mime_type.split('/', 1)
+        if maintype in ('message', 'multipart'):
+            # The stdlib generator writes these payloads itself
+            return BaseFile._build_mime(self, self.data)
+        filename_header = encode_header(self.filename)
+        p = FileMIMEPart(self.path, maintype, subtype, name=filename_header)
+        self._add_headers(p, filename_header)
+        return p
+
+
 class LazyHTTPFile(BaseFile):
 
-    def __init__(self, requests_args: dict[str, Any] | None = None, **kwargs: Any) -> None:
+    def __init__(self, requests_args: dict[str, Any] | None = None,
+                 fetcher: HTTPFetcher | None = None, **kwargs: Any) -> None:
         BaseFile.__init__(self, **kwargs)
         self.requests_args = requests_args
+        self.fetcher = fetcher
         self._fetched = False
+        self._response_headers: dict[str, str] = {}
+        self._fetch_lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = BaseFile.__getstate__(self)
+        del state['_fetch_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._fetch_lock = threading.Lock()
 
     def fetch(self) -> None:
-        if (not self._fetched) and self.uri:
+        if self._fetched or not self.uri:
+            return
+        # A prefetch thread may still be fetching this file, wait for it
+        # instead of loading the url again
+        with self._fetch_lock:
+            if self._fetched:
+                return
+
             if self.local_loader:
                 data = self.local_loader[self.uri]
 
@@ -203,13 +313,19 @@ class LazyHTTPFile(BaseFile):
                     self._data = data
                     return
 
-            r = fetch_url(url=self.absolute_url or self.uri, requests_args=self.requests_args)
+            r = fetch_url(url=self.absolute_url or self.uri, requests_args=self.requests_args,
+                          fetcher=self.fetcher)
             if r.status_code == 200:
                 self._data = r.content
-                self._headers = r.headers
+                # Response headers (Date, Content-Length...) don't go to the mime part
+                self._response_headers = r.headers
                 self._mime_type = fix_content_type(r.headers.get('content-type'), t='unknown')
                 self._fetched = True
 
+    @property
+    def is_fetched(self) -> bool:
+        return self._fetched
+
     def get_data(self) -> bytes | str:
         self.fetch()
         data = self._data
@@ -232,4 +348,4 @@ class LazyHTTPFile(BaseFile):
     @property
     def headers(self) -> dict[str, str]:
         self.fetch()
-        return self._headers
+        return self._response_headers
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import urllib.parse as urlparse
+from collections import Counter, OrderedDict, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from .file import BaseFile, LazyHTTPFile
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_PER_HOST = 4
+
+
+def _fetch(f: LazyHTTPFile) -> bool:
+    try:
+        f.fetch()
+    except Exception:
+        # Left unfetched, the error is raised again when the file data is used
+        logging.warning('Error prefetching %s', f.absolute_url or f.uri, exc_info=True)
+    return f.is_fetched
+
+
+def _unfetched(files: Iterable[BaseFile]) -> Iterator[tuple[str, LazyHTTPFile]]:
+    # Yields LazyHTTPFile objects to fetch with their hosts
+    for f in files:
+        if isinstance(f, LazyHTTPFile) and f.uri and not f.is_fetched:
+            yield urlparse.urlsplit(f.absolute_url or f.uri).netloc.lower(), f
+
+
+def prefetch(files: Iterable[BaseFile],
+             max_workers: int = DEFAULT_MAX_WORKERS,
+             max_per_host: int = DEFAULT_MAX_PER_HOST,
+             timeout: float | None = None) -> int:
+    """
+    Fetches LazyHTTPFile objects that are not fetched yet in a thread pool,
+    instead of one by one on first access. Returns the number of files fetched.
+
+    At most max_workers files are fetched at once, and at most max_per_host
+    from one host. With timeout, stops waiting after timeout seconds:
+    files not fetched by then are fetched on first access, as usual.
+    Access to a file still being fetched waits for that request.
+    """
+    if max_workers < 1 or max_per_host < 1:
+        raise ValueError("max_workers and max_per_host must be positive")
+
+    queues: OrderedDict[str, deque[LazyHTTPFile]] = OrderedDict()
+    for (host, f) in _unfetched(files):
+        queues.setdefault(host, deque()).append(f)
+    if not queues:
+        return 0
+
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    running: dict[Future[bool], str] = {}
+    per_host: Counter[str] = Counter()
+    fetched = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while queues or running:
+            for host in list(queues):
+                queue = queues[host]
+                while queue and len(running) < max_workers and per_host[host] < max_per_host:
+                    running[executor.submit(_fetch, queue.popleft())] = host
+                    per_host[host] += 1
+                if not queue:
+                    del queues[host]
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                per_host[running.pop(future)] -= 1
+                fetched += future.result()
+    finally:
+        # Don't wait for requests still running after the deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return fetched
+
+
+async def prefetch_async(files: Iterable[BaseFile],
+                         max_workers: int = DEFAULT_MAX_WORKERS,
+                         max_per_host: int = DEFAULT_MAX_PER_HOST,
+                         timeout: float | None = None) -> int:
+    """
+    Same as prefetch(), for asyncio code. Files are fetched in the default
+    executor of the running loop, the loop is not blocked meanwhile.
+    """
+    if max_workers < 1 or max_per_host < 1:
+        raise ValueError("max_workers and max_per_host must be positive")
+
+    workers = asyncio.Semaphore(max_workers)
+    hosts: dict[str, asyncio.Semaphore] = {}
+
+    async def fetch(host: str, f: LazyHTTPFile) -> bool:
+        async with hosts.setdefault(host, asyncio.Semaphore(max_per_host)), workers:
+            return await asyncio.to_thread(_fetch, f)
+
+    tasks = [asyncio.ensure_future(fetch(host, f)) for (host, f) in _unfetched(files)]
+    if not tasks:
+        return 0
+
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        # Files not fetched by the deadline are fetched on first access
+        task.cancel()
+    return sum(task.result() for task in done)
@@ -6,6 +6,7 @@ from os.path import splitext
 from typing import Any
 
 from .file import BaseFile
+from .cache import MimePartCache
 
 
 class FileStore:
@@ -15,10 +16,14 @@ class FileStore:
 class MemoryFileStore(FileStore):
 
     file_cls: type[BaseFile] = BaseFile
+    part_cache: MimePartCache | None = None
 
-    def __init__(self, file_cls: type[BaseFile] | None = None) -> None:
+    def __init__(self, file_cls: type[BaseFile] | None = None,
+                 part_cache: MimePartCache | None = None) -> None:
         if file_cls:
             self.file_cls = file_cls
+        if part_cache is not None:
+            self.part_cache = part_cache
         self._files: OrderedDict[str, BaseFile] = OrderedDict()
         self._filenames: dict[str, str | None] = {}
 
@@ -83,6 +88,8 @@ class MemoryFileStore(FileStore):
         if (uri not in self._files) or replace:
             self.remove(uri)
             value.filename = self.unique_filename(value.filename, uri=uri)
+            if self.part_cache is not None and value.part_cache is None:
+                value.part_cache = self.part_cache
             self._files[uri] = value
 
         return value
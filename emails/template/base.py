@@ -17,6 +17,12 @@ class BaseTemplate(object):
     def compile_template(self):
         raise NotImplementedError
 
+    def __getstate__(self):
+        # compiled template is rebuilt on demand
+        state = self.__dict__.copy()
+        state['_template'] = None
+        return state
+
     @property
     def template(self):
         if self._template is None:
@@ -0,0 +1,122 @@
+"""
+Minimal in-process HTTP/1.1 server for offline tests.
+
+    with FakeHTTPServer({'/a.png': b'...'}, delay=0.1) as server:
+        f = LazyHTTPFile(uri=server.url('/a.png'))
+        ...
+        assert server.requests[0]['path'] == '/a.png'
+
+Serves GET for given paths with keep-alive, answers If-None-Match with 304,
+answers the first `failures[path]` requests for a path with 503,
+records every request, the number of connections and the largest number
+of requests served at once.
+"""
+import hashlib
+import http.server
+import threading
+import time
+
+
+class _HTTPHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        http.server.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append({'path': self.path, 'headers': dict(self.headers)})
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if server.delay:
+                time.sleep(server.delay)
+            self.respond()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def respond(self):
+        with self.server.lock:
+            failures = self.server.failures.get(self.path, 0)
+            if failures:
+                self.server.failures[self.path] = failures - 1
+        if failures:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        item = self.server.files.get(self.path)
+        if item is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body, content_type = item if isinstance(item, tuple) else (item, 'application/octet-stream')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        if self.server.set_cookie:
+            self.send_header('Set-Cookie', self.server.set_cookie)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeHTTPServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, files=None, delay=0, failures=None, set_cookie=None):
+        http.server.ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), _HTTPHandler)
+        self.files = dict(files or {})
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.set_cookie = set_cookie
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self._thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def url(self, path='/', host=None):
+        return 'http://%s:%s%s' % (host or self.host, self.port, path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,147 @@
+"""
+Minimal in-process ESMTP server for offline tests.
+
+    with FakeSMTPServer(extensions=['PIPELINING']) as server:
+        backend = SMTPBackend(host=server.host, port=server.port)
+        ...
+        assert server.messages[0]['rcpt_to'] == ['a@b.com']
+
+It understands EHLO/HELO, MAIL, RCPT, DATA, BDAT, RSET, NOOP and QUIT,
+records every command and every delivered message.
+"""
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, code, text='OK', more=False):
+        self.wfile.write(('%d%s%s\r\n' % (code, more and '-' or ' ', text)).encode())
+
+    def reset(self):
+        self.mail_from = None
+        self.rcpt_to = []
+        self.chunks = []
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reset()
+        self.reply(220, 'fake.smtp ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            line = line.rstrip(b'\r\n').decode('utf-8', 'replace')
+            cmd, _, arg = line.partition(' ')
+            cmd = cmd.upper()
+            with server.lock:
+                server.commands.append(line)
+            if cmd == 'EHLO':
+                features = ['fake.smtp'] + list(server.extensions)
+                for n, feature in enumerate(features):
+                    self.reply(250, feature, more=n < len(features) - 1)
+            elif cmd == 'HELO':
+                self.reply(250, 'fake.smtp')
+            elif cmd == 'MAIL':
+                address = arg[5:].split(' ')[0].strip('<>')
+                if address in server.refused_senders:
+                    self.reply(553, 'Sender rejected')
+                else:
+                    self.mail_from = address
+                    self.reply(250, 'OK')
+            elif cmd == 'RCPT':
+                address = arg[3:].split(' ')[0].strip('<>')
+                if self.mail_from is None:
+                    self.reply(503, 'Need MAIL first')
+                elif address in server.refused_recipients:
+                    self.reply(550, 'User unknown')
+                else:
+                    self.rcpt_to.append(address)
+                    self.reply(250, 'OK')
+            elif cmd == 'DATA':
+                if not self.rcpt_to:
+                    self.reply(503, 'Need RCPT first')
+                    continue
+                self.reply(354, 'Go ahead')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b'.\r\n':
+                        break
+                    if data_line.startswith(b'..'):
+                        data_line = data_line[1:]
+                    lines.append(data_line)
+                self.deliver(b''.join(lines), 'data')
+            elif cmd == 'BDAT':
+                args = arg.split()
+                size = int(args[0])
+                self.chunks.append(self.rfile.read(size))
+                if not self.rcpt_to:
+                    self.reply(503, 'Need RCPT first')
+                elif len(args) > 1 and args[1].upper() == 'LAST':
+                    self.deliver(b''.join(self.chunks), 'bdat')
+                else:
+                    self.reply(250, '%d octets received' % size)
+            elif cmd == 'RSET':
+                self.reset()
+                self.reply(250, 'OK')
+            elif cmd == 'NOOP':
+                self.reply(250, 'OK')
+            elif cmd == 'QUIT':
+                self.reply(221, 'Bye')
+                break
+            else:
+                self.reply(502, 'Command not implemented')
+
+    def deliver(self, data, via):
+        server = self.server
+        with server.lock:
+            server.messages.append({'mail_from': self.mail_from,
+                                    'rcpt_to': self.rcpt_to,
+                                    'data': data,
+                                    'via': via})
+        self.reset()
+        self.reply(250, 'Queued')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, extensions=('SIZE 10240000', '8BITMIME'),
+                 refused_senders=(), refused_recipients=()):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), _SMTPHandler)
+        self.extensions = list(extensions)
+        self.refused_senders = set(refused_senders)
+        self.refused_recipients = set(refused_recipients)
+        self.lock = threading.Lock()
+        self.commands = []
+        self.messages = []
+        self.connections = 0
+        self._thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
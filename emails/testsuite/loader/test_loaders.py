@@ -233,3 +233,73 @@ def test_base_loader():
     l._files = ['a.gif', '__MACOSX/.index.html']
     with pytest.raises(FileNotFound):
         print(l.find_index_file())
+
+
+@pytest.mark.asyncio
+async def test_from_url_async():
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    html = ('<html><head><link rel="stylesheet" href="a.css"><link rel="stylesheet" href="b.css"></head>'
+            '<body><a href="#">x</a><p>y</p>%s</body></html>' % ''.join('<img src="%d.png">' % n for n in range(4)))
+    files = {'/index.html': (html.encode(), 'text/html; charset=utf-8'),
+             '/a.css': (b'a {color: #000}', 'text/css'), '/b.css': (b'p {color: #fff}', 'text/css')}
+    files.update(('/%d.png' % n, (b'png%d' % n, 'image/png')) for n in range(4))
+
+    with FakeHTTPServer(files, delay=0.1) as server:
+        message = await emails.loader.from_url_async(server.url('/index.html'))
+        # Stylesheets and images are loaded concurrently
+        assert server.max_active >= 2
+        assert len(server.requests) == 7
+        assert all(a.is_fetched for a in message.attachments)
+
+        expected = emails.loader.from_url(server.url('/index.html'))
+        assert message.html == expected.html
+        assert '<a href="#" style="color:#000">' in message.html
+        assert [(a.filename, a.data) for a in message.attachments] == \
+               [(a.filename, a.data) for a in expected.attachments]
+
+        message = await emails.loader.from_html_async(html, base_url=server.url('/'), images_inline=True,
+                                                     prefetch_images={'max_per_host': 1})
+        assert 'src="cid:' in message.html
+
+
+def test_from_url_stream():
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    text = 'Привет, мир! ' * 30000
+    html = '<html><head><meta charset="windows-1251"><title>T</title></head><body><p>%s</p></body></html>' % text
+    files = {'/meta.html': (html.encode('windows-1251'), 'text/html'),
+             '/header.html': (html.replace('windows-1251', 'x').encode('koi8-r'), 'text/html; charset=koi8-r')}
+
+    with FakeHTTPServer(files) as server:
+        for path in files:
+            message = emails.loader.from_url(server.url(path), css_inline=False)
+            assert text in message.html
+            assert message.transformer.tree.find('.//title').text == 'T'
+
+    with FakeHTTPServer({'/empty.html': (b'', 'text/html')}) as server:
+        with pytest.raises(emails.loader.InvalidHtmlFile):
+            emails.loader.from_url(server.url('/empty.html'))
+
+
+def test_parse_page():
+    from emails.loader import _parse_page, CHARSET_SNIFF_SIZE
+
+    class Response:
+        # No .content, the body is only read in chunks
+        headers = {'content-type': 'text/html; charset=utf-8'}
+        chunks = [b'<html><body><p>\xd0\x9f', b'\xd1\x80\xd0\xb8\xd0\xb2\xd0\xb5\xd1\x82</p>', b'</body></html>']
+
+        def iter_content(self, chunk_size):
+            return iter(self.chunks)
+
+    tree = _parse_page(Response())
+    assert tree.find('.//p').text == 'Привет'
+
+    # No charset given and only ascii in the sniffed head
+    Response.headers = {'content-type': 'text/html'}
+    Response.chunks = [b'<html><body><p>' + b'a' * CHARSET_SNIFF_SIZE + b'</p>',
+                       '<p>Привет</p></body></html>'.encode('utf-8')]
+    tree = _parse_page(Response())
+    assert tree.findall('.//p')[1].text == 'Привет'
+
+    m = emails.loader.from_html(tree, css_inline=False)
+    assert '<p>Привет</p>' in m.html
@@ -0,0 +1,136 @@
+import email
+import io
+import pickle
+
+import pytest
+
+import emails
+from emails.backend.inmemory import InMemoryBackend
+from emails.batch import render_parallel
+from emails.template import JinjaTemplate as T
+
+
+def _message():
+    m = emails.Message(html=T('<p>Hello {{ name }}'), subject=T('Hi {{ name }}'),
+                       mail_from='s@lavr.me', message_id=emails.MessageID(domain='lavr.me'))
+    m.attach(data=io.BytesIO(b'x' * 1000), filename='a.bin')
+    return m
+
+
+def test_message_pickle():
+    m = _message()
+    m.render(name='A')
+    assert m.html_body == '<p>Hello A'
+    m.transformer
+    m.smtp_pool
+    m2 = pickle.loads(pickle.dumps(m))
+    assert m2.html_body == '<p>Hello A'
+    assert m2.attachments['a.bin'].data == b'x' * 1000
+    assert m.attachments['a.bin'].data == b'x' * 1000
+    assert 'smtp_pool' not in m2.__dict__ and m2._transformer is None
+
+
+def test_message_pickle_part_cache():
+    from emails.store import MimePartCache
+
+    m = _message()
+    m.attachments.part_cache = cache = MimePartCache(max_size=1000000)
+    m.attach(data=b'y' * 1000, filename='b.bin')
+    m.as_bytes()
+    assert len(cache) == 1
+    m2 = pickle.loads(pickle.dumps(m))
+    # the copy gets its own empty cache
+    f = m2.attachments['b.bin']
+    assert f.part_cache is not cache and len(f.part_cache) == 0
+    assert f.part_cache.max_size == 1000000
+    parts = email.message_from_bytes(m2.as_bytes()).get_payload()
+    assert parts[-1].get_payload(decode=True) == b'y' * 1000
+    f.reset_mime()
+    f.mime
+    assert len(f.part_cache) == 1
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_render_parallel(compiled):
+    contexts = [('u%d@b.com' % n, {'name': 'User %d' % n}) for n in range(50)] + ['last@b.com']
+    results = list(render_parallel(_message(), iter(contexts), workers=2, batch_size=4,
+                                   compiled=compiled))
+    assert [r['to_addrs'] for r in results] == [['u%d@b.com' % n] for n in range(50)] + [['last@b.com']]
+    for n, r in enumerate(results[:50]):
+        assert r['from_addr'] == 's@lavr.me'
+        msg = email.message_from_bytes(r['msg'])
+        assert msg['Subject'] == 'Hi User %d' % n
+        assert msg['To'] == 'u%d@b.com' % n
+    assert email.message_from_bytes(results[-1]['msg'])['Subject'] == 'Hi'
+
+
+def test_render_parallel_send():
+    backend = InMemoryBackend()
+    results = backend.send_messages(render_parallel(_message(), ['a@b.com', 'c@d.com'], workers=1))
+    assert [r.success for r in results] == [True, True]
+    assert 'a.bin' in backend.messages['c@d.com'][0]['message']
+
+
+def test_render_parallel_errors():
+    with pytest.raises(ValueError):
+        render_parallel(_message(), ['a@b.com'], batch_size=0)
+    m = _message()
+    m.set_date(lambda: 'Mon, 01 Jan 2024 00:00:00 +0000')
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        render_parallel(m, ['a@b.com'])
+
+    # An item without recipient doesn't stop the others
+    results = list(render_parallel(_message(), ['a@b.com', '', 'c@d.com'], workers=1))
+    assert isinstance(results[1], ValueError)
+    assert [r['to_addrs'] for r in (results[0], results[2])] == [['a@b.com'], ['c@d.com']]
+    results = InMemoryBackend().send_messages(render_parallel(_message(), ['a@b.com', ''], workers=1))
+    assert [r.success for r in results] == [True, False]
+
+
+@pytest.mark.parametrize('threads', [False, True])
+def test_sign_many(dkim_keys, threads):
+    from concurrent.futures import ThreadPoolExecutor
+    import dkim
+    from emails.batch import sign_many
+    priv_key, pub_key = dkim_keys
+    plain_key = b''.join([l for l in pub_key.split(b'\n') if not l.startswith(b'---')])
+
+    messages = []
+    for n in range(6):
+        m = _message()
+        m.render(name='User %d' % n)
+        if n != 3:
+            m.dkim(key=priv_key, selector='_dkim', domain='lavr.me')
+        messages.append(m)
+
+    if threads:
+        with ThreadPoolExecutor(2) as executor:
+            results = list(sign_many(messages, executor=executor, batch_size=4))
+    else:
+        results = list(sign_many(iter(messages), workers=2, batch_size=4))
+
+    assert len(results) == 6
+    for n, data in enumerate(results):
+        assert b'Hi User %d' % n in data
+        if n == 3:
+            assert b'DKIM-Signature' not in data
+            assert email.message_from_bytes(data)['Subject'] == 'Hi User 3'
+        else:
+            assert data.startswith(b'DKIM-Signature:')
+            assert dkim.verify(data, dnsfunc=lambda name, **kw: b'v=DKIM1; p=' + plain_key)
+
+    # Messages are read a batch ahead, not all at once
+    read = []
+
+    def _messages():
+        for m in messages:
+            read.append(m)
+            yield m
+
+    with ThreadPoolExecutor(2) as executor:
+        signed = sign_many(_messages(), executor=executor, batch_size=2)
+        assert b'Hi User 0' in next(signed)
+        assert len(read) == 4
+        assert [b'Hi User %d' % n in data for (n, data) in enumerate(signed, 1)] == [True] * 5
+    with pytest.raises(ValueError):
+        sign_many(messages, batch_size=0)
@@ -0,0 +1,119 @@
+import email
+
+import dkim
+import pytest
+
+import emails
+from emails.compiled import CompiledMessage
+from emails.template import JinjaTemplate as T
+
+
+def _message(**kw):
+    m = emails.Message(html=T('<p>Hello {{ name }}'), text=T('Hello {{ name }}'),
+                       subject=T('Hi {{ name }}'), mail_from=('Shop', 's@lavr.me'),
+                       date='Mon, 01 Jan 2024 00:00:00 +0000', message_id='<1@lavr.me>', **kw)
+    m.attach(data=b'%PDF' + b'x' * 100000, filename='terms.pdf')
+    m.attach(data=b'GIF89a', filename='logo.gif', content_disposition='inline')
+    return m
+
+
+def _same_boundaries(compiled, msg):
+    boundaries = [p.get_boundary() for p in compiled._root.walk() if p.is_multipart()]
+    for part, boundary in zip([p for p in msg.walk() if p.is_multipart()], boundaries):
+        part.set_boundary(boundary)
+    return msg
+
+
+def test_compiled_same_as_message():
+    m = _message(headers={'X-Campaign': 'spring'}, cc='cc@lavr.me')
+    compiled = m.compile()
+    assert isinstance(compiled, CompiledMessage)
+
+    data = compiled.as_bytes(mail_to=('Bob', 'bob@b.com'), render={'name': 'Bob'})
+    assert b''.join(compiled.iter_bytes(mail_to=('Bob', 'bob@b.com'), render={'name': 'Bob'})) == data
+
+    m.set_mail_to(('Bob', 'bob@b.com'))
+    m.render(name='Bob')
+    expected = _same_boundaries(compiled, m.build_message()).as_bytes(linesep='\r\n')
+    assert data == expected
+
+
+def test_compiled_personalizes():
+    m = _message()
+    m.render(name='Default')
+    compiled = m.compile()
+    for name in ('Alice', 'Bob'):
+        msg = email.message_from_bytes(compiled.as_bytes(mail_to='%s@b.com' % name.lower(),
+                                                         render={'name': name}))
+        assert msg['To'] == '%s@b.com' % name.lower()
+        assert msg['Subject'] == 'Hi %s' % name
+        bodies = [p.get_payload(decode=True) for p in msg.walk() if p.get_content_maintype() == 'text']
+        assert bodies == [('Hello %s' % name).encode(), ('<p>Hello %s' % name).encode()]
+
+    # without arguments the current message state is used, the message is not changed
+    assert b'Subject: Hi Default' in compiled.as_bytes()
+    assert m.mail_to == [] and m.render_data == {'name': 'Default'}
+
+
+def test_compiled_structure_change():
+    m = emails.Message(html='<p>Hi', text=T('{{ text }}'), mail_from='s@lavr.me', mail_to='a@b.com')
+    compiled = m.compile(message_cls=None)
+    # text part is empty at compile time and appears after render
+    msg = email.message_from_bytes(compiled.as_bytes(render={'text': 'Plain'}))
+    assert [p.get_content_type() for p in msg.walk() if not p.is_multipart()] == ['text/plain', 'text/html']
+
+
+def test_compiled_boundary_collision():
+    m = emails.Message(html=T('{{ body }}'), mail_from='s@lavr.me', mail_to='a@b.com', charset='ascii')
+    m.render(body='Hi')
+    compiled = m.compile()
+    boundary = compiled._root.get_boundary()
+    data = compiled.as_bytes(render={'body': '--%s' % boundary})
+    msg = email.message_from_bytes(data)
+    assert msg.get_boundary() != boundary
+    # new boundaries are used for this call only
+    assert compiled._root.get_boundary() == boundary
+    assert email.message_from_bytes(compiled.as_bytes(render={'body': 'Hi'})).get_boundary() == boundary
+    html = [p for p in msg.walk() if p.get_content_type() == 'text/html'][0]
+    assert html.get_payload(decode=True) == ('--%s' % boundary).encode()
+
+
+def test_compiled_dkim(dkim_keys):
+    priv_key, pub_key = dkim_keys
+    m = _message()
+    m.dkim(key=priv_key, selector='_dkim', domain='somewhere.net')
+    data = m.compile().as_bytes(mail_to='a@b.com', render={'name': 'A'})
+    assert data.startswith(b'DKIM-Signature: ')
+    plain_key = b''.join([l for l in pub_key.split(b'\n') if not l.startswith(b'---')])
+    assert dkim.verify(data, dnsfunc=lambda name, **kw: b'v=DKIM1; p=' + plain_key)
+
+
+def test_send_many_compiled():
+    from emails.backend.inmemory import InMemoryBackend
+    backend = InMemoryBackend()
+    m = _message()
+    m.send_many([('a@b.com', {'name': 'A'}), ('b@b.com', {'name': 'B'})], smtp=backend, compiled=True)
+    assert 'Subject: Hi B' in backend.messages['b@b.com'][0]['message']
+    assert 'To: a@b.com' in backend.messages['a@b.com'][0]['message']
+
+
+def test_compiled_file_attachment(dkim_keys, tmp_path, monkeypatch):
+    from emails.store import FileAttachment
+
+    priv_key, pub_key = dkim_keys
+    plain_key = b''.join([l for l in pub_key.split(b'\n') if not l.startswith(b'---')])
+    path = tmp_path / 'export.csv'
+    path.write_bytes(b'id,name\n' * 20000)
+    m = _message()
+    m.attach(path=str(path))
+    m.dkim(key=priv_key, selector='_dkim', domain='somewhere.net')
+    compiled = m.compile()
+
+    monkeypatch.setattr(FileAttachment, 'get_data', lambda self: pytest.fail('file read into memory'))
+    path.write_bytes(b'id,name\n' * 30000)
+    for data in (compiled.as_bytes(mail_to='a@b.com', render={'name': 'A'}),
+                 b''.join(m.iter_bytes())):
+        assert dkim.verify(data, dnsfunc=lambda name, **kw: b'v=DKIM1; p=' + plain_key)
+        parts = [p for p in email.message_from_bytes(data).walk() if p.get_filename() == 'export.csv']
+        # the file is read when the message is serialized, not at compile time
+        assert parts[0].get_payload(decode=True) == b'id,name\n' * 30000
@@ -1,35 +1,17 @@
 import pytest
 import emails
+import emails.batch
+import emails.signers
 from emails import Message
 from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 
 from emails.exc import DKIMException
 import dkim
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
 from .helpers import common_email_data
 
 
-@pytest.fixture(scope="session")
-def dkim_keys():
-    """Fresh 2048-bit RSA keypair for DKIM tests.
-
-    Returns (private_key_pem, public_key_pem) as bytes.
-    Generated once per test session — RSA keygen is slow (~100 ms).
-    """
-    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-    priv_pem = key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.TraditionalOpenSSL,
-        encryption_algorithm=serialization.NoEncryption(),
-    )
-    pub_pem = key.public_key().public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo,
-    )
-    return priv_pem, pub_pem
-
-
 def _check_dkim(message, pub_key):
     def _plain_public_key(s):
         return b"".join([l for l in s.split(b'\n') if not l.startswith(b'---')])
@@ -147,3 +129,193 @@ def test_dkim_sign_twice(dkim_keys):
     for n in range(2):
         message.subject = 'Test %s' % n
         assert _check_dkim(message, pub_key)
+
+
+@pytest.mark.parametrize("body", [
+    b'',
+    b'\r\n',
+    b'\r\n\r\n\r\n',
+    b'Hello\r\n',
+    b'Hello',
+    b'Hello  \t\r\n\r\n \r\n',
+    b'a \t b\nc\r\n\r\n\r\nd\r\r\n\r\n',
+    b'x\r',
+    b'  ',
+    b'line 1\n\nline 3 \n\n\n',
+])
+@pytest.mark.parametrize("canonicalization", [b'simple', b'relaxed'])
+def test_dkim_body_hash(body, canonicalization):
+    from emails.signers import DKIMBodyHash
+    import hashlib
+    canon = dkim.canonicalization.CanonicalizationPolicy.from_c_value(b'simple/' + canonicalization)
+    expected = canon.canonicalize_body(dkim.rfc822_parse(b'From: a\r\n\r\n' + body)[1])
+
+    for size in (1, 2, 3, 7, len(body) or 1):
+        h = DKIMBodyHash(hashlib.sha256, relaxed=canonicalization == b'relaxed')
+        for i in range(0, len(body), size):
+            h.update(body[i:i + size])
+        assert h.digest() == hashlib.sha256(expected).digest()
+        assert h.length == len(expected)
+
+
+@pytest.mark.skipif(not emails.signers._SIGN_HASHED, reason="dkimpy version signs with dkim.DKIM.sign()")
+@pytest.mark.parametrize("canonicalize", [(b'relaxed', b'simple'), (b'simple', b'simple'), (b'relaxed', b'relaxed')])
+@pytest.mark.parametrize("length", [False, True])
+def test_dkim_sign_hashed(dkim_keys, monkeypatch, canonicalize, length):
+    # _DKIM.sign_hashed() is a copy of dkim.DKIM.sign(), they must give the same header
+    import hashlib
+    import time
+    from emails.signers import _DKIM, DKIMBodyHash, _parse_private_key
+    priv_key, _ = dkim_keys
+    monkeypatch.setattr(time, 'time', lambda: 1700000000)
+
+    message = Message(**common_email_data()).as_bytes()
+    expected = dkim.DKIM(message).sign(b'_dkim', b'somewhere.net', priv_key,
+                                       canonicalize=canonicalize, length=length)
+    d = _DKIM(message)
+    body_hash = DKIMBodyHash(hashlib.sha256, relaxed=canonicalize[1] == b'relaxed')
+    body_hash.update(d.body)
+    assert d.sign_hashed(body_hash, _parse_private_key(priv_key, b'rsa-sha256'), b'_dkim', b'somewhere.net',
+                         canonicalize=canonicalize, length=length) == expected
+
+
+def test_dkim_sign_hashed_versions(monkeypatch):
+    import importlib.metadata
+    for (version, expected) in (('1.1.8', True), ('1.2.0', False), ('0.9.6', False)):
+        monkeypatch.setattr(importlib.metadata, 'version', lambda name, version=version: version)
+        assert emails.signers._can_sign_hashed() is expected
+
+
+@pytest.mark.parametrize("sign_params", [
+    {},
+    {'canonicalize': (b'relaxed', b'relaxed')},
+    {'canonicalize': (b'simple', b'simple'), 'length': True},
+])
+@pytest.mark.parametrize("sign_hashed", [True, False])
+def test_dkim_streaming_sign(dkim_keys, monkeypatch, sign_params, sign_hashed):
+    # Without sign_hashed, as for other dkimpy versions, the body is kept and signed by dkimpy
+    monkeypatch.setattr(emails.signers, '_SIGN_HASHED', sign_hashed and emails.signers._SIGN_HASHED)
+    priv_key, pub_key = dkim_keys
+    plain_key = b''.join([l for l in pub_key.split(b'\n') if not l.startswith(b'---')])
+
+    def verify(data):
+        return dkim.verify(data, dnsfunc=lambda name, **kw: b'v=DKIM1; p=' + plain_key)
+
+    message = Message(**common_email_data())
+    message.attach(data=b'x' * 100000, filename='big.bin')
+    message.dkim(key=priv_key, selector='_dkim', domain='somewhere.net', **sign_params)
+
+    assert verify(message.as_bytes())
+    assert verify(b''.join(message.iter_bytes(chunk_size=1000)))
+    assert verify(message.as_message().as_bytes())
+    assert _check_dkim(message, pub_key)
+    assert verify(next(emails.batch.sign_many([message], executor=ThreadPoolExecutor(1))))
+
+
+def test_dkim_shared_signer(dkim_keys, monkeypatch):
+    import pickle
+    import threading
+    from emails.signers import DKIMSigner
+    priv_key, pub_key = dkim_keys
+    DKIMSigner.clear_shared()
+
+    parsed = []
+    parse = dkim.crypto.parse_pem_private_key
+    monkeypatch.setattr(dkim.crypto, 'parse_pem_private_key', lambda data: parsed.append(data) or parse(data))
+
+    messages = [Message(**common_email_data()) for _ in range(8)]
+    for m in messages:
+        m.dkim(key=StringIO(priv_key.decode()), selector='_dkim', domain='somewhere.net',
+               include_headers=['From', 'To', 'Subject'])
+    assert len(set(id(m._signer) for m in messages)) == 1
+    assert len(parsed) == 1
+
+    # Other parameters get another signer
+    m = Message(**common_email_data())
+    m.dkim(key=priv_key, selector='other', domain='somewhere.net')
+    assert m._signer is not messages[0]._signer
+
+    # Signing does not parse the key again and may run in threads
+    results = []
+    threads = [threading.Thread(target=lambda m=m: results.append(_check_dkim(m, pub_key))) for m in messages]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [True] * len(messages)
+    assert len(parsed) == 2
+
+    # Parsed key is not pickled
+    signer = pickle.loads(pickle.dumps(messages[0]._signer))
+    assert '_pk' not in messages[0]._signer.__getstate__()
+    assert signer._pk == messages[0]._signer._pk
+    DKIMSigner.clear_shared()
+
+
+@pytest.fixture(scope="session")
+def ed25519_keys():
+    """Ed25519 keypair as base64 bytes: (private seed, public key)."""
+    import base64
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    key = Ed25519PrivateKey.generate()
+    raw = serialization.Encoding.Raw
+    return (base64.b64encode(key.private_bytes(raw, serialization.PrivateFormat.Raw,
+                                               serialization.NoEncryption())),
+            base64.b64encode(key.public_key().public_bytes(raw, serialization.PublicFormat.Raw)))
+
+
+def _check_ed25519(data, pub_key, idx=0):
+    # dkim.verify() needs PyNaCl for Ed25519, check the signature with cryptography
+    import base64
+    import hashlib
+    import re
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    d = dkim.DKIM(data)
+    sig, include_headers, sigheaders = d.verify_headerprep(idx)
+    assert sig[b'a'] == b'ed25519-sha256'
+    policy = dkim.CanonicalizationPolicy.from_c_value(sig[b'c'])
+    if base64.b64encode(hashlib.sha256(policy.canonicalize_body(d.body)).digest()) != sig[b'bh']:
+        return False
+    h = hashlib.sha256()
+    dkim.hash_headers(h, policy, policy.canonicalize_headers(d.headers), include_headers, sigheaders[idx], sig)
+    try:
+        Ed25519PublicKey.from_public_bytes(base64.b64decode(pub_key)).verify(
+            base64.b64decode(re.sub(br"\s+", b"", sig[b'b'])), h.digest())
+    except InvalidSignature:
+        return False
+    return True
+
+
+def test_dkim_ed25519(ed25519_keys):
+    priv_key, pub_key = ed25519_keys
+    m = Message(**common_email_data())
+    m.dkim(key=priv_key, selector='ed', domain='somewhere.net', signature_algorithm='ed25519-sha256')
+    assert _check_ed25519(m.as_bytes(), pub_key)
+    assert _check_ed25519(m.as_string().encode(), pub_key)
+    assert _check_ed25519(m.as_message().as_bytes(), pub_key)
+
+    with pytest.raises(DKIMException):
+        m.dkim(key=b'bm90IGEga2V5', selector='ed', domain='somewhere.net',
+               signature_algorithm=b'ed25519-sha256')
+
+
+def test_dkim_rsa_and_ed25519(dkim_keys, ed25519_keys):
+    rsa_key, rsa_pub_key = dkim_keys
+    ed_key, ed_pub_key = ed25519_keys
+    plain_key = b''.join([l for l in rsa_pub_key.split(b'\n') if not l.startswith(b'---')])
+
+    m = Message(**common_email_data())
+    m.dkim(key=rsa_key, selector='rsa', domain='somewhere.net')
+    m.add_dkim(key=ed_key, selector='ed', domain='somewhere.net', signature_algorithm=b'ed25519-sha256')
+
+    for data in (m.as_bytes(), b''.join(m.iter_bytes(chunk_size=100)),
+                 m.as_string().encode(), m.as_message().as_bytes()):
+        # Ed25519 signature is added last and goes first
+        assert data.count(b'DKIM-Signature:') == 2
+        assert _check_ed25519(data, ed_pub_key, idx=0)
+        assert dkim.DKIM(data).verify(idx=1, dnsfunc=lambda name, **kw: b'v=DKIM1; p=' + plain_key)
+
+    # sign() replaces all signers
+    m.dkim(key=ed_key, selector='ed', domain='somewhere.net', signature_algorithm=b'ed25519-sha256')
+    assert m.as_bytes().count(b'DKIM-Signature:') == 1
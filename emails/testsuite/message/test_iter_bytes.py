@@ -0,0 +1,48 @@
+import email
+
+import pytest
+
+import emails
+from emails.utils import iter_message_bytes, MessageChunks
+
+
+def _message():
+    m = emails.Message(html='<p>Привет ' + 'x' * 300, text='plain text\n.dot line',
+                       subject='Тест', mail_from=('Sender', 's@lavr.me'), mail_to='a@b.com')
+    m.attach(data=b'\x00\x01' * 100000, filename='big.bin')
+    m.attach(data='hello\n.world', filename='a.txt')
+    m.attach(data=b'png', filename='image.png', content_disposition='inline')
+    return m
+
+
+@pytest.mark.parametrize('chunk_size', [1, 100, 64 * 1024])
+def test_iter_message_bytes_same_as_as_bytes(chunk_size):
+    msg = _message().build_message()
+    chunks = list(iter_message_bytes(msg, linesep='\r\n', chunk_size=chunk_size))
+    assert len(chunks) > 1
+    # boundaries are set while iterating, so as_bytes() keeps them
+    assert b''.join(chunks) == msg.as_bytes(linesep='\r\n')
+
+
+def test_message_iter_bytes():
+    m = _message()
+    data = b''.join(m.iter_bytes(chunk_size=1000))
+    parsed = email.message_from_bytes(data)
+    assert parsed['Subject'] and parsed['To'] == 'a@b.com'
+    payloads = {p.get_filename(): p.get_payload(decode=True) for p in parsed.walk() if p.get_filename()}
+    assert payloads == {'big.bin': b'\x00\x01' * 100000, 'a.txt': b'hello\n.world', 'image.png': b'png'}
+    assert b'\r\n' in data and b'\n' not in data.replace(b'\r\n', b'')
+
+
+def test_message_iter_bytes_errors():
+    with pytest.raises(ValueError):
+        emails.Message(mail_from='s@lavr.me').iter_bytes()
+    with pytest.raises(ValueError):
+        list(_message().iter_bytes(chunk_size=0))
+
+
+def test_message_chunks_reiterable():
+    chunks = MessageChunks(_message(), chunk_size=4096)
+    first = b''.join(chunks)
+    second = b''.join(chunks)
+    assert len(first) == len(second) > 200000
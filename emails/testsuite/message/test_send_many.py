@@ -0,0 +1,48 @@
+import emails
+from emails.backend.inmemory import InMemoryBackend
+from emails.backend.smtp import SMTPBackend
+from emails.template import JinjaTemplate as T
+from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+
+def _message():
+    return emails.html(html=T('<p>Hello {{ name }}'), subject=T('Hi {{ name }}'), mail_from='s@lavr.me')
+
+
+def test_send_many():
+    with FakeSMTPServer() as server:
+        backend = SMTPBackend(host=server.host, port=server.port, local_hostname='localhost')
+        results = _message().send_many([('a@b.com', {'name': 'A'}),
+                                        (('Bob', 'bob@b.com'), {'name': 'Bob'}),
+                                        'c@b.com'],
+                                       smtp=backend)
+        backend.close()
+
+    assert [r.success for r in results] == [True, True, True]
+    assert [m['rcpt_to'] for m in server.messages] == [['a@b.com'], ['bob@b.com'], ['c@b.com']]
+    assert b'Subject: Hi A' in server.messages[0]['data']
+    assert b'To: Bob <bob@b.com>' in server.messages[1]['data']
+    assert b'Subject: Hi\r\n' in server.messages[2]['data']
+    assert server.connections == 1
+
+
+def test_send_many_inmemory():
+    backend = InMemoryBackend()
+    results = _message().send_many(['a@b.com', ('b@b.com', {'name': 'B'})], smtp=backend)
+    assert [r.success for r in results] == [True, True]
+    assert 'Hi B' in backend.messages['b@b.com'][0]['message']
+    assert len(backend.messages['a@b.com']) == 1
+    first = backend.messages['a@b.com'][0]['source_message']
+    second = backend.messages['b@b.com'][0]['source_message']
+    assert first is not second
+    assert first.mail_to == [(None, 'a@b.com')]
+    assert 'Subject: Hi\n' in first.as_string()
+
+
+def test_send_many_bad_address():
+    backend = InMemoryBackend()
+    results = _message().send_many(['a@b.com', '', ('c@b.com', {'name': 'C'})], smtp=backend)
+    assert [r.success for r in results] == [True, False, True]
+    assert isinstance(results[1].error, ValueError)
+    assert len(backend.messages['a@b.com']) == 1
+    assert 'Hi C' in backend.messages['c@b.com'][0]['message']
@@ -215,3 +215,123 @@ async def test_sendmail_string_to_addrs(parent):
         assert response is not None
         assert response.success
         assert response.to_addrs == ['rcpt@example.com']
+
+
+@pytest.mark.asyncio
+async def test_aiosmtplib_internals(parent):
+    # Pipelining and BDAT use SMTPProtocol internals. If an aiosmtplib
+    # release changes them, this fails instead of silently falling back
+    # to plain commands.
+    import asyncio
+    import inspect
+    from emails.backend.smtp.aio_client import AsyncSMTPClientWithResponse
+    from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+    with FakeSMTPServer(extensions=['PIPELINING', 'CHUNKING']) as server:
+        client = AsyncSMTPClientWithResponse(parent=parent, host=server.host, port=server.port)
+        await client.initialize()
+        protocol = client._smtp.protocol
+        missing = [name for name in client.RAW_PROTOCOL_ATTRS if not hasattr(protocol, name)]
+        assert not missing, "aiosmtplib SMTPProtocol lacks %s" % missing
+        assert isinstance(protocol._command_lock, asyncio.Lock)
+        assert protocol._response_pending is False
+        assert inspect.iscoroutinefunction(protocol._drain_helper)
+        assert protocol._read_response_from_buffer() is None
+        assert 'timeout' in inspect.signature(protocol.read_response).parameters
+        assert client._use_pipelining() and client._use_chunking()
+        await client.quit()
+
+
+@pytest.mark.asyncio
+async def test_sendmail_pipelining(parent):
+    from emails.backend.smtp.aio_client import AsyncSMTPClientWithResponse
+    from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+    to_addrs = ['rcpt%d@example.com' % n for n in range(50)] + ['bad@example.com']
+    with FakeSMTPServer(extensions=['SIZE 1000000', 'PIPELINING'],
+                        refused_recipients=['bad@example.com']) as server:
+        client = AsyncSMTPClientWithResponse(parent=parent, host=server.host, port=server.port)
+        await client.initialize()
+        assert client._use_pipelining()
+
+        with patch.object(client._smtp.protocol, 'write', wraps=client._smtp.protocol.write) as write:
+            response = await client.sendmail(from_addr='sender@example.com', to_addrs=to_addrs,
+                                             msg=b'Subject: test\r\n\r\nHello\r\n')
+            # MAIL + RCPTs in one write, then DATA and the message
+            assert write.call_count == 3
+
+        assert response.success
+        assert [r[0] for r in response.responses] == ['mail'] + ['rcpt'] * 51 + ['data']
+        assert response.refused_recipients == {'bad@example.com': (550, b'User unknown')}
+        assert server.messages[0]['rcpt_to'] == to_addrs[:-1]
+
+        # the connection stays in sync for the next envelope
+        response = await client.sendmail(from_addr='sender@example.com', to_addrs=['a@example.com'],
+                                         msg=b'Subject: test\r\n\r\nHello\r\n')
+        assert response.success
+        await client.quit()
+
+
+@pytest.mark.asyncio
+async def test_sendmail_pipelining_sender_refused(parent):
+    from emails.backend.smtp.aio_client import AsyncSMTPClientWithResponse
+    from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+    with FakeSMTPServer(extensions=['PIPELINING'], refused_senders=['bad@example.com']) as server:
+        client = AsyncSMTPClientWithResponse(parent=parent, host=server.host, port=server.port)
+        await client.initialize()
+        response = await client.sendmail(from_addr='bad@example.com', to_addrs=['a@example.com'],
+                                         msg=b'Subject: test\r\n\r\nHello\r\n')
+        assert not response.success
+        assert response.status_code == 553
+        assert [r[0] for r in response.responses] == ['mail']
+
+        client.pipelining = False
+        assert not client._use_pipelining()
+        response = await client.sendmail(from_addr='sender@example.com', to_addrs=['a@example.com'],
+                                         msg=b'Subject: test\r\n\r\nHello\r\n')
+        assert response.success
+        await client.quit()
+
+
+@pytest.mark.asyncio
+async def test_sendmail_bdat(parent):
+    from emails.backend.smtp.aio_client import AsyncSMTPClientWithResponse
+    from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+    msg = b'Subject: test\r\n\r\n.dot\r\n' + b'x' * 100 + b'\r\n'
+    with FakeSMTPServer(extensions=['CHUNKING']) as server:
+        client = AsyncSMTPClientWithResponse(parent=parent, host=server.host, port=server.port,
+                                             chunk_size=40)
+        await client.initialize()
+        response = await client.sendmail(from_addr='sender@example.com', to_addrs=['a@example.com'],
+                                         msg=msg)
+        assert response.success
+        assert response.last_command == 'bdat'
+        assert server.messages[0] == {'mail_from': 'sender@example.com', 'rcpt_to': ['a@example.com'],
+                                      'data': msg, 'via': 'bdat'}
+        assert [c for c in server.commands if c.startswith('BDAT')] == ['BDAT 40', 'BDAT 40', 'BDAT 40', 'BDAT 5 LAST']
+
+        # str messages get CRLF line endings, as with the sync client
+        response = await client.sendmail(from_addr='sender@example.com', to_addrs=['a@example.com'],
+                                         msg='Subject: test\n\nline\rline\n')
+        assert response.success
+        assert server.messages[1]['data'] == b'Subject: test\r\n\r\nline\r\nline\r\n'
+        await client.quit()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('extensions', [['SIZE 1000000'], ['CHUNKING']])
+async def test_sendmail_chunks(parent, extensions):
+    from emails.backend.smtp.aio_client import AsyncSMTPClientWithResponse
+    from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+    chunks = [b'Subject: test\r\n\r\n', b'.dot\r\n', b'x' * 100000, b'\r\n.', b'end\r\n']
+    with FakeSMTPServer(extensions=extensions) as server:
+        client = AsyncSMTPClientWithResponse(parent=parent, host=server.host, port=server.port)
+        await client.initialize()
+        response = await client.sendmail(from_addr='sender@example.com', to_addrs=['a@example.com'],
+                                         msg=iter(chunks))
+        assert response.success
+        assert server.messages[0]['data'] == b''.join(chunks)
+        await client.quit()
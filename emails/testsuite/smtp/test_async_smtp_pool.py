@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiosmtplib
+import pytest
+from emails.backend.smtp.aio_pool import AsyncSMTPPool
+
+
+@pytest.fixture
+def mock_msg():
+    msg = MagicMock()
+    msg.as_bytes.return_value = b"Subject: test\r\n\r\nHello"
+    return msg
+
+
+@pytest.fixture
+def mock_smtp_cls():
+    """Patch aiosmtplib.SMTP; every connection gets its own mock."""
+
+    active = {'now': 0, 'max': 0}
+
+    async def slow_data(*args, **kwargs):
+        active['now'] += 1
+        active['max'] = max(active['max'], active['now'])
+        await asyncio.sleep(0.01)
+        active['now'] -= 1
+        return MagicMock(code=250, message='OK')
+
+    def make_instance(**kwargs):
+        instance = MagicMock()
+        instance.connect = AsyncMock()
+        instance.ehlo = AsyncMock()
+        instance.login = AsyncMock()
+        instance.quit = AsyncMock()
+        instance.close = MagicMock()
+        instance.mail = AsyncMock(return_value=MagicMock(code=250, message='OK'))
+        instance.rcpt = AsyncMock(return_value=MagicMock(code=250, message='OK'))
+        instance.data = AsyncMock(side_effect=slow_data)
+        instance.rset = AsyncMock()
+        instance.is_ehlo_or_helo_needed = False
+        instance.supports_esmtp = True
+        instance.supports_extension = MagicMock(return_value=False)
+        return instance
+
+    with patch('emails.backend.smtp.aio_client.aiosmtplib.SMTP') as mock_cls:
+        mock_cls.side_effect = make_instance
+        mock_cls.active = active
+        yield mock_cls
+
+
+@pytest.mark.asyncio
+async def test_pool_concurrent_sends(mock_smtp_cls, mock_msg):
+    pool = AsyncSMTPPool(host='localhost', port=2525, max_connections=4)
+    responses = await asyncio.gather(*[
+        pool.sendmail(from_addr='a@b.com', to_addrs='c@d.com', msg=mock_msg)
+        for _ in range(20)])
+    assert all(r.success for r in responses)
+    assert mock_smtp_cls.call_count == 4
+    assert mock_smtp_cls.active['max'] == 4
+    assert pool.size == 4 and pool.idle == 4
+    await pool.close()
+    assert pool.size == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_fair_checkout(mock_smtp_cls):
+    pool = AsyncSMTPPool(host='localhost', port=2525, max_connections=1)
+    client = await pool.checkout()
+    order = []
+
+    async def waiter(n):
+        c = await pool.checkout()
+        order.append(n)
+        await pool.checkin(c)
+
+    tasks = [asyncio.ensure_future(waiter(n)) for n in range(5)]
+    await asyncio.sleep(0)
+    await pool.checkin(client)
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2, 3, 4]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnect_on_disconnect(mock_smtp_cls, mock_msg):
+    pool = AsyncSMTPPool(host='localhost', port=2525, max_connections=2)
+    clients = [await pool.checkout() for _ in range(2)]
+    for client in clients:
+        # both idle connections were dropped by the server
+        client._smtp.mail.side_effect = aiosmtplib.SMTPServerDisconnected('gone')
+        await pool.checkin(client)
+
+    response = await pool.sendmail(from_addr='a@b.com', to_addrs='c@d.com', msg=mock_msg)
+    assert response.success
+    # the retry goes over a new connection, not the other idle one
+    assert mock_smtp_cls.call_count == 3
+    for client in clients:
+        client._smtp.quit.assert_awaited()
+    assert pool.size == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_get_client(mock_smtp_cls):
+    pool = AsyncSMTPPool(host='localhost', port=2525, max_connections=1)
+    client = await pool.get_client()
+    assert pool.idle == 0
+    await pool.checkin(client)
+    assert await pool.get_client() is client
+    await pool.checkin(client)
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_close_drains(mock_smtp_cls, mock_msg):
+    pool = AsyncSMTPPool(host='localhost', port=2525, max_connections=2)
+    sends = [asyncio.ensure_future(pool.sendmail(from_addr='a@b.com', to_addrs='c@d.com', msg=mock_msg))
+             for _ in range(4)]
+    await asyncio.sleep(0)
+    await pool.close()
+    assert all(s.done() and s.result().success for s in sends)
+    assert pool.size == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_cancelled_waiter(mock_smtp_cls):
+    pool = AsyncSMTPPool(host='localhost', port=2525, max_connections=1)
+    client = await pool.checkout()
+    task = asyncio.ensure_future(pool.checkout())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await pool.checkin(client)
+    assert pool.idle == 1
+    assert await pool.checkout() is client
+    await pool.checkin(client)
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_connect_error(mock_msg):
+    with patch('emails.backend.smtp.aio_client.aiosmtplib.SMTP') as mock_cls:
+        instance = MagicMock()
+        instance.connect = AsyncMock(side_effect=aiosmtplib.SMTPConnectError('refused'))
+        instance.quit = AsyncMock()
+        mock_cls.return_value = instance
+        pool = AsyncSMTPPool(host='localhost', port=2525)
+        response = await pool.sendmail(from_addr='a@b.com', to_addrs='c@d.com', msg=mock_msg)
+        assert not response.success
+        assert isinstance(response.error, aiosmtplib.SMTPConnectError)
+        assert pool.size == 0
+
+
+def test_pool_init_error():
+    with pytest.raises(ValueError):
+        AsyncSMTPPool(host='localhost', max_connections=0)
@@ -6,6 +6,7 @@ import pytest
 import emails
 from emails.backend.smtp import SMTPBackend
 from emails.testsuite.smtp_servers import get_servers
+from emails.testsuite.fake_smtp_server import FakeSMTPServer
 
 SAMPLE_MESSAGE = {'html': '<p>Test from python-emails',
                   'text': 'Test from python-emails',
@@ -52,3 +53,24 @@ def test_smtp_init_error():
 def test_smtp_empty_sendmail():
     response = SMTPBackend().sendmail(to_addrs=[], from_addr='a@b.com', msg='')
     assert not response
+
+
+def test_send_messages():
+    with FakeSMTPServer(refused_recipients=['bad@b.com']) as server:
+        with SMTPBackend(host=server.host, port=server.port, local_hostname='localhost') as backend:
+            def _messages():
+                for n in range(3):
+                    yield emails.html(html='<p>%d' % n, mail_from='s@lavr.me', mail_to='%d@b.com' % n)
+                yield {'from_addr': 's@lavr.me', 'to_addrs': ['bad@b.com'], 'msg': emails.html(html='<p>bad')}
+                yield emails.html(html='<p>no recipients', mail_from='s@lavr.me')
+                yield ValueError('No to-addr')
+
+            results = backend.send_messages(_messages())
+
+        assert [r and r.success for r in results] == [True, True, True, False, None, False]
+        assert isinstance(results[5].error, ValueError)
+        assert results[0].status_code == 250
+        assert results[3].status_code == 550
+        assert results[3].error is not None
+        assert [m['rcpt_to'] for m in server.messages] == [['0@b.com'], ['1@b.com'], ['2@b.com']]
+        assert server.connections == 1
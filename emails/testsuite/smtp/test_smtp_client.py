@@ -0,0 +1,136 @@
+from unittest.mock import patch
+
+import pytest
+
+import emails
+from emails.backend.smtp import SMTPBackend
+from emails.backend.smtp.client import SMTPClientWithResponse
+from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+MSG = b'Subject: test\r\n\r\nHello\r\n'
+
+
+@pytest.fixture
+def pipelining_server():
+    with FakeSMTPServer(extensions=['SIZE 1000000', 'PIPELINING'],
+                        refused_recipients=['bad@b.com']) as server:
+        yield server
+
+
+def _client(server, **kw):
+    backend = SMTPBackend(host=server.host, port=server.port, local_hostname='localhost', **kw)
+    return backend, backend.get_client()
+
+
+def test_pipelined_envelope(pipelining_server):
+    backend, client = _client(pipelining_server)
+    with patch.object(client, 'send', wraps=client.send) as send:
+        response = client.sendmail(from_addr='s@lavr.me',
+                                   to_addrs=['a@b.com', 'bad@b.com', 'c@b.com'], msg=MSG)
+        # one write for MAIL + RCPTs, one for DATA, one for the message body
+        assert send.call_count == 3
+    assert response.success
+    assert [r[0] for r in response.responses] == ['mail', 'rcpt', 'rcpt', 'rcpt', 'data']
+    assert [r[3].get('recipient') for r in response.responses[1:4]] == ['a@b.com', 'bad@b.com', 'c@b.com']
+    assert response.refused_recipients == {'bad@b.com': (550, b'User unknown')}
+    assert pipelining_server.messages[0]['rcpt_to'] == ['a@b.com', 'c@b.com']
+    backend.close()
+
+
+def test_pipelined_sender_refused():
+    with FakeSMTPServer(extensions=['PIPELINING'], refused_senders=['bad@b.com']) as server:
+        backend, client = _client(server)
+        response = client.sendmail(from_addr='bad@b.com', to_addrs=['a@b.com', 'c@b.com'], msg=MSG)
+        assert not response.success
+        assert [r[0] for r in response.responses] == ['mail']
+        assert response.status_code == 553
+        # connection stays usable: all RCPT replies were consumed
+        response = client.sendmail(from_addr='s@lavr.me', to_addrs=['a@b.com'], msg=MSG)
+        assert response.success
+        backend.close()
+
+
+def test_pipelining_disabled(pipelining_server):
+    backend, client = _client(pipelining_server, pipelining=False)
+    with patch.object(client, 'send', wraps=client.send) as send:
+        response = client.sendmail(from_addr='s@lavr.me', to_addrs=['a@b.com', 'c@b.com'], msg=MSG)
+        assert send.call_count == 5
+    assert response.success
+    backend.close()
+
+
+def test_no_pipelining_extension():
+    with FakeSMTPServer(extensions=[]) as server:
+        backend, client = _client(server)
+        assert not client._use_pipelining()
+        response = client.sendmail(from_addr='s@lavr.me', to_addrs=['a@b.com', 'c@b.com'], msg=MSG)
+        assert response.success
+        assert server.messages[0]['data'] == MSG
+        backend.close()
+
+
+def test_bdat():
+    msg = b'Subject: test\r\n\r\n.dot\r\n' + b'x' * 110 + b'\r\n.\r\n'
+    with FakeSMTPServer(extensions=['CHUNKING', 'PIPELINING']) as server:
+        backend, client = _client(server, chunk_size=32)
+        response = client.sendmail(from_addr='s@lavr.me', to_addrs=['a@b.com'], msg=msg)
+        assert response.success
+        assert response.last_command == 'bdat'
+        assert server.messages[0]['via'] == 'bdat'
+        assert server.messages[0]['data'] == msg
+        assert len([c for c in server.commands if c.startswith('BDAT')]) == 5
+        assert server.commands[-1] == 'BDAT %d LAST' % (len(msg) % 32)
+
+        client.chunking = False
+        response = client.sendmail(from_addr='s@lavr.me', to_addrs=['a@b.com'], msg=msg)
+        assert response.success
+        assert response.last_command == 'data'
+        assert server.messages[1]['via'] == 'data'
+        assert server.messages[1]['data'] == msg
+        backend.close()
+
+
+@pytest.mark.parametrize('extensions', [['SIZE 1000000'], ['CHUNKING']])
+def test_send_chunks(extensions):
+    chunks = [b'Subject: test\r\n\r\n', b'.dot at chunk start\r\n', b'line\r', b'\n.', b'dot after split', b'\r\n..two']
+    msg = b''.join(chunks)
+    with FakeSMTPServer(extensions=extensions) as server:
+        backend, client = _client(server, chunk_size=8)
+        response = client.sendmail(from_addr='s@lavr.me', to_addrs=['a@b.com'], msg=iter(chunks))
+        assert response.success
+        assert server.messages[0]['data'] == (msg + b'\r\n' if 'SIZE' in extensions[0] else msg)
+        backend.close()
+
+
+def test_backend_stream():
+    message = emails.Message(html='<p>Hi', mail_from='s@lavr.me', subject='Stream')
+    message.attach(data=b'x' * 300000, filename='big.bin')
+    with FakeSMTPServer() as server:
+        backend = SMTPBackend(host=server.host, port=server.port, local_hostname='localhost', stream=True)
+        with patch.object(SMTPClientWithResponse, 'data_stream', autospec=True,
+                          side_effect=SMTPClientWithResponse.data_stream) as data_stream:
+            response = backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com', msg=message)
+            assert data_stream.called
+        assert response.success
+        assert b'Subject: Stream' in server.messages[0]['data']
+        assert len(server.messages[0]['data']) > 400000
+        backend.close()
+
+
+def test_backend_stream_file_attachment(tmp_path, monkeypatch):
+    # Messages with files attached by path are streamed without stream=True
+    from emails.store import FileAttachment
+    path = tmp_path / 'big.bin'
+    path.write_bytes(b'x' * 300000)
+    message = emails.Message(html='<p>Hi', mail_from='s@lavr.me', subject='Stream')
+    message.attach(path=str(path))
+    monkeypatch.setattr(FileAttachment, 'get_data', lambda self: pytest.fail('file read into memory'))
+    with FakeSMTPServer() as server:
+        backend = SMTPBackend(host=server.host, port=server.port, local_hostname='localhost')
+        with patch.object(SMTPClientWithResponse, 'data_stream', autospec=True,
+                          side_effect=SMTPClientWithResponse.data_stream) as data_stream:
+            response = backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com', msg=message)
+            assert data_stream.called
+        assert response.success
+        assert len(server.messages[0]['data']) > 400000
+        backend.close()
@@ -0,0 +1,124 @@
+import socket
+import threading
+
+import pytest
+
+import emails
+from emails.backend.smtp import SMTPPoolBackend, SMTPPoolFactory
+from emails.backend.smtp.exceptions import SMTPPoolTimeout
+from emails.testsuite.fake_smtp_server import FakeSMTPServer
+
+SAMPLE_MESSAGE = {'html': '<p>Test from python-emails',
+                  'mail_from': 's@lavr.me',
+                  'subject': 'Pool test'}
+
+
+@pytest.fixture
+def server():
+    with FakeSMTPServer() as s:
+        yield s
+
+
+def _backend(server, **kw):
+    return SMTPPoolBackend(host=server.host, port=server.port, local_hostname='localhost', **kw)
+
+
+def test_pool_reuses_connection(server):
+    backend = _backend(server)
+    for _ in range(3):
+        response = backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com',
+                                    msg=emails.html(**SAMPLE_MESSAGE))
+        assert response.success
+    assert server.connections == 1
+    assert backend.size == 1 and backend.idle == 1
+    backend.close()
+    assert backend.size == 0
+
+
+def test_pool_threads(server):
+    backend = _backend(server, max_connections=3)
+    results = []
+
+    def worker():
+        for _ in range(5):
+            r = backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com',
+                                 msg=emails.html(**SAMPLE_MESSAGE))
+            results.append(r.success)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+
+    assert len(results) == 30 and all(results)
+    assert len(server.messages) == 30
+    assert server.connections <= 3
+    assert backend.size <= 3
+    backend.close()
+
+
+def test_pool_max_messages_per_connection(server):
+    backend = _backend(server, max_messages_per_connection=2)
+    for _ in range(5):
+        backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com', msg=emails.html(**SAMPLE_MESSAGE))
+    assert server.connections == 3
+    backend.close()
+
+
+def test_pool_noop_check_and_dead_connection(server):
+    backend = _backend(server, check_interval=0)
+    with backend.connection() as client:
+        pass
+    # simulate server side disconnect
+    client.sock.shutdown(socket.SHUT_RDWR)
+    response = backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com', msg=emails.html(**SAMPLE_MESSAGE))
+    assert response.success
+    assert server.connections == 2
+    assert backend.size == 1
+    backend.close()
+
+
+def test_pool_min_connections(server):
+    backend = _backend(server, min_connections=2)
+    backend.sendmail(from_addr='s@lavr.me', to_addrs='a@b.com', msg=emails.html(**SAMPLE_MESSAGE))
+    assert server.connections == 2
+    assert backend.size == 2
+    backend.close()
+
+
+def test_pool_checkout_timeout(server):
+    backend = _backend(server, max_connections=1, checkout_timeout=0.05)
+    with backend.connection():
+        with pytest.raises(SMTPPoolTimeout):
+            backend.checkout()
+    backend.close()
+
+
+def test_pool_init_errors():
+    with pytest.raises(ValueError):
+        SMTPPoolBackend(host='X', max_connections=0)
+    with pytest.raises(ValueError):
+        SMTPPoolBackend(host='X', min_connections=3, max_connections=2)
+
+
+def test_pool_retry_wrapper():
+    backend = SMTPPoolBackend(host='X')
+    send = backend.retry_on_disconnect(backend._send)
+    assert send.__name__ == '_send'
+    assert send.__wrapped__ == backend._send
+
+
+def test_pool_factory_is_shared(server):
+    params = {'host': server.host, 'port': server.port, 'local_hostname': 'localhost', 'max_connections': 2}
+
+    class PooledMessage(emails.Message):
+        smtp_pool_factory = SMTPPoolFactory
+
+    m1 = PooledMessage(mail_to='a@b.com', **SAMPLE_MESSAGE)
+    m2 = PooledMessage(mail_to='c@d.com', **SAMPLE_MESSAGE)
+    assert m1.smtp_pool[params] is m2.smtp_pool[params]
+    assert isinstance(m1.smtp_pool[params], SMTPPoolBackend)
+
+    assert m1.send(smtp=params).success
+    assert m2.send(smtp=params).success
+    assert server.connections == 1
+    SMTPPoolFactory.close_all()
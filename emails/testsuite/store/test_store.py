@@ -1,3 +1,4 @@
+import email
 from io import BytesIO
 
 import pytest
@@ -108,3 +109,254 @@ def test_store_commons2():
     store.remove(f1)
     assert f1 not in store
     assert len(store) == 0
+
+
+def test_part_cache():
+    from emails.store import MimePartCache
+
+    cache = MimePartCache()
+    data = b'%PDF' + b'x' * 10000
+    parts = []
+    for n in range(3):
+        store = emails.store.MemoryFileStore(part_cache=cache)
+        f = store.add({'data': data, 'filename': 'invoice.pdf'})
+        assert f.part_cache is cache
+        parts.append(f.mime)
+    assert len(cache) == 1 and cache.misses == 1 and cache.hits == 2
+    assert parts[0] is not parts[1]
+    assert parts[0].as_string() == parts[1].as_string() == parts[2].as_string()
+    # the encoded payload is shared, not copied
+    assert parts[1].get_payload() is parts[2].get_payload()
+
+    # headers of a cached part belong to that message only
+    parts[1]['X-Extra'] = '1'
+    assert 'X-Extra' not in parts[2]
+
+    # any difference in the part gives another key
+    for kw in ({'data': data + b'!', 'filename': 'invoice.pdf'},
+               {'data': data, 'filename': 'other.pdf'},
+               {'data': data, 'filename': 'invoice.pdf', 'content_disposition': 'inline'},
+               {'data': data, 'filename': 'invoice.pdf', 'mime_type': 'application/octet-stream'},
+               {'data': data, 'filename': 'invoice.pdf', 'headers': {'X-Header': 'X'}}):
+        f = emails.store.BaseFile(**kw)
+        f.part_cache = cache
+        assert f.mime
+    assert len(cache) == 6
+
+
+def test_part_cache_lru():
+    from emails.store import MimePartCache
+
+    cache = MimePartCache(max_size=3000)
+    files = []
+    for name in 'abc':
+        f = emails.store.BaseFile(data=name * 1000, filename='%s.txt' % name)
+        f.part_cache = cache
+        f.mime
+        files.append(f)
+    # each part is ~1370 bytes encoded, so only two fit
+    assert len(cache) == 2 and cache.size <= 3000
+    files[0].reset_mime()
+    files[0].mime
+    assert cache.misses == 4
+
+    big = emails.store.BaseFile(data='x' * 10000, filename='big.txt')
+    big.part_cache = cache
+    assert big.mime is not None
+    assert len(cache) == 2
+
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+    with pytest.raises(ValueError):
+        MimePartCache(max_size=-1)
+
+
+def test_part_cache_http_file():
+    from emails.store import MimePartCache
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+
+    cache = MimePartCache()
+    with FakeHTTPServer({'/a.png': (b'png', 'image/png')}) as server:
+        parts = []
+        for _ in range(2):
+            f = emails.store.LazyHTTPFile(uri=server.url('/a.png'), content_disposition='inline')
+            f.part_cache = cache
+            parts.append(f.mime)
+            assert 'date' in f.headers
+    # response headers are not part of the key, nor of the mime part
+    assert cache.hits == 1 and len(cache) == 1
+    assert parts[0]['Date'] is None and parts[0].get_content_type() == 'image/png'
+
+
+def test_message_with_part_cache():
+    from emails.store import MimePartCache
+
+    class CachedStore(emails.store.MemoryFileStore):
+        part_cache = MimePartCache()
+
+    class CachedMessage(emails.Message):
+        filestore_cls = CachedStore
+
+    for n in range(3):
+        m = CachedMessage(html='<p>Hi', mail_from='s@lavr.me', mail_to='a%d@b.com' % n)
+        m.attach(data=b'x' * 5000, filename='a.bin')
+        assert b'filename="a.bin"' in m.as_bytes()
+    assert CachedStore.part_cache.hits == 2
+
+
+def test_prefetch():
+    import time
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    files = dict(('/%d.png' % n, (b'png%d' % n, 'image/png')) for n in range(12))
+    with FakeHTTPServer(files, delay=0.2) as server:
+        store = emails.store.MemoryFileStore()
+        for n in range(12):
+            store.add(emails.store.LazyHTTPFile(uri=server.url('/%d.png' % n)))
+        store.add(emails.store.BaseFile(data='x', filename='x.txt'))
+        store.add(emails.store.LazyHTTPFile(uri=server.url('/missing.png')))
+
+        started = time.monotonic()
+        assert emails.store.prefetch(store, max_workers=8, max_per_host=3) == 12
+        # 13 requests, 3 at a time: 5 rounds of 0.2s against 2.6s one by one
+        assert time.monotonic() - started < 13 * 0.2 * 0.75
+        assert server.max_active == 3
+        requests = len(server.requests)
+        assert store['5.png'].data == b'png5'
+        assert store['5.png'].mime_type == 'image/png'
+        assert len(server.requests) == requests
+
+        # Not fetched files raise on access as before
+        with pytest.raises(emails.HTTPLoaderError):
+            store['missing.png'].data
+
+        # Fetched files are skipped
+        assert emails.store.prefetch(store) == 0
+
+
+def test_prefetch_timeout():
+    import time
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    with FakeHTTPServer({'/a.png': b'a', '/b.png': b'b'}, delay=0.5) as server:
+        files = [emails.store.LazyHTTPFile(uri=server.url('/a.png')),
+                 emails.store.LazyHTTPFile(uri=server.url('/b.png', host='localhost'))]
+        started = time.monotonic()
+        assert emails.store.prefetch(files, timeout=0.1) == 0
+        assert time.monotonic() - started < 0.4
+        # Files still being fetched are not requested again
+        assert files[0].data == b'a' and files[1].data == b'b'
+        assert len(server.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_prefetch_async_timeout():
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    with FakeHTTPServer({'/a.png': b'a', '/b.png': b'b'}, delay=0.5) as server:
+        files = [emails.store.LazyHTTPFile(uri=server.url('/a.png')),
+                 emails.store.LazyHTTPFile(uri=server.url('/b.png', host='localhost'))]
+        assert await emails.store.prefetch_async(files, timeout=0.1) == 0
+        assert files[0].data == b'a' and files[1].data == b'b'
+        assert len(server.requests) == 2
+
+
+def test_disk_url_cache(tmp_path):
+    import os
+    import pickle
+    from emails.utils import HTTPFetcher
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    files = {'/a.png': (b'png', 'image/png'), '/b.png': (b'png', 'image/png'),
+             '/1.bin': b'1' * 12, '/2.bin': b'2' * 12}
+
+    def objects():
+        return sum(len(names) for (_, _, names) in os.walk(str(tmp_path / 'objects')))
+
+    with FakeHTTPServer(files) as server:
+        cache = emails.store.DiskURLCache(str(tmp_path), max_size=25)
+        fetcher = HTTPFetcher(cache=cache)
+        f = emails.store.LazyHTTPFile(uri=server.url('/a.png'), fetcher=fetcher)
+        assert f.data == b'png' and f.mime_type == 'image/png'
+        assert cache.misses == 1 and server.url('/a.png') in cache
+
+        # Without Cache-Control the entry is revalidated with its ETag
+        f = emails.store.LazyHTTPFile(uri=server.url('/a.png'), fetcher=fetcher)
+        assert f.data == b'png' and f.mime_type == 'image/png'
+        assert cache.revalidations == 1
+        assert server.requests[-1]['headers']['If-None-Match']
+
+        # Same content from another url is stored once
+        assert emails.utils.fetch_url(server.url('/b.png'), fetcher=fetcher).content == b'png'
+        assert len(cache) == 2 and objects() == 1
+
+        # Cache is shared between processes with the same directory, here fresh for ttl
+        fetcher = pickle.loads(pickle.dumps(HTTPFetcher(cache=emails.store.DiskURLCache(str(tmp_path), ttl=60))))
+        requests = len(server.requests)
+        r = emails.utils.fetch_url(server.url('/a.png'), fetcher=fetcher)
+        assert r.content == b'png' and r.headers['content-type'] == 'image/png'
+        assert len(server.requests) == requests and fetcher.cache.hits == 1
+
+        # Least recently used urls are evicted when over max_size
+        fetcher = HTTPFetcher(cache=cache)
+        emails.utils.fetch_url(server.url('/1.bin'), fetcher=fetcher)
+        emails.utils.fetch_url(server.url('/2.bin'), fetcher=fetcher)
+        assert server.url('/1.bin') in cache and server.url('/2.bin') in cache
+        assert server.url('/a.png') not in cache and server.url('/b.png') not in cache
+        assert objects() == 2
+
+        # Requests with credentials bypass the cache
+        for kwargs in ({'headers': {'Authorization': 'Bearer secret'}}, {'auth': ('user', 'secret')},
+                       {'cookies': {'session': 'secret'}}):
+            requests = len(server.requests)
+            assert fetcher.get(server.url('/1.bin'), **kwargs).content == b'1' * 12
+            assert fetcher.get(server.url('/a.png'), **kwargs).content == b'png'
+            assert len(server.requests) == requests + 2
+            assert 'If-None-Match' not in server.requests[-1]['headers']
+            assert server.url('/a.png') not in cache
+
+        # Errors are not cached
+        with pytest.raises(emails.HTTPLoaderError):
+            emails.utils.fetch_url(server.url('/missing.png'), fetcher=fetcher)
+        assert server.url('/missing.png') not in cache
+
+        cache.clear()
+        assert len(cache) == 0 and objects() == 0
+
+
+def test_file_attachment(tmp_path, monkeypatch):
+    from emails.store import FileAttachment
+    from emails.utils import FileMIMEPart
+
+    data = b'%PDF' + bytes(range(256)) * 1000
+    path = tmp_path / 'export'
+    path.write_bytes(data)
+
+    f = FileAttachment(path=str(path))
+    assert f.filename == 'export' and f.uri == str(path)
+    assert f.mime_type == 'application/pdf'
+    assert f.data == data
+    assert isinstance(f.mime, FileMIMEPart)
+    expected = BaseFile(data=data, filename='export', mime_type='application/pdf').mime
+    assert f.mime.as_string() == expected.as_string()
+    assert f.mime.get_payload(decode=True) == data
+
+    # chunks are cut on whole base64 lines
+    chunks = list(f.mime.iter_payload(chunk_size=1000, linesep='\r\n'))
+    assert len(chunks) > 100
+    assert all(c.endswith(b'\r\n') for c in chunks)
+    assert b''.join(chunks).replace(b'\r\n', b'\n').decode() == expected.get_payload()
+
+    empty = tmp_path / 'empty.txt'
+    empty.write_bytes(b'')
+    assert FileAttachment(path=str(empty)).mime.as_string().endswith('\n\n')
+
+    m = emails.Message(html='<p>Hi', mail_from='a@b.com', mail_to='c@d.com')
+    m.attach(path=str(path), filename='report.pdf')
+    m.attach(path=str(empty))
+    assert isinstance(m.attachments['report.pdf'], FileAttachment)
+    msg = m.build_message()
+    expected = msg.as_bytes(linesep='\r\n')
+    assert email.message_from_bytes(expected).get_payload()[1].get_payload(decode=True) == data
+
+    # the file is encoded from disk as the message is streamed, not read at once
+    monkeypatch.setattr(FileAttachment, 'get_data', lambda self: pytest.fail('file read into memory'))
+    assert b''.join(msg.iter_bytes(linesep='\r\n', chunk_size=4096)) == expected
+    assert b''.join(m.iter_bytes(chunk_size=4096))
@@ -80,3 +80,70 @@ def test_format_date():
     assert current_year in format_date_header(datetime.datetime.now())
     assert current_year in format_date_header(time.time())
     assert 'X' == format_date_header('X')
+
+
+def test_http_fetcher():
+    from emails.utils import HTTPFetcher
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+
+    files = {'/a.png': (b'a', 'image/png'), '/b.png': b'b'}
+    with FakeHTTPServer(files, failures={'/b.png': 2}) as server:
+        with HTTPFetcher(backoff_factor=0, requests_args={'headers': {'X-Test': '1'}}) as fetcher:
+            assert fetch_url(server.url('/a.png'), fetcher=fetcher).content == b'a'
+            r = fetch_url(server.url('/a.png'), fetcher=fetcher,
+                          requests_args={'headers': {'X-Other': '2'}})
+            assert r.headers['content-type'] == 'image/png'
+
+            # 503 responses are retried
+            assert fetch_url(server.url('/b.png'), fetcher=fetcher).content == b'b'
+
+            with pytest.raises(HTTPLoaderError):
+                fetch_url(server.url('/c.png'), fetcher=fetcher)
+
+        # Connection is kept alive between requests
+        assert server.connections == 1
+        assert [r['path'] for r in server.requests] == ['/a.png', '/a.png', '/b.png', '/b.png', '/b.png', '/c.png']
+        headers = server.requests[1]['headers']
+        assert headers['X-Test'] == '1' and headers['X-Other'] == '2'
+        assert headers['User-Agent'].startswith('python-emails')
+
+    with FakeHTTPServer(files, failures={'/b.png': 2}) as server:
+        fetcher = HTTPFetcher(max_retries=1, backoff_factor=0)
+        with pytest.raises(HTTPLoaderError):
+            fetch_url(server.url('/b.png'), fetcher=fetcher)
+        fetcher.close()
+
+
+def test_http_fetcher_cookies(tmp_path):
+    import requests
+    from emails.store import DiskURLCache
+    from emails.utils import HTTPFetcher
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+
+    with FakeHTTPServer({'/a.png': b'a', '/b.png': b'b'}, set_cookie='sid=secret; Path=/') as server:
+        fetcher = HTTPFetcher(cache=DiskURLCache(str(tmp_path)))
+        fetch_url(server.url('/a.png'), fetcher=fetcher)
+        fetch_url(server.url('/b.png'), fetcher=fetcher)
+        # Cookies of one response are not sent with the next request
+        assert 'Cookie' not in server.requests[-1]['headers']
+        assert len(fetcher.session.cookies) == 0
+        assert server.url('/b.png') in fetcher.cache
+
+        # A session with cookies (e.g. set by a subclass) bypasses the cache
+        fetcher.session.cookies = requests.cookies.cookiejar_from_dict({'sid': 'secret'})
+        requests_count = len(server.requests)
+        assert fetch_url(server.url('/b.png'), fetcher=fetcher).content == b'b'
+        assert len(server.requests) == requests_count + 1
+        assert 'If-None-Match' not in server.requests[-1]['headers']
+        fetcher.close()
+
+
+def test_http_fetcher_pickle():
+    import pickle
+    from emails.utils import HTTPFetcher
+    fetcher = HTTPFetcher(pool_maxsize=2)
+    fetcher.session
+    copied = pickle.loads(pickle.dumps(fetcher))
+    assert copied.pool_maxsize == 2
+    assert copied._session is None
+    assert copied.session is not fetcher.session
@@ -1,4 +1,11 @@
 import os.path
+
+import pytest
+
+import cssutils
+from lxml import etree
+
+import emails
 import emails.loader
 from emails.loader.local_store import FileSystemLoader, BaseLoader
 from emails.template import JinjaTemplate, StringTemplate, MakoTemplate
@@ -32,6 +39,49 @@ def test_html5_transform():
     assert Transformer(html="<a><table/></a>", method="html5").to_string() == '<html><head/><body><a><table/></a></body></html>'
 
 
+def test_parser_backends():
+    from emails.transformer import ParserBackend, LxmlBackend, register_parser, get_parser, _parsers
+
+    assert get_parser('unknown') is get_parser('html')
+    assert Transformer(html="<a><b/></a>", method="xml").to_string() == '<a><b/></a>'
+
+    class UpperBackend(LxmlBackend):
+        def parse(self, html):
+            return LxmlBackend.parse(self, html.upper())
+
+        def serialize(self, tree, **kwargs):
+            return LxmlBackend.serialize(self, tree, **kwargs).lower()
+
+    register_parser('upper', UpperBackend())
+    try:
+        t = Transformer(html='<p style="background: url(x.png)">x</p>', method='upper')
+        assert t.tree.find('.//p').text == 'X'
+        t.apply_to_images(lambda uri, **kw: "a/" + uri.lower())
+        assert '<p style="background: url(a/x.png)">x</p>' in t.to_string()
+    finally:
+        del _parsers['upper']
+
+    # Backend instance may be given as method
+    assert Transformer(html="<a>x</a>", method=UpperBackend()).to_string() == '<html><body><a>x</a></body></html>'
+    assert isinstance(get_parser('html5'), ParserBackend)
+
+
+def test_html5_parser_backend():
+    # Required in the html5 tox environment, skipped elsewhere when not installed
+    if not os.environ.get('TEST_HTML5_PARSER'):
+        pytest.importorskip('html5_parser')
+    assert Transformer(html="<a><table/></a>", method="html5-parser").to_string() == \
+        Transformer(html="<a><table/></a>", method="html5").to_string()
+
+
+def test_parser_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    html = '<div>%s</div>' % ''.join('<p>%d</p>' % n for n in range(200))
+    expected = Transformer(html=html).to_string()
+    with ThreadPoolExecutor(8) as pool:
+        assert set(pool.map(lambda _: Transformer(html=html).to_string(), range(100))) == {expected}
+
+
 def test_entity_13():
     assert "<div>x\n</div>" in Transformer(html="<div>x\r\n</div>").to_string()
 
@@ -52,6 +102,87 @@ def test_link_apply():
         assert after in t.to_string()
 
 
+def test_rewrite():
+    html = ('<html><head><style>a {}</style></head><body background="1.png">'
+            '<a href="2"><img src="3.png"></a><p style="background: url(4.png)">x</p>'
+            '<object><img src="5.png"></object><script>y</script>tail</body></html>')
+    seen = []
+
+    def func(uri, **kw):
+        seen.append(uri)
+        return "A/" + uri
+
+    t = Transformer(html=html)
+    t.rewrite(images=func, backgrounds=func, styles_uri=func, links=func, remove_tags=['style', 'object', 'script'])
+    out = t.to_string()
+    # Removed elements are skipped
+    assert seen == ['1.png', '2', '3.png', '4.png']
+    assert '<body background="A/1.png"><a href="A/2"><img src="A/3.png"/></a>' \
+           '<p style="background: url(A/4.png)">x</p></body>' in out
+    assert '<style>' not in out and 'object' not in out and 'script' not in out
+
+
+def test_rewrite_styles():
+    html = ''.join('<p style="background: url(1.png)">x</p><p style="color: red">y</p>'
+                   '<p style="BACKGROUND: URL(2.png)">z</p>' for _ in range(50))
+    seen = []
+
+    def func(uri, **kw):
+        seen.append(uri)
+        return "A/" + uri
+
+    t = Transformer(html=html)
+    t.apply_to_images(func)
+    out = t.to_string()
+    # Same styles are rewritten once, styles without urls are left as is
+    assert seen == ['1.png', '2.png']
+    assert out.count('<p style="background: url(A/1.png)">') == 50
+    assert out.count('<p style="color: red">') == 50
+    assert out.count('url(A/2.png)') == 50
+
+
+def test_save_dirty():
+    html = '<html><body><img src="1.png"></body></html>'
+    t = Transformer(html=html)
+    t.apply_to_images(lambda uri, **kw: uri)
+    assert not t.dirty
+    t.save()
+    assert t.html is html
+
+    t.apply_to_images(lambda uri, **kw: "A/" + uri)
+    assert t.dirty
+    t.save()
+    assert not t.dirty and 'src="A/1.png"' in t.html
+
+    # Tree given out may be changed
+    t.tree.find('body').set('class', 'x')
+    t.save()
+    assert '<body class="x">' in t.html
+
+    html = '<html><head></head><body><img src="1.png"></body></html>'
+    m = emails.Message(html=html)
+    m.transform(css_inline=False, load_images=False, remove_unsafe_tags=False, set_content_type_meta=False)
+    assert m.html is html
+    m.transform(css_inline=False, load_images=False)
+    assert 'Content-Type' in m.html
+
+    # Content-Type meta already set
+    html = m.html
+    m.transform(css_inline=False, load_images=False, remove_unsafe_tags=False)
+    assert m.html is html
+    m.transform(css_inline=False, load_images=False, remove_unsafe_tags=False, set_content_type_meta=False)
+    assert m.html is html
+
+
+def test_xml_output_fix():
+    t = Transformer(html='<html><head><title>Hi</title><meta name="x" content="y"><title/></head></html>')
+    assert t.to_string() == '<html><head><title>Hi</title><meta name="x" content="y"/></head></html>'
+
+    t = Transformer(html='<html><head><script></script><title/></head></html>')
+    t.tree.find('.//script').text = etree.CDATA('a < b')
+    assert t.to_string() == '<html><head><script>/*<![CDATA[*/a < b/*]]>*/</script></head></html>'
+
+
 def test_tag_attribute():
 
     m1 = emails.loader.from_string(html="""<img src="1.jpg">""")
@@ -106,6 +237,12 @@ def test_add_content_type_meta():
     assert type(t.html) == type(t.to_string())
     t.add_content_type_meta(content_type="text/html", charset="utf-16")
     assert 'content="text/html; charset=utf-16"' in t.to_string()
+    t.save()
+    assert not t.dirty
+    t.add_content_type_meta(content_type="text/html", charset="utf-16")
+    assert not t.dirty
+    t.add_content_type_meta(content_type="text/html", charset="utf-8")
+    assert t.dirty and t.to_string().count('http-equiv') == 1
 
 
 def test_image_inline():
@@ -175,3 +312,165 @@ def test_template_transformer():
         assert '<html>' in m.html_body
         assert 'NAME' in m.html_body
         assert '<a href="LINK">_</a>' in m.html_body
+
+
+def test_transform_cache(monkeypatch, tmp_path):
+    from emails.transformer import TransformCache
+    local_loader = FileSystemLoader(os.path.join(ROOT, "data/premailer_load"))
+    html = '<link href="style.css" rel="stylesheet" /><a href="{{ link }}">_</a><img src="1.png">'
+
+    calls = []
+    transform = LocalPremailer.transform
+    monkeypatch.setattr(LocalPremailer, 'transform', lambda self, *a, **kw: calls.append(1) or transform(self, *a, **kw))
+
+    expected = Transformer(html=html, local_loader=local_loader).load_and_transform().to_string()
+    assert len(calls) == 1
+
+    cache = TransformCache()
+    messages = []
+    for n in range(3):
+        m = emails.Message(html=JinjaTemplate(html))
+        m.create_transformer(local_loader=local_loader, transform_cache=cache)
+        m.transform()
+        m.render(link='L%d' % n)
+        messages.append(m)
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+    for n, m in enumerate(messages):
+        assert '<a href="L%d" style="color:#000">_</a>' % n in m.html_body
+        # Images are still collected for every message
+        assert list(m.attachments.keys()) == ['1.png']
+
+    # The cached tree is not changed by later steps
+    t = Transformer(html=html, local_loader=local_loader, transform_cache=cache)
+    t.load_and_transform()
+    assert t.to_string() == expected
+    assert len(calls) == 2
+
+    # Other options, other entry
+    Transformer(html=html, local_loader=local_loader, transform_cache=cache).load_and_transform(keep_style_tags=True)
+    assert len(calls) == 3 and len(cache) == 2
+
+    # Same html with stylesheets from another loader
+    (tmp_path / 'style.css').write_text('a {color: #fff}')
+    other_loader = FileSystemLoader(str(tmp_path))
+    t = Transformer(html=html, local_loader=other_loader, transform_cache=cache)
+    t.load_and_transform()
+    assert 'style="color:#fff"' in t.to_string()
+    assert len(calls) == 4 and len(cache) == 3
+
+    # Requests params with headers are keyed too
+    for _ in range(2):
+        Transformer(html=html, local_loader=local_loader, transform_cache=cache,
+                    requests_params={'headers': {'Authorization': 'Basic x'}}).load_and_transform()
+    assert len(calls) == 5 and len(cache) == 4
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_premailer_without_session(monkeypatch):
+    # premailer before 3.10 has no session argument
+    import emails.transformer
+    from premailer import Premailer
+    init = Premailer.__init__
+
+    def old_init(self, html, session=None, **kw):
+        assert session is None, "session passed to premailer"
+        init(self, html, **kw)
+
+    monkeypatch.setattr(emails.transformer, '_PREMAILER_SESSION', False)
+    monkeypatch.setattr(Premailer, '__init__', old_init)
+    fetcher = emails.utils.HTTPFetcher()
+    t = Transformer(html='<style>a {color: #000}</style><a href="#">_</a>', fetcher=fetcher)
+    assert t.premailer.session is fetcher
+    t.premailer.transform()
+    assert '<a href="#" style="color:#000">' in t.to_string()
+
+
+def test_stylesheet_cache(monkeypatch):
+    from emails.transformer import StylesheetCache
+
+    class Response:
+        def __init__(self, status_code, text='', headers=None):
+            self.status_code = status_code
+            self.text = text
+            self.headers = headers or {}
+
+        def raise_for_status(self):
+            assert self.status_code < 400
+
+    class Session:
+        css = 'a {color: #000}'
+        requests = []
+
+        def get(self, url, headers=None, **kw):
+            self.requests.append((url, headers))
+            if headers.get('If-None-Match') == '"v1"' and self.css == 'a {color: #000}':
+                return Response(304)
+            return Response(200, self.css, {'ETag': '"v1"' if self.css == 'a {color: #000}' else '"v2"'})
+
+    # Parsed stylesheets are cached by premailer for the whole process
+    import premailer.premailer
+    premailer.premailer._cache_parse_css_string.cache_clear()
+    parsed = []
+    parse = cssutils.parseString
+    monkeypatch.setattr(cssutils, 'parseString', lambda css, **kw: parsed.append(css) or parse(css, **kw))
+
+    session = Session()
+    cache = StylesheetCache(ttl=None)
+    html = '<link href="http://x.tld/style.css" rel="stylesheet" /><a href="#">_</a>'
+
+    def transform():
+        return LocalPremailer(html=html, session=session, stylesheet_cache=cache).transform()
+
+    for _ in range(3):
+        assert '<a href="#" style="color:#000">' in transform()
+    assert len(session.requests) == 1 and len(parsed) == 1
+
+    # Revalidation: 304 keeps text and parsed sheet
+    cache.ttl = 0
+    cache.get('http://x.tld/style.css').expires = 0
+    assert '<a href="#" style="color:#000">' in transform()
+    assert session.requests[-1] == ('http://x.tld/style.css', {'If-None-Match': '"v1"'})
+    assert len(session.requests) == 2 and len(parsed) == 1
+    assert cache.revalidations == 1
+
+    # Changed stylesheet is loaded and parsed again
+    session.css = 'a {color: #fff}'
+    assert '<a href="#" style="color:#fff">' in transform()
+    assert len(session.requests) == 3 and len(parsed) == 2
+    assert cache.get('http://x.tld/style.css').etag == '"v2"'
+
+    # Parsing is left to premailer, which may be told not to cache it
+    LocalPremailer(html=html, session=session, stylesheet_cache=cache, cache_css_parsing=False).transform()
+    assert len(session.requests) == 4 and len(parsed) == 3
+
+
+def test_prefetch_images():
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    files = dict(('/%d.png' % n, (b'png', 'image/png')) for n in range(6))
+    with FakeHTTPServer(files, delay=0.1) as server:
+        html = ''.join('<img src="%d.png">' % n for n in range(6))
+        m = emails.loader.from_html(html, base_url=server.url('/'),
+                                    prefetch_images={'max_per_host': 2, 'timeout': 5})
+        assert len(server.requests) == 6
+        assert server.max_active == 2
+        assert all(a.is_fetched for a in m.attachments)
+
+
+def test_transform_with_fetcher():
+    from emails.utils import HTTPFetcher
+    from emails.testsuite.fake_http_server import FakeHTTPServer
+    files = {'/style.css': (b'a {color: #000}', 'text/css'),
+             '/1.png': (b'png', 'image/png'), '/2.png': (b'png', 'image/png')}
+    with FakeHTTPServer(files) as server:
+        with HTTPFetcher() as fetcher:
+            html = '<link rel="stylesheet" href="style.css"><a href="#">x</a><img src="1.png"><img src="2.png">'
+            m = emails.loader.from_html(html, base_url=server.url('/'), fetcher=fetcher)
+            assert '<a href="#" style="color:#000">' in m.html
+            assert all(a.data == b'png' for a in m.attachments)
+        # Images are loaded over one connection, the stylesheet is
+        # requested with verify=True by premailer and has a pool of its own
+        assert len(server.requests) == 3
+        assert server.connections == 2
@@ -1,9 +1,16 @@
 
+import asyncio
+import copy
 import functools
+import hashlib
+import inspect
 import logging
 import posixpath
 import re
+import threading
+import time
 import warnings
+from collections import OrderedDict
 
 from cssutils import CSSParser
 from lxml import etree
@@ -13,19 +20,158 @@ from premailer.premailer import ExternalNotFoundError
 import urllib.parse as urlparse
 
 from .loader.local_store import FileNotFound
-from .store import MemoryFileStore, LazyHTTPFile
+from .store import MemoryFileStore, LazyHTTPFile, prefetch, prefetch_async
 from .template.base import BaseTemplate
+from .utils import get_default_fetcher
+
+
+class Stylesheet(object):
+
+    """
+    Text of a stylesheet loaded from url with its validators.
+    """
+
+    def __init__(self, url, text, etag=None, last_modified=None, expires=None):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def is_fresh(self, now=None):
+        return self.expires is None or (now or time.monotonic()) < self.expires
+
+    def revalidation_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class StylesheetCache(object):
+
+    """
+    Process-wide cache of external stylesheets for LocalPremailer.
+
+    A stylesheet is used without a request for `ttl` seconds after it was
+    loaded. After that it is revalidated with If-None-Match/If-Modified-Since
+    headers, so an unchanged stylesheet is not downloaded again. Parsed
+    sheets are cached by premailer (see Premailer cache_css_parsing).
+    ttl=None keeps stylesheets until clear(), ttl=0 revalidates them every time.
+    """
+
+    DEFAULT_TTL = 300
+    DEFAULT_MAX_ENTRIES = 256
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 0:
+            raise ValueError("max_entries must not be negative")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def set(self, entry):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[entry.url] = entry
+            self._entries.move_to_end(entry.url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self, url, session, **kwargs):
+        """
+        Returns Stylesheet for url, from the cache or loaded with session.get(url, **kwargs)
+        """
+        now = time.monotonic()
+        expires = now + self.ttl if self.ttl is not None else None
+        entry = self.get(url)
+        if entry is not None and entry.is_fresh(now):
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            headers.update(entry.revalidation_headers())
+        response = session.get(url, headers=headers, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            with self._lock:
+                self.revalidations += 1
+            fresh = Stylesheet(url, entry.text, etag=response.headers.get('ETag') or entry.etag,
+                               last_modified=response.headers.get('Last-Modified') or entry.last_modified,
+                               expires=expires)
+        else:
+            with self._lock:
+                self.misses += 1
+            response.raise_for_status()
+            fresh = Stylesheet(url, response.text, etag=response.headers.get('ETag'),
+                               last_modified=response.headers.get('Last-Modified'),
+                               expires=expires)
+        self.set(fresh)
+        return fresh
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+
+default_stylesheet_cache = StylesheetCache()
+
+
+# premailer releases before 3.10 take no session argument
+_PREMAILER_SESSION = 'session' in inspect.signature(Premailer.__init__).parameters
 
 
 class LocalPremailer(Premailer):
 
-    def __init__(self, html, local_loader=None, attribute_name=None, **kw):
+    stylesheet_cache = None
+
+    def __init__(self, html, local_loader=None, attribute_name=None, stylesheet_cache=None,
+                 preloaded=None, **kw):
         if 'preserve_internal_links' not in kw:
             kw['preserve_internal_links'] = True
         self.local_loader = local_loader
         if attribute_name:
             self.attribute_name = attribute_name
+        if stylesheet_cache is not None:
+            self.stylesheet_cache = stylesheet_cache
+        # Texts of stylesheets loaded beforehand, by url
+        self.preloaded = preloaded if preloaded is not None else {}
+        session = kw.pop('session', None) if not _PREMAILER_SESSION else None
         super(LocalPremailer, self).__init__(html=html, **kw)
+        if not _PREMAILER_SESSION:
+            # Used by stylesheet_cache only, premailer loads urls itself
+            self.session = session or get_default_fetcher()
+
+    def _load_external_url(self, url):
+        text = self.preloaded.get(url)
+        if text is not None:
+            return text
+        if self.stylesheet_cache is None:
+            return super(LocalPremailer, self)._load_external_url(url)
+        return self.stylesheet_cache.load(url, self.session,
+                                          verify=not getattr(self, 'allow_insecure_ssl', False)).text
 
     def _load_external(self, url):
         """
@@ -58,13 +204,198 @@ class LocalPremailer(Premailer):
         return content
 
 
+class TransformCache(object):
+
+    """
+    LRU cache of html trees with inlined css.
+
+    Keyed by a hash of the html and the premailer options, so the css of
+    a template is loaded and inlined once, not once per message.
+    The local loader and the session stylesheets are loaded with are
+    part of the key (by identity), stylesheets themselves are assumed
+    not to change while the html stays the same, call clear() when
+    they do. Making a key serializes the whole tree.
+    """
+
+    DEFAULT_MAX_ENTRIES = 256
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 0:
+            raise ValueError("max_entries must not be negative")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(html, **options):
+        """
+        Returns cache key for html (bytes) and transform options,
+        or None if options can not be hashed.
+        """
+        key = (hashlib.sha256(html).hexdigest(), TransformCache._freeze(options))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @staticmethod
+    def _freeze(value):
+        # dicts of options (requests params, headers) as hashable tuples
+        if isinstance(value, dict):
+            return tuple(sorted((k, TransformCache._freeze(v)) for (k, v) in value.items()))
+        return value
+
+    def get(self, key):
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None:
+                self.misses += 1
+                return None
+            self._trees.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(tree)
+
+    def set(self, key, tree):
+        if not self.max_entries:
+            return
+        tree = copy.deepcopy(tree)
+        with self._lock:
+            self._trees[key] = tree
+            self._trees.move_to_end(key)
+            while len(self._trees) > self.max_entries:
+                self._trees.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._trees.clear()
+
+    def __len__(self):
+        return len(self._trees)
+
+    def __contains__(self, key):
+        return key in self._trees
+
+
+default_transform_cache = TransformCache()
+
+
+class ParserBackend(object):
+
+    """
+    Parses html to an lxml tree and serializes the tree back.
+
+    Backends are registered by name with register_parser() and selected
+    with the `method` argument of HTMLParser and transformers.
+    """
+
+    # premailer parses and serializes trees as 'html' or 'xml'
+    premailer_method = 'html'
+
+    def parse(self, html):
+        raise NotImplementedError
+
+    def feed_parser(self, encoding=None):
+        """
+        Returns a parser for incremental parsing, with feed(data) and
+        close() returning the root element, or None if not supported.
+        Data is bytes in `encoding`, or str.
+        """
+        return None
+
+    def serialize(self, tree, encoding='utf-8', method='xml', **kwargs):
+        return etree.tostring(tree, encoding=encoding, method=method, **kwargs).decode(encoding)
+
+
+class LxmlBackend(ParserBackend):
+
+    """
+    lxml parser. Parser objects are reused in each thread,
+    which is cheaper than creating one for every parse.
+    """
+
+    parser_cls = etree.HTMLParser
+
+    def __init__(self, **options):
+        self.options = options
+        self._local = threading.local()
+
+    def feed_parser(self, encoding=None):
+        return self.parser_cls(encoding=encoding, **self.options)
+
+    def parse(self, html):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = self.feed_parser()
+        return etree.fromstring(html, parser)
+
+
+class LxmlXMLBackend(LxmlBackend):
+
+    parser_cls = etree.XMLParser
+    premailer_method = 'xml'
+
+
+class HTML5LibBackend(ParserBackend):
+
+    """
+    html5lib parser, parses like browsers do, but is slow.
+    """
+
+    def parse(self, html):
+        import html5lib
+        parsed = html5lib.parse(html, treebuilder='lxml', namespaceHTMLElements=False)
+        return parsed.getroot()
+
+
+class HTML5ParserBackend(ParserBackend):
+
+    """
+    html5-parser (https://html5-parser.readthedocs.io): html5 parsing
+    in C, many times faster than html5lib and about as fast as lxml.
+    """
+
+    def parse(self, html):
+        import html5_parser
+        return html5_parser.parse(html, treebuilder='lxml', namespace_elements=False)
+
+
+_parsers: dict[str, ParserBackend] = {}
+
+
+def register_parser(name, backend):
+    """
+    Registers ParserBackend instance under name.
+    """
+    _parsers[name] = backend
+
+
+def get_parser(method):
+    """
+    Returns ParserBackend for name or backend instance `method`.
+    Unknown names get the default lxml html parser.
+    """
+    if isinstance(method, ParserBackend):
+        return method
+    return _parsers.get(method) or _parsers['html']
+
+
+register_parser('html', LxmlBackend(collect_ids=False))
+register_parser('xml', LxmlXMLBackend(ns_clean=False, resolve_entities=False))
+register_parser('html5', HTML5LibBackend())
+register_parser('html5-parser', HTML5ParserBackend())
+
+
 class HTMLParser(object):
-    _cdata_regex = re.compile(r'\<\!\[CDATA\[(.*?)\]\]\>', re.DOTALL)
-    _xml_title_regex = re.compile(r'\<title(.*?)\/\>', re.IGNORECASE)
+    # CDATA sections and empty "<title/>" in xml output, fixed in one pass
+    _xml_fix_regex = re.compile(r'<!\[CDATA\[(.*?)\]\]>|<title\b[^>]*/>', re.DOTALL | re.IGNORECASE)
+    _style_uri_regex = re.compile(r'url\(', re.IGNORECASE)
     default_parser_method = "html"
     default_output_method = "xml"
 
-    def __init__(self, html, method=None, output_method=None):
+    def __init__(self, html, method=None, output_method=None, tree=None):
 
         self._method = method or self.default_parser_method
         self._output_method = output_method or self.default_output_method
@@ -74,7 +405,10 @@ class HTMLParser(object):
         else:
             self._html = html
 
-        self._tree = None
+        # tree may be parsed beforehand, html is set from it on save()
+        self._tree = tree
+        # True when the tree may differ from html
+        self._dirty = tree is not None
 
     @property
     def html(self):
@@ -82,103 +416,174 @@ class HTMLParser(object):
 
     @property
     def tree(self):
+        # The caller may change the tree, so it is saved on next save()
+        tree = self._get_tree()
+        if tree is not None:
+            self._dirty = True
+        return tree
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    @property
+    def parser(self):
+        return get_parser(self._method)
+
+    def _get_tree(self):
         if self._tree is None:
-            html_data = self._html.strip()
-            if self._method == 'xml':
-                parser = etree.XMLParser(ns_clean=False, resolve_entities=False)
-                self._tree = etree.fromstring(html_data, parser)
-            elif self._method == 'html5':
-                import html5lib
-                parsed = html5lib.parse(html_data, treebuilder='lxml', namespaceHTMLElements=False)
-                self._tree = parsed.getroot()
-            else:
-                parser = etree.HTMLParser()
-                self._tree = etree.fromstring(html_data, parser)
+            self._tree = self.parser.parse(self._html.strip())
         return self._tree
 
+    @staticmethod
+    def _xml_fix(m):
+        cdata = m.group(1)
+        if cdata is None:
+            # Remove empty "<title/>" which breaks html rendering (Fixes #43)
+            return ''
+        return '/*<![CDATA[*/%s/*]]>*/' % cdata
+
     def to_string(self, encoding='utf-8', **kwargs):
-        if self.tree is None:
+        tree = self._get_tree()
+        if tree is None:
             return ""
         method = self._output_method
-        out = etree.tostring(self.tree, encoding=encoding, method=method, **kwargs).decode(encoding)
+        out = self.parser.serialize(tree, encoding=encoding, method=method, **kwargs)
         if method == 'xml':
-            out = self._cdata_regex.sub(
-                lambda m: '/*<![CDATA[*/%s/*]]>*/' % m.group(1),
-                out
-            )
-            # Remove empty "<title/>" which breaks html rendering (Fixes #43)
-            out = self._xml_title_regex.sub('', out)
+            out = self._xml_fix_regex.sub(self._xml_fix, out)
         return out
 
-    def apply_to_images(self, func, images=True, backgrounds=True, styles_uri=True):
+    @classmethod
+    def _apply_to_style_uri(cls, style_text, func):
+        if not cls._style_uri_regex.search(style_text):
+            # Most inline styles have no urls, don't parse them
+            return style_text
+        dirty = False
+        parser = CSSParser().parseStyle(style_text)
+        for prop in parser.getProperties(all=True):
+            for value in prop.propertyValue:
+                if value.type == 'URI':
+                    old_uri = value.uri
+                    new_uri = func(old_uri, element=value)
+                    if new_uri != old_uri:
+                        dirty = True
+                        value.uri = new_uri
+        if dirty:
+            css_text = parser.cssText
+            return css_text.decode('utf-8') if isinstance(css_text, bytes) else css_text
+        else:
+            return style_text
 
-        def _apply_to_style_uri(style_text, func):
-            dirty = False
-            parser = CSSParser().parseStyle(style_text)
-            for prop in parser.getProperties(all=True):
-                for value in prop.propertyValue:
-                    if value.type == 'URI':
-                        old_uri = value.uri
-                        new_uri = func(old_uri, element=value)
-                        if new_uri != old_uri:
-                            dirty = True
-                            value.uri = new_uri
-            if dirty:
-                css_text = parser.cssText
-                return css_text.decode('utf-8') if isinstance(css_text, bytes) else css_text
-            else:
-                return style_text
-
-        if images:
-            # Apply to images from IMG tag
-            for img in self.tree.xpath(".//img"):
-                if 'src' in img.attrib:
-                    img.attrib['src'] = func(img.attrib['src'], element=img)
-
-        if backgrounds:
-            # Apply to images from <tag background="X">
-            for item in self.tree.xpath("//@background"):
-                tag = item.getparent()
-                tag.attrib['background'] = func(tag.attrib['background'], element=tag)
-
-        if styles_uri:
-            # Apply to style uri
-            for item in self.tree.xpath("//@style"):
-                tag = item.getparent()
-                tag.attrib['style'] = _apply_to_style_uri(tag.attrib['style'], func=func)
+    def rewrite(self, images=None, backgrounds=None, styles_uri=None, links=None, remove_tags=None):
+        """
+        Applies functions to the tree in one pass over its elements:
+        `images` to img src, `backgrounds` to background attributes,
+        `styles_uri` to urls in style attributes and `links` to a href.
+        Functions are called as func(uri, element=...) and return the new uri.
+
+        Elements with tags in `remove_tags` are removed with their
+        content, functions are not applied inside them.
+
+        Each distinct style attribute is rewritten once, the result is
+        reused for elements with the same style.
+        """
+        root = self._get_tree()
+        if root is None:
+            return self
+        remove_tags = frozenset(remove_tags or ())
+        removed = []
+        skipped = set()
+        styles = {}
+        changed = False
+
+        def _apply(el, name, func):
+            nonlocal changed
+            value = el.get(name)
+            new_value = func(value, element=el)
+            if new_value != value:
+                el.set(name, new_value)
+                changed = True
+
+        for el in root.iter(etree.Element):
+            if skipped and el in skipped:
+                continue
+            tag = el.tag
+            if tag in remove_tags and el is not root:
+                removed.append(el)
+                skipped.update(el.iter(etree.Element))
+                continue
+            names = el.keys()
+            if not names:
+                continue
+            if images is not None and tag == 'img' and 'src' in names:
+                _apply(el, 'src', images)
+            if links is not None and tag == 'a' and 'href' in names:
+                _apply(el, 'href', links)
+            if backgrounds is not None and 'background' in names:
+                _apply(el, 'background', backgrounds)
+            if styles_uri is not None and 'style' in names:
+                style = el.get('style')
+                new_style = styles.get(style)
+                if new_style is None:
+                    new_style = styles[style] = self._apply_to_style_uri(style, func=styles_uri)
+                if new_style != style:
+                    el.set('style', new_style)
+                    changed = True
+
+        for el in removed:
+            parent = el.getparent()
+            if parent is not None:
+                parent.remove(el)
+                changed = True
+
+        if changed:
+            self._dirty = True
+        return self
+
+    def apply_to_images(self, func, images=True, backgrounds=True, styles_uri=True):
+        self.rewrite(images=func if images else None,
+                     backgrounds=func if backgrounds else None,
+                     styles_uri=func if styles_uri else None)
 
     def apply_to_links(self, func):
-        # Apply to images from IMG tag
-        for a in self.tree.xpath(".//a"):
-            if 'href' in a.attrib:
-                a.attrib['href'] = func(a.attrib['href'], element=a)
+        self.rewrite(links=func)
 
     def add_content_type_meta(self, content_type="text/html", charset="utf-8", element_cls=etree.Element):
 
         def _get_content_type_meta(head):
-            content_type_meta = None
-            for meta in head.find('meta') or []:
+            for meta in head.findall('meta'):
                 http_equiv = meta.get('http-equiv', None)
-                if http_equiv and (http_equiv.lower() == 'content_type'):
-                    content_type_meta = meta
-                    break
-            if content_type_meta is None:
-                content_type_meta = element_cls('meta')
-                head.append(content_type_meta)
-            return content_type_meta
-
-        head = self.tree.find('head')
+                if http_equiv and (http_equiv.lower() == 'content-type'):
+                    return meta
+            return None
+
+        head = self._get_tree().find('head')
         if head is None:
             # After Premailer.transform there are always HEAD tag
             logging.warning('HEAD not found. This should not happen. Skip.')
             return
 
+        content = '%s; charset=%s' % (content_type, charset)
         meta = _get_content_type_meta(head)
-        meta.set('content', '%s; charset=%s' % (content_type, charset))
+        if meta is None:
+            meta = element_cls('meta')
+            head.append(meta)
+        elif meta.get('content') == content and meta.get('http-equiv') == "Content-Type":
+            return
+        meta.set('content', content)
         meta.set('http-equiv', "Content-Type")
+        self._dirty = True
 
     def save(self, **kwargs):
-        self._html = self.to_string(**kwargs)
+        """
+        Serializes the tree to html, if it was changed since the last save.
+        """
+        if self._dirty:
+            self._html = self.to_string(**kwargs)
+            self._dirty = False
 
 
 class BaseTransformer(HTMLParser):
@@ -188,12 +593,14 @@ class BaseTransformer(HTMLParser):
     attachment_store_cls = MemoryFileStore
     attachment_file_cls = LazyHTTPFile
     html_attribute_name = 'data-emails'
+    transform_cache = None
 
     def __init__(self, html, local_loader=None,
                  attachment_store=None,
-                 requests_params=None, method=None, base_url=None):
+                 requests_params=None, method=None, base_url=None,
+                 transform_cache=None, fetcher=None, tree=None):
 
-        HTMLParser.__init__(self, html=html, method=method)
+        HTMLParser.__init__(self, html=html, method=method, tree=tree)
 
         self.attachment_store = attachment_store if attachment_store is not None else self.attachment_store_cls()
         self.local_loader = local_loader
@@ -201,6 +608,10 @@ class BaseTransformer(HTMLParser):
             base_url = base_url + '/'
         self.base_url = base_url
         self.requests_params = requests_params
+        self.fetcher = fetcher
+        self._preloaded_stylesheets = {}
+        if transform_cache is not None:
+            self.transform_cache = transform_cache
 
         self._premailer = None
 
@@ -262,31 +673,63 @@ class BaseTransformer(HTMLParser):
                 absolute_url=self.get_absolute_url(uri),
                 local_loader=self.local_loader,
                 content_disposition='inline' if 'inline' in attribute_value else None,
-                requests_args=self.requests_params)
+                requests_args=self.requests_params,
+                fetcher=self.fetcher)
             self.attachment_store.add(attachment)
         return attachment.filename
 
     def get_premailer(self, **kw):
         kw.setdefault('attribute_name', self.html_attribute_name)
-        kw.setdefault('method', self._method)
+        kw.setdefault('method', self.parser.premailer_method)
         kw.setdefault('base_url', self.base_url)
         kw.setdefault('local_loader', self.local_loader)
-        return LocalPremailer(html=self.tree, **kw)
+        # Stylesheets are loaded with the same pooled session as images
+        kw.setdefault('session', self.fetcher or get_default_fetcher())
+        kw.setdefault('preloaded', self._preloaded_stylesheets)
+        return LocalPremailer(html=self._get_tree(), **kw)
 
     @property
     def premailer(self):
         if self._premailer is None:
             self._premailer = self.get_premailer()
+        # premailer.transform() changes the tree
+        self._dirty = True
         return self._premailer
 
-    def remove_unsafe_tags(self):
-        for tag in self.UNSAFE_TAGS:
-            for el in self.tree.xpath(".//%s" % tag):
-                parent = el.getparent()
-                if parent is not None:
-                    parent.remove(el)
+    def inline_css(self, **kw):
+        """
+        Loads external css and makes css inline with premailer.
+        With transform_cache set, the result for the same html
+        and options is taken from the cache.
+        """
+        cache = self.transform_cache
+        key = None
+        if cache is not None:
+            # Stylesheets may come from the local loader or be loaded with
+            # credentials, a tree inlined with other ones is not reused
+            options = dict(kw, method=self._method, base_url=self.base_url,
+                           attribute_name=kw.get('attribute_name', self.html_attribute_name),
+                           local_loader=kw.get('local_loader', self.local_loader),
+                           session=kw.get('session', self.fetcher),
+                           requests_params=self.requests_params)
+            key = cache.make_key(etree.tostring(self._get_tree(), encoding='utf-8'), **options)
+            if key is not None:
+                tree = cache.get(key)
+                if tree is not None:
+                    self._tree = tree
+                    self._dirty = True
+                    return self
+
+        self.get_premailer(**kw).transform()
+        self._dirty = True
+
+        if key is not None:
+            cache.set(key, self._get_tree())
         return self
 
+    def remove_unsafe_tags(self):
+        return self.rewrite(remove_tags=self.UNSAFE_TAGS)
+
     def load_and_transform(self,
                            css_inline=True,
                            remove_unsafe_tags=True,
@@ -295,6 +738,7 @@ class BaseTransformer(HTMLParser):
                            update_stylesheet=False,
                            load_images=True,
                            images_inline=False,
+                           prefetch_images=False,
                            **kw):
 
         if not make_links_absolute:
@@ -309,20 +753,25 @@ class BaseTransformer(HTMLParser):
         #  - load external css and make css inline
         #  - make absolute href and src if base_url is set
         if css_inline:
-            self.get_premailer(**kw).transform()
+            self.inline_css(**kw)
 
-        # 2. Load linked images and transform links
+        # 2. Load linked images and transform links,
+        # 3. Remove unsafe tags is requested
+        # Both are done in one pass over the tree.
         # If load_images is a function, use if as callback
+        func = None
         if load_images:
             if callable(load_images):
                 func = functools.partial(self._load_attachment_func, callback=load_images)
             else:
                 func = self._load_attachment_func
-            self.apply_to_images(func)
+        self.rewrite(images=func, backgrounds=func, styles_uri=func,
+                     remove_tags=self.UNSAFE_TAGS if remove_unsafe_tags else None)
 
-        # 3. Remove unsafe tags is requested
-        if remove_unsafe_tags:
-            self.remove_unsafe_tags()
+        # Download loaded images concurrently, prefetch_images may be
+        # a dict of prefetch_attachments() arguments
+        if load_images and prefetch_images:
+            self.prefetch_attachments(**(prefetch_images if isinstance(prefetch_images, dict) else {}))
 
         # 4. Set <meta> content-type
         if set_content_type_meta:
@@ -335,6 +784,77 @@ class BaseTransformer(HTMLParser):
 
         return self
 
+    def prefetch_attachments(self, **kwargs):
+        """
+        Fetches remote attachments concurrently, see emails.store.parallel.prefetch()
+        """
+        return prefetch(self.attachment_store, **kwargs)
+
+    async def prefetch_attachments_async(self, **kwargs):
+        """
+        Same as prefetch_attachments(), see emails.store.parallel.prefetch_async()
+        """
+        return await prefetch_async(self.attachment_store, **kwargs)
+
+    def stylesheet_urls(self):
+        """
+        Returns urls of external stylesheets premailer loads over http.
+        Relative urls are left out when there is a local_loader.
+        """
+        urls = []
+        for el in self._get_tree().iter('link'):
+            if 'stylesheet' not in (el.attrib.get('rel') or '').lower().split():
+                continue
+            url = (el.attrib.get('href') or '').strip()
+            if url.startswith('//'):
+                url = ('https:' if self.base_url and 'https://' in self.base_url else 'http:') + url
+            elif not (url.startswith('http://') or url.startswith('https://')):
+                if not url or self.local_loader or not self.base_url:
+                    continue
+                url = urlparse.urljoin(self.base_url, url)
+            if url not in urls:
+                urls.append(url)
+        return urls
+
+    async def preload_stylesheets_async(self):
+        """
+        Loads external stylesheets concurrently, inline_css() uses them then.
+        """
+        load = self.premailer._load_external_url
+        urls = [url for url in self.stylesheet_urls() if url not in self._preloaded_stylesheets]
+        texts = await asyncio.gather(*[asyncio.to_thread(load, url) for url in urls],
+                                     return_exceptions=True)
+        for (url, text) in zip(urls, texts):
+            # Failed stylesheets are loaded again by inline_css(), which raises the error
+            if isinstance(text, str):
+                self._preloaded_stylesheets[url] = text
+        return self
+
+    async def load_and_transform_async(self, css_inline=True, load_images=True, images_inline=False,
+                                       prefetch_images=True, **kw):
+        """
+        Same as load_and_transform(), for asyncio code.
+
+        Stylesheets are loaded concurrently before css is inlined, then
+        images are fetched concurrently (prefetch_images may be a dict of
+        prefetch_async() arguments). Network and transformations run in
+        the default executor of the running loop.
+        """
+        if css_inline and self._get_tree() is not None:
+            await self.preload_stylesheets_async()
+
+        await asyncio.to_thread(self.load_and_transform, css_inline=css_inline, load_images=load_images,
+                                images_inline=False, prefetch_images=False, **kw)
+
+        if load_images:
+            if prefetch_images:
+                await self.prefetch_attachments_async(**(prefetch_images if isinstance(prefetch_images, dict)
+                                                         else {}))
+            if images_inline:
+                await asyncio.to_thread(self.make_all_images_inline)
+
+        return self
+
     def make_all_images_inline(self):
         for a in self.attachment_store:
             a.is_inline = True
@@ -390,8 +910,11 @@ class MessageTransformer(BaseTransformer):
         BaseTransformer.__init__(self, **params)
 
     def save(self):
+        if not self._dirty:
+            return
         m = self.message
         if isinstance(m._html, BaseTemplate):
             m._html.set_template_text(self.to_string())
         else:
             m._html = self.to_string()
+        self._dirty = False
@@ -1,17 +1,22 @@
 from __future__ import annotations
 
+import base64
+import mmap
 import os
 import socket
+import threading
 from time import mktime
 from datetime import datetime
 from random import randrange
 from functools import wraps
 from io import StringIO, BytesIO
-from collections.abc import Callable
-from typing import Any, TypeVar, cast
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any, TypeVar, cast, TYPE_CHECKING
 
 import email.charset
 from email import generator
+from email.message import Message as _EmailMessage
+from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import Header, decode_header as decode_header_
@@ -21,6 +26,9 @@ from email.utils import escapesre, specialsre  # type: ignore[attr-defined]  # p
 from . import USER_AGENT
 from .exc import HTTPLoaderError
 
+if TYPE_CHECKING:
+    from .store.cache import DiskURLCache
+
 F = TypeVar('F', bound=Callable[..., Any])
 
 
@@ -214,6 +222,214 @@ def sanitize_address(addr: str | tuple[str, str], encoding: str = 'ascii') -> st
     return formataddr((nm, sanitize_email(addr, encoding=encoding, parse=False)))
 
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _is_streamable_leaf(part: _EmailMessage) -> bool:
+    # Parts that BytesGenerator writes as plain text lines, with no
+    # charset re-encoding and no line ending ambiguity.
+    payload = getattr(part, '_payload')
+    return (isinstance(payload, str)
+            and part.get_content_maintype() not in ('multipart', 'message')
+            and '\r' not in payload
+            and not generator._has_surrogates(payload))  # type: ignore[attr-defined]
+
+
+class FileMIMEPart(MIMEBase):
+
+    """
+    Base64-encoded MIME part with the content of a file on disk.
+
+    The file is read only when the part is written: iter_message_bytes()
+    encodes it chunk by chunk from a memory map, get_payload() returns
+    the whole encoded text for the stdlib generator.
+    """
+
+    def __init__(self, path: str, _maintype: str, _subtype: str, **_params: Any) -> None:
+        MIMEBase.__init__(self, _maintype, _subtype, **_params)
+        self.path = path
+        self._payload = ''
+        self['Content-Transfer-Encoding'] = 'base64'
+
+    def iter_payload(self, chunk_size: int = STREAM_CHUNK_SIZE, linesep: str = '\n') -> Iterator[bytes]:
+        """
+        Yields the encoded file in lines of 76 characters ended by linesep,
+        about chunk_size bytes at a time.
+        """
+        step = max(1, chunk_size * 3 // 4 // 57) * 57
+        NL = linesep.encode('ascii')
+
+        def encode(data: bytes) -> bytes:
+            r = base64.encodebytes(data)
+            return r if NL == b'\n' else r.replace(b'\n', NL)
+
+        with open(self.path, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # Empty files and files that can't be mapped are read in chunks
+                for chunk in iter(lambda: f.read(step), b''):
+                    yield encode(chunk)
+                return
+            with data:
+                for start in range(0, len(data), step):
+                    yield encode(data[start:start + step])
+
+    def get_payload(self, i: Any = None, decode: bool = False) -> Any:
+        if decode:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        return b''.join(self.iter_payload()).decode('ascii')
+
+
+def _has_file_parts(msg: _EmailMessage) -> bool:
+    return any(isinstance(part, FileMIMEPart) for part in msg.walk())
+
+
+def _iter_leaf_payloads(part: _EmailMessage) -> Iterator[str]:
+    for p in part.walk():
+        payload = getattr(p, '_payload')
+        if isinstance(payload, str):
+            yield payload
+        for extra in (p.preamble, p.epilogue):
+            if extra:
+                yield extra
+
+
+def _set_stream_boundary(part: _EmailMessage) -> str:
+    # BytesGenerator picks a boundary after flattening the subparts, we
+    # have to pick it before, so check it against the raw payloads instead.
+    boundary = part.get_boundary()
+    if boundary:
+        return boundary
+    while True:
+        boundary = cast(str, getattr(generator.BytesGenerator, '_make_boundary')())
+        if not any(boundary in text for text in _iter_leaf_payloads(part)):
+            part.set_boundary(boundary)
+            return boundary
+
+
+def _iter_part_bytes(part: _EmailMessage, policy: Any, chunk_size: int,
+                     placeholders: dict[int, Any] | None = None,
+                     headers: bool = True) -> Iterator[Any]:
+    # Parts listed in placeholders (by id) are not written, their
+    # placeholder value is yielded in their place.
+
+    NL = policy.linesep
+
+    if placeholders and id(part) in placeholders:
+        yield placeholders[id(part)]
+        return
+
+    def write_lines(text: str) -> Iterator[bytes]:
+        for start in range(0, len(text), chunk_size):
+            yield text[start:start + chunk_size].replace('\n', NL).encode('ascii', 'surrogateescape')
+
+    subparts = part.get_payload() if part.is_multipart() else None
+
+    if isinstance(subparts, list):
+        boundary = _set_stream_boundary(part)
+    elif not _is_streamable_leaf(part) and not isinstance(part, FileMIMEPart):
+        # Rare parts (message/rfc822, 8bit data from parsed bytes...)
+        # are flattened as a whole by the stdlib generator
+        fp = BytesIO()
+        g = generator.BytesGenerator(fp, mangle_from_=False, policy=policy)
+        g.flatten(part, linesep=NL)
+        yield fp.getvalue()
+        return
+
+    if headers:
+        for h, v in part.raw_items():
+            yield policy.fold_binary(h, v)
+        yield NL.encode('ascii')
+
+    if isinstance(part, FileMIMEPart):
+        yield from part.iter_payload(chunk_size, linesep=NL)
+        return
+    if not isinstance(subparts, list):
+        yield from write_lines(getattr(part, '_payload'))
+        return
+
+    if part.preamble is not None:
+        yield from write_lines(part.preamble.replace('\r\n', '\n').replace('\r', '\n'))
+        yield NL.encode('ascii')
+    for n, subpart in enumerate(subparts):
+        yield ('%s--%s%s' % (n and NL or '', boundary, NL)).encode('ascii')
+        yield from _iter_part_bytes(subpart, policy, chunk_size, placeholders)
+    if not subparts:
+        yield ('--%s%s' % (boundary, NL)).encode('ascii')
+    yield ('%s--%s--%s' % (NL, boundary, NL)).encode('ascii')
+    if part.epilogue is not None:
+        yield from write_lines(part.epilogue.replace('\r\n', '\n').replace('\r', '\n'))
+
+
+def iter_message_bytes(msg: _EmailMessage, linesep: str = '\n',
+                       chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields the message formatted as by MIMEMixin.as_bytes() in chunks
+    of about chunk_size bytes, without building the whole message in memory.
+
+    Multipart boundaries are set on the message tree before the first chunk,
+    so later as_bytes() calls produce the same bytes.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    policy = msg.policy.clone(linesep=linesep)
+    return _coalesce_chunks(_iter_part_bytes(msg, policy, chunk_size), chunk_size)
+
+
+def split_message_bytes(msg: _EmailMessage, linesep: str = '\n',
+                        chunk_size: int = STREAM_CHUNK_SIZE) -> tuple[bytes, Iterator[bytes]]:
+    """
+    Returns the header block of the message (with the empty line that ends it)
+    and an iterator over the body chunks, formatted as by iter_message_bytes().
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    policy = msg.policy.clone(linesep=linesep)
+    NL = linesep.encode('ascii')
+
+    if not msg.is_multipart() and not _is_streamable_leaf(msg):
+        data = b''.join(_iter_part_bytes(msg, policy, chunk_size))
+        end = data.find(NL + NL)
+        end = len(data) if end < 0 else end + 2 * len(NL)
+        return data[:end], iter([data[end:]] if end < len(data) else [])
+
+    if msg.is_multipart():
+        _set_stream_boundary(msg)
+    header = b''.join([policy.fold_binary(h, v) for (h, v) in msg.raw_items()]) + NL
+    return header, _coalesce_chunks(_iter_part_bytes(msg, policy, chunk_size, headers=False), chunk_size)
+
+
+def _coalesce_chunks(pieces: Iterable[bytes], chunk_size: int) -> Iterator[bytes]:
+    buf = bytearray()
+    for piece in pieces:
+        if not buf and len(piece) >= chunk_size:
+            yield piece
+            continue
+        buf += piece
+        if len(buf) >= chunk_size:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+class MessageChunks:
+    """
+    Iterable over message.iter_bytes() chunks that can be iterated again,
+    so a send can be retried after the connection drops. Each iteration
+    serializes the message anew.
+    """
+
+    def __init__(self, message: Any, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+        self.message = message
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.message.iter_bytes(chunk_size=self.chunk_size))
+
+
 class MIMEMixin:
     def as_string(self, unixfrom: bool = False, linesep: str = '\n') -> str:
         """Return the entire formatted message as a string.
@@ -240,6 +456,12 @@ class MIMEMixin:
             g.flatten(self, unixfrom=unixfrom, linesep=linesep)
             return fp.getvalue()
 
+    def iter_bytes(self, linesep: str = '\n', chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """Return an iterator over the formatted message bytes.
+        The output is the same as as_bytes(), see iter_message_bytes().
+        """
+        return iter_message_bytes(self, linesep=linesep, chunk_size=chunk_size)  # type: ignore[arg-type]
+
 
 class SafeMIMEText(MIMEMixin, MIMEText):  # type: ignore[misc]  # intentional override
     def __init__(self, text: str, subtype: str, charset: str) -> None:
@@ -259,14 +481,165 @@ DEFAULT_REQUESTS_PARAMS: dict[str, Any] = dict(allow_redirects=True,
                              verify=False, timeout=10,
                              headers={'User-Agent': USER_AGENT})
 
+# Requests with these headers are not served from or stored in a shared cache
+_PRIVATE_HEADERS = frozenset(['authorization', 'proxy-authorization', 'cookie'])
+
+
+class HTTPFetcher:
+
+    """
+    Fetches urls with one requests.Session shared between calls and
+    threads, so connections are kept alive and reused.
+
+    pool_maxsize is the number of connections kept open per host, with
+    pool_block=True it also limits concurrent requests to one host.
+    Connection errors and 5xx responses to GET requests are retried
+    max_retries times with exponential backoff.
+
+    requests_args are default arguments for every request, on top of
+    DEFAULT_REQUESTS_PARAMS. The session is created on first use and
+    again in a forked process.
+
+    With cache, GET responses are stored in and served from it,
+    requests with conditional headers or credentials bypass the cache.
+    The session doesn't store cookies, it is shared by unrelated messages.
+    """
+
+    # Persistent cache of responses, see emails.store.DiskURLCache
+    cache: DiskURLCache | None = None
+
+    DEFAULT_MAX_RETRIES = 2
+    DEFAULT_BACKOFF_FACTOR = 0.2
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, requests_args: dict[str, Any] | None = None,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 pool_connections: int = 16, pool_maxsize: int = 8,
+                 pool_block: bool = False, cache: DiskURLCache | None = None) -> None:
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative")
+        if pool_connections < 1 or pool_maxsize < 1:
+            raise ValueError("pool_connections and pool_maxsize must be positive")
+        self.requests_args = requests_args or {}
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        if cache is not None:
+            self.cache = cache
+        self._session: Any = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def create_session(self) -> Any:
+        import requests
+        from http.cookiejar import DefaultCookiePolicy
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=self.max_retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=self.RETRY_STATUSES, allowed_methods=['GET', 'HEAD'],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block, max_retries=retry)
+        session = requests.Session()
+        # The session is shared by unrelated messages, cookies set by one
+        # fetched url must not be sent with later requests
+        session.cookies = requests.cookies.RequestsCookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @property
+    def session(self) -> Any:
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                # Connections of a parent process are not reused after fork
+                self._session = self.create_session()
+                self._pid = os.getpid()
+            return self._session
+
+    def get(self, url: str, **kwargs: Any) -> Any:
+        """
+        Same as requests.get(url, **kwargs), with default arguments added.
+        Headers are merged with the default ones.
+        """
+        args: dict[str, Any] = {}
+        headers: dict[str, Any] = {}
+        for params in (DEFAULT_REQUESTS_PARAMS, self.requests_args, kwargs):
+            args.update(params)
+            headers.update(params.get('headers') or {})
+        args['headers'] = headers
+
+        names = set(h.lower() for h in headers)
+        conditional = names & {'if-none-match', 'if-modified-since'}
+        # The cache is keyed by url only, responses to credentials are not shared
+        session = self.session
+        private = (names & _PRIVATE_HEADERS or args.get('auth') or args.get('cookies')
+                   or session.auth or len(session.cookies))
+        if self.cache is None or conditional or private:
+            return session.get(url, **args)
+
+        def get(validators: dict[str, str]) -> Any:
+            return session.get(url, **dict(args, headers=dict(headers, **validators)))
+
+        return self.cache.load(url, get)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
+
+    def __enter__(self) -> HTTPFetcher:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The session and its connections are not pickled
+        state = self.__dict__.copy()
+        state['_session'] = None
+        state['_pid'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+_default_fetcher: HTTPFetcher | None = None
+_default_fetcher_lock = threading.Lock()
+
+
+def get_default_fetcher() -> HTTPFetcher:
+    """
+    Returns the HTTPFetcher used by fetch_url() when no fetcher is given.
+    """
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = HTTPFetcher()
+        return _default_fetcher
+
+
+def set_default_fetcher(fetcher: HTTPFetcher | None) -> None:
+    """
+    Replaces the default HTTPFetcher, None creates a new one on next use.
+    """
+    global _default_fetcher
+    with _default_fetcher_lock:
+        _default_fetcher = fetcher
+
 
 def fetch_url(url: str, valid_http_codes: tuple[int, ...] = (200, ),
-              requests_args: dict[str, Any] | None = None) -> Any:
-    import requests
-    args = {}
-    args.update(DEFAULT_REQUESTS_PARAMS)
-    args.update(requests_args or {})
-    r = requests.get(url, **args)
+              requests_args: dict[str, Any] | None = None,
+              fetcher: HTTPFetcher | None = None) -> Any:
+    r = (fetcher or get_default_fetcher()).get(url, **(requests_args or {}))
     if valid_http_codes and (r.status_code not in valid_http_codes):
         raise HTTPLoaderError('Error loading url: %s. HTTP status: %s' % (url, r.status_code))
     return r
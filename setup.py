@@ -101,7 +101,8 @@ settings.update(
     extras_require={
         'html': ['cssutils', 'lxml', 'chardet', 'requests', 'premailer'],
         'jinja': ['jinja2'],
-        'async': ['aiosmtplib'],
+        'async': ['aiosmtplib>=5.1,<5.2'],
+        'html5': ['html5-parser'],
     },
     zip_safe=False,
     classifiers=[